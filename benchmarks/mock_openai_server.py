@@ -0,0 +1,186 @@
+import re
+import json
+import hashlib
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The question is quoted in backticks by every prompt get_pandas_code builds
+QUESTION_PATTERN = re.compile(r"question: `(.+?)`", re.DOTALL | re.IGNORECASE)
+
+# Granularity of the simulated prefix cache, in characters (about 16 tokens)
+PREFIX_BLOCK_CHARS = 64
+
+# Code returned for malformed completions: one syntax error and one missing column
+MALFORMED_COMPLETIONS = (
+    "```python\nimport pandas as pd\ndf = pd.read_parquet('{dataset}.parquet')\nprint(df[\n```",
+    "```python\nimport pandas as pd\ndf = pd.read_parquet('{dataset}.parquet')\nprint(df['no_such_column'].sum())\n```",
+)
+FALLBACK_COMPLETION = "```python\nprint(None)\n```"
+
+
+class MockBehaviour:
+    """
+    Latency and fault distribution of the mock server.
+
+    Args:
+        latency_ms (float): Median response latency; latencies are log-normal.
+        latency_sigma (float): Sigma of the log-normal latency distribution.
+        rate_limit_rate (float): Share of requests answered with 429 and a Retry-After.
+        retry_after_ms (int): Retry-After sent with 429 responses.
+        timeout_rate (float): Share of requests that hang for `hang_seconds` and then drop
+            the connection without a response.
+        hang_seconds (float): How long a timed-out request hangs.
+        malformed_rate (float): Share of completions replaced by code that fails to run.
+        seed (int): Seed of the fault and latency draws.
+    """
+
+    def __init__(self, latency_ms=200, latency_sigma=0.5, rate_limit_rate=0.0, retry_after_ms=200,
+                 timeout_rate=0.0, hang_seconds=2.0, malformed_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_ms = retry_after_ms
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """Return (fault, latency seconds) for one request; fault is None, '429', 'timeout' or 'malformed'."""
+        with self._lock:
+            roll = self._random.random()
+            latency = self.latency_ms / 1000 * self._random.lognormvariate(0, self.latency_sigma)
+            variant = self._random.randrange(len(MALFORMED_COMPLETIONS))
+        if roll < self.rate_limit_rate:
+            return "429", 0.0, variant
+        roll -= self.rate_limit_rate
+        if roll < self.timeout_rate:
+            return "timeout", self.hang_seconds, variant
+        roll -= self.timeout_rate
+        if roll < self.malformed_rate:
+            return "malformed", latency, variant
+        return None, latency, variant
+
+
+class MockCompletionServer(ThreadingHTTPServer):
+    """
+    Local stand-in for an OpenAI-compatible /v1/chat/completions endpoint.
+
+    Completions are replayed from `recordings` (question text -> completion content),
+    looked up by the question quoted in the prompt, with the latency and faults drawn
+    from `behaviour`. Unknown questions get a completion that prints None. Counters of
+    served requests and injected faults are kept in `counters`.
+
+    Like a server with prefix caching, it remembers the prompt prefixes it has seen in
+    blocks of PREFIX_BLOCK_CHARS characters and reports the leading blocks seen before
+    as `usage.prompt_tokens_details.cached_tokens`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, recordings, behaviour=None, port=0):
+        super().__init__(("127.0.0.1", port), _CompletionHandler)
+        self.recordings = recordings
+        self.behaviour = behaviour or MockBehaviour()
+        self.counters = {"requests": 0, "429": 0, "timeout": 0, "malformed": 0, "unknown": 0}
+        self._counter_lock = threading.Lock()
+        self._prefix_blocks = set()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def cached_chars(self, prompt):
+        """Length of the prefix of `prompt` already seen, in whole blocks; remembers the prompt's blocks."""
+        digest = hashlib.sha1()
+        cached, hit = 0, True
+        with self._counter_lock:
+            for end in range(PREFIX_BLOCK_CHARS, len(prompt) + 1, PREFIX_BLOCK_CHARS):
+                digest.update(prompt[end - PREFIX_BLOCK_CHARS:end].encode("utf-8"))
+                key = digest.copy().hexdigest()
+                if hit and key in self._prefix_blocks:
+                    cached = end
+                else:
+                    hit = False
+                    self._prefix_blocks.add(key)
+        return cached
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-openai-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+            return
+
+        server = self.server
+        server.count("requests")
+        fault, latency, variant = server.behaviour.draw()
+        if fault == "429":
+            server.count("429")
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                            headers={"retry-after-ms": str(server.behaviour.retry_after_ms)})
+            return
+        time.sleep(latency)
+        if fault == "timeout":
+            server.count("timeout")
+            self.close_connection = True  # Drop the request without answering
+            return
+
+        prompt = "".join(message.get("content", "") for message in request.get("messages", []))
+        match = QUESTION_PATTERN.search(prompt)
+        recording = server.recordings.get(match.group(1)) if match else None
+        if recording is None:
+            server.count("unknown")
+            content = FALLBACK_COMPLETION
+        elif fault == "malformed":
+            server.count("malformed")
+            content = MALFORMED_COMPLETIONS[variant].format(dataset=recording["dataset"])
+        else:
+            content = recording["content"]
+
+        prompt_tokens = len(prompt) // 4
+        cached_tokens = server.cached_chars(prompt) // 4
+        completion_tokens = max(1, len(content) // 4)
+        self._send_json(200, {
+            "id": f"mock-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+        })
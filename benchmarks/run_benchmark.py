@@ -0,0 +1,129 @@
+"""
+Offline throughput benchmark of the full pipeline.
+
+Generates synthetic parquet datasets and questions, starts a mock OpenAI-compatible
+server that replays the recorded answers with configurable latency and faults, and
+runs run_pipeline against it end to end. Reports questions per second, peak RSS and
+per-stage timings from the trace, optionally as JSON for comparison between commits:
+
+    python benchmarks/run_benchmark.py --questions 200 --rows 200000 --report bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from mock_openai_server import MockBehaviour, MockCompletionServer
+from synthetic_data import write_benchmark_data
+
+
+def peak_rss_mib(who):
+    """Peak resident set size in MiB of this process or of its reaped children (Linux reports KiB)."""
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def run_benchmark(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    print(f"Writing {args.datasets} datasets of {args.rows} rows x {args.cols} columns to {workdir}")
+    paths = write_benchmark_data(workdir, datasets=args.datasets, rows=args.rows, cols=args.cols,
+                                 questions=args.questions, seed=args.seed)
+    with open(paths["recordings"], encoding="utf-8") as f:
+        recordings = json.load(f)
+
+    behaviour = MockBehaviour(latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                              rate_limit_rate=args.rate_limit_rate, timeout_rate=args.timeout_rate,
+                              hang_seconds=args.hang_seconds, malformed_rate=args.malformed_rate, seed=args.seed)
+    server = MockCompletionServer(recordings, behaviour).start()
+
+    # The LLM clients are created when the utilities package is imported
+    os.environ["API_KEY"] = "benchmark"
+    os.environ["API_BASE_URL"] = server.base_url
+    from utilities.pipeline import run_pipeline
+    from utilities.tracing import load_trace_stats
+
+    # run_pipeline writes its intermediate files relative to the working directory
+    os.chdir(workdir)
+    trace_path = os.path.join(workdir, "trace.jsonl")
+    if os.path.exists(trace_path):
+        os.remove(trace_path)
+    output_path = os.path.join(workdir, "results.jsonl")
+
+    started = time.perf_counter()
+    try:
+        run_pipeline(paths["schemas"], paths["questions"], output_path, max_retries=args.retries,
+                     dataset_folder_path=paths["data"] + os.sep, max_workers=args.workers,
+                     sandbox_workers=args.sandbox_workers, async_llm=args.async_llm,
+                     max_in_flight=args.max_in_flight, resume=False,
+                     column_catalog_path=paths["catalog"] if args.prune else None, trace_path=trace_path,
+                     group_by_dataset=args.group_by_dataset, max_active_datasets=args.active_datasets,
+                     stable_prompt_prefix=args.stable_prompt_prefix, static_check=not args.no_static_check)
+    finally:
+        server.stop()
+    elapsed = time.perf_counter() - started
+
+    with open(output_path, encoding="utf-8") as f:
+        statuses = [json.loads(line).get("status") for line in f if line.strip()]
+    report = {
+        "questions": len(statuses),
+        "succeeded": statuses.count("success"),
+        "seconds": elapsed,
+        "questions_per_second": len(statuses) / elapsed if elapsed else 0.0,
+        "peak_rss_mib": peak_rss_mib(resource.RUSAGE_SELF),
+        "peak_children_rss_mib": peak_rss_mib(resource.RUSAGE_CHILDREN),
+        "server": server.counters,
+        "stages": load_trace_stats(trace_path).stage_summary(),
+        "config": vars(args),
+    }
+
+    print(f"\n{report['questions']} questions ({report['succeeded']} succeeded) in {elapsed:.1f}s: "
+          f"{report['questions_per_second']:.2f} questions/s")
+    print(f"Peak RSS: {report['peak_rss_mib']:.0f} MiB (largest child process "
+          f"{report['peak_children_rss_mib']:.0f} MiB)")
+    print("Mock server: " + ", ".join(f"{count} {name}" for name, count in server.counters.items()))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a local mock LLM server.")
+    parser.add_argument("--workdir", default=None, help="Directory for the synthetic data and outputs (default: a temp dir).")
+    parser.add_argument("--datasets", type=int, default=4, help="Number of synthetic datasets.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows per dataset.")
+    parser.add_argument("--cols", type=int, default=12, help="Columns per dataset.")
+    parser.add_argument("--questions", type=int, default=200, help="Total number of questions.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Median mock LLM latency.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal sigma of the latency.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.02, help="Share of requests answered with 429.")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests dropped after --hang-seconds.")
+    parser.add_argument("--hang-seconds", type=float, default=2.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="Share of completions with broken code.")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--sandbox-workers", type=int, default=0)
+    parser.add_argument("--async-llm", action="store_true")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--prune", action="store_true", help="Use the column catalog to prune parquet reads.")
+    parser.add_argument("--group-by-dataset", action="store_true", help="Schedule the questions by dataset.")
+    parser.add_argument("--active-datasets", type=int, default=2)
+    parser.add_argument("--stable-prompt-prefix", action="store_true",
+                        help="Put instructions and schema before the question in prompts.")
+    parser.add_argument("--no-static-check", action="store_true",
+                        help="Execute broken completions instead of rejecting them statically.")
+    parser.add_argument("--report", default=None, metavar="PATH", help="Write the report as JSON.")
+    args = parser.parse_args()
+    if args.report:
+        args.report = os.path.abspath(args.report)
+
+    run_benchmark(args)
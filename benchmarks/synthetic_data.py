@@ -0,0 +1,130 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Column kinds cycled through when building a dataset of a given width
+COLUMN_KINDS = ("int", "float", "category", "datetime", "bool", "text")
+CATEGORY_VALUES = 20
+
+CODE_TEMPLATE = "```python\nimport pandas as pd\ndf = pd.read_parquet('{dataset}.parquet')\nprint({expression})\n```"
+
+
+def make_dataset(rows, cols, seed=0):
+    """Build a DataFrame with `rows` rows and `cols` columns of mixed kinds."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for i in range(cols):
+        kind = COLUMN_KINDS[i % len(COLUMN_KINDS)]
+        name = f"{kind}_{i}"
+        if kind == "int":
+            columns[name] = rng.integers(0, 1000, rows)
+        elif kind == "float":
+            columns[name] = rng.normal(100, 25, rows).round(3)
+        elif kind == "category":
+            columns[name] = pd.Categorical.from_codes(rng.integers(0, CATEGORY_VALUES, rows),
+                                                      [f"value_{v}" for v in range(CATEGORY_VALUES)]).astype(str)
+        elif kind == "datetime":
+            columns[name] = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 5 * 365, rows), unit="D")
+        elif kind == "bool":
+            columns[name] = rng.random(rows) < 0.3
+        else:
+            columns[name] = np.char.add("item ", rng.integers(0, rows, rows).astype(str))
+    return pd.DataFrame(columns)
+
+
+def schema_summary(df, dataset):
+    """Short schema description in the spirit of preprocessing's summaries."""
+    lines = [f"The dataset {dataset} has {len(df)} rows and the following columns:"]
+    for column in df.columns:
+        examples = df[column].drop_duplicates().head(5).astype(str).tolist()
+        lines.append(f"Column Name: {column}, Data type -- {df[column].dtype}, -- Example values: {examples}")
+    return "\n".join(lines)
+
+
+def column_catalog(df):
+    """Column catalog in the format written by preprocessing."""
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    return {column: {"dtype": str(dtype), "arrow_type": str(schema.field(column).type)}
+            for column, dtype in df.dtypes.items()}
+
+
+def make_questions(df, dataset, count, seed=0):
+    """
+    Generate `count` questions about a dataset together with code that answers them.
+
+    Returns:
+        list: (question, completion content) pairs; the content is what a model would answer.
+    """
+    rng = np.random.default_rng(seed)
+    numeric = [c for c in df.columns if c.startswith(("int_", "float_"))]
+    categorical = [c for c in df.columns if c.startswith("category_")] or numeric
+    templates = [
+        lambda num, cat, value: (f"What is the average {num}?", f"round(df['{num}'].mean(), 4)"),
+        lambda num, cat, value: (f"How many rows have {cat} equal to {value}?", f"int((df['{cat}'] == '{value}').sum())"),
+        lambda num, cat, value: (f"Which {cat} is the most frequent?", f"df['{cat}'].value_counts().idxmax()"),
+        lambda num, cat, value: (f"What is the highest {num} among rows with {cat} {value}?",
+                                 f"df[df['{cat}'] == '{value}']['{num}'].max()"),
+        lambda num, cat, value: (f"List the 3 largest values of {num}.", f"df['{num}'].nlargest(3).tolist()"),
+    ]
+    questions = []
+    for i in range(count):
+        num = numeric[rng.integers(len(numeric))]
+        cat = categorical[rng.integers(len(categorical))]
+        value = f"value_{rng.integers(CATEGORY_VALUES)}"
+        question, expression = templates[i % len(templates)](num, cat, value)
+        # The suffix keeps question texts unique across datasets, as recordings are keyed by them
+        questions.append((f"{question} ({dataset} #{i})", CODE_TEMPLATE.format(dataset=dataset, expression=expression)))
+    return questions
+
+
+def write_benchmark_data(root, datasets=4, rows=100_000, cols=12, questions=200, seed=0):
+    """
+    Write a complete synthetic input tree for run_pipeline under `root`.
+
+    Creates data/all_datasets/*.parquet, data/pandas_schemas.json, data/column_catalog.json,
+    data/all_qa.jsonl and recordings.json (question -> recorded completion) for the mock server.
+
+    Returns:
+        dict: Paths of the written files, keyed 'data', 'schemas', 'catalog', 'questions', 'recordings'.
+    """
+    data_dir = os.path.join(root, "data")
+    all_datasets_dir = os.path.join(data_dir, "all_datasets")
+    os.makedirs(all_datasets_dir, exist_ok=True)
+
+    schemas, catalog, recordings = {}, {}, {}
+    per_dataset = []
+    for d in range(datasets):
+        dataset = f"synthetic_{d}"
+        df = make_dataset(rows, cols, seed=seed + d)
+        df.to_parquet(os.path.join(all_datasets_dir, f"{dataset}.parquet"))
+        schemas[dataset] = schema_summary(df, dataset)
+        catalog[dataset] = column_catalog(df)
+        # Spread the questions evenly over the datasets
+        share = questions // datasets + (d < questions % datasets)
+        per_dataset.append([(dataset, question, content)
+                            for question, content in make_questions(df, dataset, share, seed=seed + d)])
+
+    # Interleave the datasets like a real QA file, which is not sorted by table
+    qa_path = os.path.join(data_dir, "all_qa.jsonl")
+    with open(qa_path, "w", encoding="utf-8") as qa_file:
+        for i in range(max(map(len, per_dataset), default=0)):
+            for entries in per_dataset:
+                if i < len(entries):
+                    dataset, question, content = entries[i]
+                    qa_file.write(json.dumps({"question": question, "dataset": dataset}) + "\n")
+                    recordings[question] = {"dataset": dataset, "content": content}
+
+    paths = {
+        "data": data_dir,
+        "schemas": os.path.join(data_dir, "pandas_schemas.json"),
+        "catalog": os.path.join(data_dir, "column_catalog.json"),
+        "questions": qa_path,
+        "recordings": os.path.join(root, "recordings.json"),
+    }
+    for key, payload in (("schemas", schemas), ("catalog", catalog), ("recordings", recordings)):
+        with open(paths[key], "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+    return paths
@@ -1,12 +1,92 @@
+import os
+import argparse
+
 from utilities.pipeline import run_pipeline
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and execute pandas code for the QA set.")
+    parser.add_argument("--reexecute", action="store_true",
+                        help="Execute all generated code again on the full datasets instead of reusing "
+                             "the validation results (e.g. after the datasets changed).")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Number of questions processed concurrently.")
+    parser.add_argument("--sandbox-workers", type=int, default=0,
+                        help="Execute generated code in this many sandboxed worker processes (0 runs it in-process).")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="Wall-clock limit in seconds per snippet when sandboxed.")
+    parser.add_argument("--memory-limit-mb", type=int, default=None,
+                        help="Address-space limit in MiB per sandboxed worker process.")
+    parser.add_argument("--async-llm", action="store_true",
+                        help="Use the asyncio LLM client with adaptive concurrency and rate-limit backoff.")
+    parser.add_argument("--max-in-flight", type=int, default=64,
+                        help="Upper bound on concurrent LLM requests with --async-llm.")
+    parser.add_argument("--completion-cache", default=None, metavar="PATH",
+                        help="SQLite file used to cache LLM completions across runs.")
+    parser.add_argument("--replay", action="store_true",
+                        help="Only replay completions from --completion-cache; never call the API.")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Discard the result journal instead of resuming from it.")
+    parser.add_argument("--arrow", action="store_true",
+                        help="Memory-map the Arrow IPC datasets written by 'preprocessing.py --arrow' instead of decoding parquet.")
+    parser.add_argument("--copy-on-write", action="store_true",
+                        help="Enable pandas copy-on-write so executions share cached tables without copying them.")
+    parser.add_argument("--no-sample-first", action="store_true",
+                        help="Do not validate generated code on the sample datasets before the full ones.")
+    parser.add_argument("--candidates", type=int, default=1,
+                        help="Generate and execute this many candidate solutions per question in parallel.")
+    parser.add_argument("--majority", action="store_true",
+                        help="With --candidates, wait until most candidates agree instead of taking the first success.")
+    parser.add_argument("--consensus", type=int, default=0, metavar="N",
+                        help="Choose answers by majority vote over N programs per question (0 disables).")
+    parser.add_argument("--max-candidates", type=int, default=9,
+                        help="With --consensus, keep generating programs up to this many while agreement is low.")
+    parser.add_argument("--min-agreement", type=float, default=2 / 3,
+                        help="With --consensus, share of well-formed answers that must agree to stop generating.")
+    parser.add_argument("--trace", default=None, metavar="PATH",
+                        help="Append per-stage timing spans and token counts to this JSONL file and print a report.")
+    parser.add_argument("--group-by-dataset", action="store_true",
+                        help="Process the questions of each dataset together, loading and releasing one table at a time.")
+    parser.add_argument("--active-datasets", type=int, default=2,
+                        help="With --group-by-dataset, number of datasets processed at the same time.")
+    parser.add_argument("--prompt-budget", type=int, default=None, metavar="TOKENS",
+                        help="Keep prompts within about this many tokens by trimming the schema and retry history.")
+    parser.add_argument("--stable-prompt-prefix", action="store_true",
+                        help="Put instructions and schema before the question so providers can cache the shared prefix.")
+    parser.add_argument("--no-static-check", action="store_true",
+                        help="Do not check generated code for syntax, name, column and dtype errors before running it.")
+    parser.add_argument("--result-cache", default=None, metavar="PATH",
+                        help="SQLite file used to reuse execution results of equivalent code across runs.")
+    parser.add_argument("--engine", choices=["pandas", "sql", "race"], default="pandas",
+                        help="Generate pandas code, DuckDB SQL queries, or race one candidate of each per question.")
+    parser.add_argument("--lazy", action="store_true",
+                        help="Stream datasets in row-group batches instead of loading them, for datasets larger than memory.")
+    args = parser.parse_args()
+    if args.replay and not args.completion_cache:
+        parser.error("--replay requires --completion-cache")
+
     # Define paths
     SCHEMA_PATH = 'data/pandas_schemas.json'
-    QA_PATH = 'data/all_qa.json'
-    OUTPUT_PATH = 'intermediate_results/code_execution_results.json'
+    COLUMN_CATALOG_PATH = 'data/column_catalog.json'
+    QA_PATH = 'data/all_qa.jsonl'
+    OUTPUT_PATH = 'intermediate_results/code_execution_results.jsonl'
     DATASET_FOLDER_PATH = 'data/'
+    SAMPLE_DATASETS_PATH = os.path.join(DATASET_FOLDER_PATH, 'sample_datasets')
 
     # Run the pipeline with 2 retry attempt and default dataset folder path
-    run_pipeline(SCHEMA_PATH, QA_PATH, OUTPUT_PATH, max_retries=2, dataset_folder_path=DATASET_FOLDER_PATH)
+    run_pipeline(SCHEMA_PATH, QA_PATH, OUTPUT_PATH, max_retries=2, dataset_folder_path=DATASET_FOLDER_PATH,
+                 reexecute=args.reexecute, max_workers=args.workers,
+                 sandbox_workers=args.sandbox_workers, timeout=args.timeout,
+                 memory_limit=args.memory_limit_mb * 1024 ** 2 if args.memory_limit_mb else None,
+                 async_llm=args.async_llm, max_in_flight=args.max_in_flight,
+                 completion_cache_path=args.completion_cache, completion_cache_readonly=args.replay,
+                 resume=not args.fresh,
+                 column_catalog_path=COLUMN_CATALOG_PATH if os.path.exists(COLUMN_CATALOG_PATH) else None,
+                 use_arrow=args.arrow, copy_on_write=args.copy_on_write,
+                 sample_first=not args.no_sample_first and os.path.isdir(SAMPLE_DATASETS_PATH),
+                 candidates=args.candidates, require_majority=args.majority,
+                 consensus=args.consensus, max_candidates=args.max_candidates, min_agreement=args.min_agreement,
+                 trace_path=args.trace, group_by_dataset=args.group_by_dataset,
+                 max_active_datasets=args.active_datasets, prompt_token_budget=args.prompt_budget,
+                 stable_prompt_prefix=args.stable_prompt_prefix, static_check=not args.no_static_check,
+                 result_cache_path=args.result_cache, engine=args.engine, lazy=args.lazy)
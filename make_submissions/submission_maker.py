@@ -18,6 +18,19 @@ def load_json(file_path):
     with path.open(encoding='utf-8') as f:
         return json.load(f)
 
+def iter_results(file_path):
+    """
+    Yield the entries of a results file one at a time.
+    JSONL files are streamed line by line; JSON arrays are loaded in one go.
+    """
+    if str(file_path).endswith('.jsonl'):
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from load_json(file_path)
+
 def can_be_number(s):
     """
     Check if a string can be converted to a number.
@@ -31,50 +44,53 @@ def can_be_number(s):
 def fix_final_answer(data):
     """
     Clean and standardize the 'final_answer' field in the data.
+    Entries are yielded one at a time so any iterable can be streamed through.
     """
     for item in data:
         if 'final_answer' in item:
-            value = item['final_answer']
-
-            # If already a Python list, skip
-            if isinstance(value, list):
-                continue
-
-            # If it's a well-formed list-like string
-            if isinstance(value, str) and re.match(r'^\[.*\]$', value):
-                try:
-                    # Attempt to parse the string as a Python literal
-                    parsed_value = ast.literal_eval(value)
-                    if isinstance(parsed_value, list):
-                        # Check if it is a list of tuples
-                        if all(isinstance(i, tuple) for i in parsed_value):
-                            # Extract the first items of each tuple
-                            item['final_answer'] = [i[0] for i in parsed_value]
-                        else:
-                            # Otherwise, treat it as a normal list
-                            item['final_answer'] = parsed_value
-                        continue
-                except (ValueError, SyntaxError):
-                    pass  # Not a valid Python literal, fall through
-
-            # If it's a malformed list-like string
-            if isinstance(value, str) and re.match(r'^\[.*\]$', value):
-                try:
-                    # Clean and convert to a proper list
-                    cleaned_list = [
-                        float(x) if '.' in x else int(x)
-                        for x in value.strip('[]').split()
-                    ]
-                    item['final_answer'] = cleaned_list
-                except ValueError:
-                    pass  # If it fails, leave it unchanged
-    return data
+            item['final_answer'] = fix_answer_value(item['final_answer'])
+        yield item
+
+def fix_answer_value(value):
+    """
+    Clean and standardize a single 'final_answer' value.
+    """
+    # If already a Python list, skip
+    if isinstance(value, list):
+        return value
+
+    # If it's a well-formed list-like string
+    if isinstance(value, str) and re.match(r'^\[.*\]$', value):
+        try:
+            # Attempt to parse the string as a Python literal
+            parsed_value = ast.literal_eval(value)
+            if isinstance(parsed_value, list):
+                # Check if it is a list of tuples
+                if all(isinstance(i, tuple) for i in parsed_value):
+                    # Extract the first items of each tuple
+                    return [i[0] for i in parsed_value]
+                # Otherwise, treat it as a normal list
+                return parsed_value
+        except (ValueError, SyntaxError):
+            pass  # Not a valid Python literal, fall through
+
+    # If it's a malformed list-like string
+    if isinstance(value, str) and re.match(r'^\[.*\]$', value):
+        try:
+            # Clean and convert to a proper list
+            return [
+                float(x) if '.' in x else int(x)
+                for x in value.strip('[]').split()
+            ]
+        except ValueError:
+            pass  # If it fails, leave it unchanged
+    return value
 
 def extract_predictions(data):
     """
     Extract the 'final_answer' field from the data.
     """
-    return [i['final_answer'] for i in data]
+    return (i['final_answer'] for i in data)
 
 def write_predictions_to_file(predictions, output_file):
     """
@@ -93,9 +109,10 @@ def write_predictions_to_file(predictions, output_file):
 
 def process_json_to_predictions(input_file, output_file):
     """
-    Main function to process the JSON file and generate predictions.
+    Main function to process the JSON/JSONL file and generate predictions.
+    Entries are streamed from input to output, so memory stays flat.
     """
-    data = load_json(input_file)
+    data = iter_results(input_file)
     cleaned_data = fix_final_answer(data)
     predictions = extract_predictions(cleaned_data)
     write_predictions_to_file(predictions, output_file)
@@ -103,7 +120,7 @@ def process_json_to_predictions(input_file, output_file):
 # Example usage:
 if __name__ == '__main__':
     # Path configurations
-    ALL_RESULTS_PATH = '../intermediate_results/code_execution_results.json'
+    ALL_RESULTS_PATH = '../intermediate_results/code_execution_results.jsonl'
     PREDICTIONS_PATH = 'predictions/predictions.txt'
 
     process_json_to_predictions(ALL_RESULTS_PATH, PREDICTIONS_PATH)
@@ -1,9 +1,16 @@
 import re
 import os
 import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
 from tqdm import tqdm
 
 # Get the directory of the current file
@@ -34,9 +41,65 @@ def convert_blindtest_to_qa():
     print(f"Converted {csv_path} to {json_path}")
     return qa_list
 
+def get_source_path(name):
+    """Path of the competition parquet file for a given dataset."""
+    return f"../competition/{name}.parquet"
+
+
 def load_table(name):
     """Load the full parquet table for a given dataset."""
-    return pd.read_parquet(f"../competition/{name}.parquet")
+    return pd.read_parquet(get_source_path(name))
+
+
+# Bump when the renaming or summary logic changes so every dataset is rebuilt
+MANIFEST_VERSION = 2
+
+
+def load_manifest(manifest_path):
+    """
+    Load the preprocessing manifest, or an empty one if it is missing or outdated.
+
+    For each dataset the manifest records the size, mtime and SHA-256 of its source
+    file, the size and mtime of the parquet file written for it, and its schema summary.
+    """
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    return {'version': MANIFEST_VERSION, 'datasets': {}}
+
+
+def save_manifest(manifest, manifest_path):
+    """Write the manifest atomically so an interrupted run cannot corrupt it."""
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def file_stat(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def fingerprint_file(path, previous=None):
+    """
+    Return size, mtime and SHA-256 of a file. The hash is only computed when size or
+    mtime differ from the `previous` fingerprint.
+    """
+    fingerprint = file_stat(path)
+    if previous and previous.get('size') == fingerprint['size'] and \
+            previous.get('mtime_ns') == fingerprint['mtime_ns']:
+        fingerprint['sha256'] = previous['sha256']
+        return fingerprint
+
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    fingerprint['sha256'] = sha256.hexdigest()
+    return fingerprint
 
 
 def normalize_spanish_letters(text):
@@ -106,50 +169,187 @@ def serialize_value(value):
     return json.dumps(value) if isinstance(value, (list, dict)) else str(value)
 
 
-def get_column_unique_values_summary_string(df):
+def format_column_summary(column, value_type, example_candidates, total_unique):
+    """
+    Format the summary line of one column from its first distinct serialized values.
+    """
+    processed_values = []
+    cumulative_char_count = 0
+
+    for value in example_candidates:
+        if cumulative_char_count > 50:
+            break
+        if len(value) > 100:
+            value = value[:97] + "..."
+        processed_values.append(value)
+        cumulative_char_count += len(value)
+
+    example_values = ", ".join(processed_values)
+    return (f"Column Name: {column}, Data type -- {value_type}, -- Example values: {example_values},"
+            f" Total unique elements: {total_unique}")
+
+
+def distinct_arrow_values(column):
+    """
+    Distinct non-null values of an Arrow column in order of first appearance,
+    or None when Arrow cannot hash the column type (e.g. nested lists).
+    """
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    column = pc.drop_null(column)
+    if pa.types.is_floating(column.type):
+        # pandas dropna also drops NaN, which Arrow does not treat as null
+        column = column.filter(pc.invert(pc.is_nan(column)))
+    try:
+        return pc.unique(column)
+    except (pa.ArrowNotImplementedError, pa.ArrowInvalid):
+        return None
+
+
+def pandas_dtypes(table):
+    """
+    pandas dtypes of an Arrow table's columns as pd.read_parquet would report them.
+
+    The schema alone decides every dtype except for integer and boolean columns with
+    missing values, which pandas loads as float64 and object; only those are decoded.
+    """
+    dtypes = table.slice(0, 0).to_pandas().dtypes
+    for column, dtype in dtypes.items():
+        if isinstance(dtype, np.dtype) and dtype.kind in 'iub' and table.column(column).null_count:
+            dtypes[column] = table.select([column]).to_pandas()[column].dtype
+    return dtypes
+
+
+def get_column_unique_values_summary_string(data):
     """
     Generate a string summary of column names, value types, unique values,
-    and total number of unique items for a pandas DataFrame.
+    and total number of unique items for a pandas DataFrame or Arrow table.
+
+    Distinct values and counts are computed on the Arrow arrays; only the few example
+    values that end up in the summary are serialized in Python.
 
     Args:
-        df (pd.DataFrame): The DataFrame to analyze.
+        data (pd.DataFrame or pa.Table): The data to analyze.
 
     Returns:
-        str: A formatted string summarizing the DataFrame.
+        str: A formatted string summarizing the data.
     """
+    table = pa.Table.from_pandas(data, preserve_index=False) if isinstance(data, pd.DataFrame) else data
+    dtypes = pandas_dtypes(table)
+
     summary_lines = []
     intro = 'Here are the columns for the dataset \n'
-    
-    for column in df.columns:
-        value_type = df[column].dtype
-        unique_values = df[column].dropna().map(serialize_value).unique()
-        limited_values = unique_values[:5]
-        processed_values = []
-        cumulative_char_count = 0
-        
-        for value in limited_values:
-            if cumulative_char_count > 50:
-                break
-            if len(value) > 100:
-                value = value[:97] + "..."
-            processed_values.append(value)
-            cumulative_char_count += len(value)
-        
-        example_values = ", ".join(processed_values)
-        total_unique = len(unique_values)
-        line = (f"Column Name: {column}, Data type -- {value_type}, -- Example values: {example_values},"
-                f" Total unique elements: {total_unique}")
-        summary_lines.append(line)
-    
+
+    for column, value_type in dtypes.items():
+        unique_values = distinct_arrow_values(table.column(column))
+        if unique_values is None:
+            # Types Arrow cannot hash fall back to serializing every value
+            unique_values = table.select([column]).to_pandas()[column].dropna().map(serialize_value).unique()
+            example_candidates = unique_values[:5]
+        else:
+            examples = unique_values.slice(0, 5).to_pandas()
+            if examples.dtype != value_type and isinstance(value_type, np.dtype) and value_type.kind == 'f':
+                examples = examples.astype(value_type)  # Integers with missing values, e.g. 1.0
+            example_candidates = examples.map(serialize_value)
+        summary_lines.append(format_column_summary(column, value_type, example_candidates, len(unique_values)))
+
     return intro + "\n".join(summary_lines)
 
 
-def main(test_qa_path, output_root, all_datasets_dir, schema_output_path, qa_json_output_path):
+def summarize_parquet_file(file_path):
+    """Read a parquet file as an Arrow table and return its schema summary string."""
+    return get_column_unique_values_summary_string(pq.read_table(file_path))
+
+
+def get_column_catalog(table):
+    """
+    Map each column of an Arrow table to its pandas dtype and Arrow type.
+    Used by the pipeline to prune and check generated code without reading any data.
+    """
+    dtypes = pandas_dtypes(table)
+    return {
+        column: {"dtype": str(dtype), "arrow_type": str(table.schema.field(column).type)}
+        for column, dtype in dtypes.items()
+    }
+
+
+def describe_parquet_file(file_path):
+    """Return the schema summary and the column catalog of a parquet file."""
+    table = pq.read_table(file_path)
+    return {"schema": get_column_unique_values_summary_string(table), "columns": get_column_catalog(table)}
+
+
+def write_arrow_file(df, arrow_path):
+    """
+    Write a DataFrame as uncompressed Arrow IPC (Feather v2) so the pipeline can
+    memory-map it instead of decoding parquet.
+    """
+    table = pa.Table.from_pandas(df)
+    tmp_path = arrow_path + '.tmp'
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, arrow_path)
+
+
+# Rows kept in each sample dataset, and the cardinality up to which a column counts as categorical
+SAMPLE_ROWS = 1000
+SAMPLE_CATEGORY_LIMIT = 200
+
+
+def stratified_sample(df, sample_rows=SAMPLE_ROWS, category_limit=SAMPLE_CATEGORY_LIMIT, seed=0):
+    """
+    Take a small sample of a DataFrame that still contains every category value.
+
+    For each column with at most `category_limit` distinct values (nulls included), one
+    row per value is kept, so that filters on category values and lookups by key behave
+    as on the full data. The rows holding the minimum and maximum of each numeric or
+    datetime column are kept as well, and the sample is topped up with random rows to
+    `sample_rows`. Rows keep their original order.
+    """
+    if len(df) <= sample_rows:
+        return df.reset_index(drop=True)
+
+    positions = pd.RangeIndex(len(df))
+    keep = set()
+    for position, column in enumerate(df.columns):
+        values = df.iloc[:, position]
+        try:
+            if values.nunique(dropna=False) <= category_limit:
+                keep.update(positions[~values.duplicated().to_numpy()])
+        except TypeError:
+            continue  # Unhashable values (lists, dicts) are not categories
+        if (pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)) or \
+                pd.api.types.is_datetime64_any_dtype(values):
+            valid = values.reset_index(drop=True).dropna()
+            if len(valid):
+                keep.update((valid.idxmin(), valid.idxmax()))
+
+    remaining = sample_rows - len(keep)
+    if remaining > 0:
+        rest = np.setdiff1d(np.arange(len(df)), np.fromiter(keep, dtype=np.int64, count=len(keep)))
+        rng = np.random.default_rng(seed)
+        keep.update(rng.choice(rest, size=min(remaining, len(rest)), replace=False).tolist())
+    return df.iloc[sorted(keep)].reset_index(drop=True)
+
+
+def write_sample_file(df, sample_path, sample_rows=SAMPLE_ROWS):
+    """Write the stratified sample of a dataset used to validate generated code quickly."""
+    tmp_path = sample_path + '.tmp'
+    stratified_sample(df, sample_rows).to_parquet(tmp_path)
+    os.replace(tmp_path, sample_path)
+
+
+def main(test_qa_path, output_root, all_datasets_dir, schema_output_path, qa_json_output_path, force=False,
+         write_arrow=False, sample_datasets_dir=None, sample_rows=SAMPLE_ROWS):
     # First convert the blindtest CSV to JSON if needed
     if os.path.exists('../competition/iberlef_blindtest.csv'):
         print("Converting blindtest CSV to JSON format...")
         convert_blindtest_to_qa()
-    
+
+    # Only datasets whose source or output changed since the last run are rebuilt
+    manifest_path = os.path.join(output_root, 'preprocessing_manifest.json')
+    manifest = {'version': MANIFEST_VERSION, 'datasets': {}} if force else load_manifest(manifest_path)
+    entries = manifest['datasets']
+
     # Step 1: Fixing and Creating Datasets 
     print("Step 1: Processing datasets and creating parquet files...")
     # Read the test_qa file to get dataset names
@@ -157,39 +357,83 @@ def main(test_qa_path, output_root, all_datasets_dir, schema_output_path, qa_jso
     datasets = df['dataset'].unique()
 
     for dataset in datasets:
+        entry = entries.setdefault(dataset, {})
+        output_path = os.path.join(all_datasets_dir, f"{dataset}.parquet")
+        arrow_path = os.path.join(all_datasets_dir, f"{dataset}.arrow")
+        sample_path = os.path.join(sample_datasets_dir, f"{dataset}.parquet") if sample_datasets_dir else None
+        source = fingerprint_file(get_source_path(dataset), previous=entry.get('source'))
+        if entry.get('source', {}).get('sha256') == source['sha256'] and os.path.exists(output_path) and \
+                (not write_arrow or os.path.exists(arrow_path)) and \
+                (not sample_path or entry.get('sample_rows') == sample_rows and os.path.exists(sample_path)):
+            entry['source'] = source
+            continue
+
         print(f"Processing dataset: {dataset}")
         df_table = load_table(dataset)
         df_table = rename_columns_for_sql(df_table)
-        df_table.to_parquet(os.path.join(all_datasets_dir, f"{dataset}.parquet"))
+        df_table.to_parquet(output_path)
+        if write_arrow:
+            write_arrow_file(df_table, arrow_path)
+        elif os.path.exists(arrow_path):
+            os.remove(arrow_path)  # Would be stale
+        if sample_path:
+            write_sample_file(df_table, sample_path, sample_rows)
+            entry['sample_rows'] = sample_rows
+        entry['source'] = source
+        save_manifest(manifest, manifest_path)
 
     # Step 2: Creating Schema Summary
     print("Step 2: Generating schema summaries for all datasets...")
     files = os.listdir(all_datasets_dir)
     print(f"Parquet files found: {files}")
-    schemas = {}
 
-    for file in tqdm(files):
-        if file.endswith('.parquet'):
-            file_path = os.path.join(all_datasets_dir, file)
-            df_parquet = pd.read_parquet(file_path)
-            summary_string = get_column_unique_values_summary_string(df_parquet)
-            file_name = file.split('.')[0]
-            schemas[file_name] = summary_string
+    parquet_files = sorted(file for file in files if file.endswith('.parquet'))
+    stale = []
+    for file in parquet_files:
+        entry = entries.setdefault(file.split('.')[0], {})
+        output = file_stat(os.path.join(all_datasets_dir, file))
+        if entry.get('output') != output or 'schema' not in entry or 'columns' not in entry:
+            entry['output'] = output
+            stale.append(file)
+    print(f"Summarizing {len(stale)} new or changed datasets, reusing {len(parquet_files) - len(stale)}")
+    file_paths = [os.path.abspath(os.path.join(all_datasets_dir, file)) for file in stale]
+
+    # Each dataset is summarized in its own process
+    with ProcessPoolExecutor() as executor:
+        descriptions = list(tqdm(executor.map(describe_parquet_file, file_paths), total=len(file_paths)))
+    for file, description in zip(stale, descriptions):
+        entries[file.split('.')[0]].update(description)
+    save_manifest(manifest, manifest_path)
 
+    schemas = {file.split('.')[0]: entries[file.split('.')[0]]['schema'] for file in parquet_files}
     with open(schema_output_path, 'w', encoding='utf-8') as f:
         json.dump(schemas, f, ensure_ascii=False, indent=4)
 
-    # Step 3: Creating QA JSON file from QA CSV
-    print("Step 3: Creating QA JSON file...")
+    # Column names and dtypes of every renamed dataset, for code rewriting and checks
+    column_catalog = {file.split('.')[0]: entries[file.split('.')[0]]['columns'] for file in parquet_files}
+    with open(os.path.join(output_root, 'column_catalog.json'), 'w', encoding='utf-8') as f:
+        json.dump(column_catalog, f, ensure_ascii=False, indent=2)
+
+    # Step 3: Creating QA JSONL file from QA CSV, one question per line so it can be streamed
+    print("Step 3: Creating QA JSONL file...")
     qa_df = pd.read_json(test_qa_path)
-    qa_json = qa_df.to_dict(orient="records")
-    with open(qa_json_output_path, "w") as f:
-        json.dump(qa_json, f, indent=2)
+    with open(qa_json_output_path, "w", encoding="utf-8") as f:
+        for record in qa_df.to_dict(orient="records"):
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
 
     print("All processing complete.")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess competition datasets and questions.")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore the manifest and rebuild every dataset and schema summary.")
+    parser.add_argument("--arrow", action="store_true",
+                        help="Also write each dataset as uncompressed Arrow IPC (<name>.arrow) for memory-mapped loading.")
+    parser.add_argument("--sample-rows", type=int, default=SAMPLE_ROWS,
+                        help="Rows per stratified sample dataset used to validate generated code first.")
+    args = parser.parse_args()
+
     # Path to the competition folder which contains the test_qa.csv file and parquet datasets
     TEST_QA_PATH = '../competition/all_qa.json'  
     # Print all the files under current folder
@@ -197,12 +441,14 @@ if __name__ == "__main__":
     # Output directory structure
     OUTPUT_ROOT = os.path.join("..", "data")  # Root directory for all output files
     ALL_DATASETS_DIR = os.path.join(OUTPUT_ROOT, "all_datasets")  # Directory for complete dataset parquet files
+    SAMPLE_DATASETS_DIR = os.path.join(OUTPUT_ROOT, "sample_datasets")  # Directory for stratified sample datasets
     SCHEMA_OUTPUT_PATH = os.path.join(OUTPUT_ROOT, 'pandas_schemas.json')  # Path for the schema summary JSON
-    QA_JSON_OUTPUT_PATH = os.path.join(OUTPUT_ROOT, "all_qa.json")  # Path for the processed QA JSON file
+    QA_JSON_OUTPUT_PATH = os.path.join(OUTPUT_ROOT, "all_qa.jsonl")  # Path for the processed QA JSONL file
     
     # Create output directories if they don't exist
-    for directory in [OUTPUT_ROOT, ALL_DATASETS_DIR]:
+    for directory in [OUTPUT_ROOT, ALL_DATASETS_DIR, SAMPLE_DATASETS_DIR]:
         if not os.path.exists(directory):
             os.makedirs(directory)
             
-    main(TEST_QA_PATH, OUTPUT_ROOT, ALL_DATASETS_DIR, SCHEMA_OUTPUT_PATH, QA_JSON_OUTPUT_PATH) 
\ No newline at end of file
+    main(TEST_QA_PATH, OUTPUT_ROOT, ALL_DATASETS_DIR, SCHEMA_OUTPUT_PATH, QA_JSON_OUTPUT_PATH, force=args.force,
+         write_arrow=args.arrow, sample_datasets_dir=SAMPLE_DATASETS_DIR, sample_rows=args.sample_rows) 
\ No newline at end of file
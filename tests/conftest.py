@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The LLM clients are created on import; tests never call them
+os.environ.setdefault("API_KEY", "test")
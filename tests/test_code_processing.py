@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from utilities.code_execution import capture_exec_output
+from utilities.code_processing import prune_parquet_reads
+
+CATALOG = {"data": {
+    "country": {"dtype": "object", "arrow_type": "string"},
+    "age": {"dtype": "int64", "arrow_type": "int64"},
+    "score": {"dtype": "float64", "arrow_type": "double"},
+    "name": {"dtype": "object", "arrow_type": "string"},
+}}
+
+
+@pytest.fixture(scope="module")
+def path(tmp_path_factory):
+    frame = pd.DataFrame({
+        "country": ["Spain", "France", "Spain", "Italy", None],
+        "age": [25, 35, 45, 55, 65],
+        "score": [1.5, None, 3.0, 4.5, 2.0],
+        "name": ["a", "b", "c", "d", "e"],
+    })
+    path = tmp_path_factory.mktemp("prune") / "data.parquet"
+    frame.to_parquet(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("snippet, columns", [
+    ("result = df['age'].mean()", ['age']),
+    ("result = df[df['country'] == 'Spain']['age'].max()", ['country', 'age']),
+    ("result = df.loc[df['age'] > 30, 'score'].sum()", ['age', 'score']),
+    ("result = df[df.age > 30].index.tolist()", None),
+    ("result = df.groupby('country')['score'].mean()", ['country', 'score']),
+    ("result = len(df)", ['country']),
+    ("result = df.describe()", None),
+    ("df = df.dropna()\nresult = df['age'].sum()", None),
+])
+def test_prune_parquet_reads(path, snippet, columns):
+    code = f"import pandas as pd\ndf = pd.read_parquet({path!r})\n{snippet}"
+    pruned = prune_parquet_reads(code, CATALOG)
+    if columns is None:
+        assert pruned == code
+    else:
+        assert f"pd.read_parquet({path!r}, columns={columns!r})" in pruned
+        assert "filters=" not in pruned
+    # Pruning never changes the answer
+    result, expected = capture_exec_output(pruned), capture_exec_output(code)
+    if isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(result, expected)
+    elif isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(result, expected)
+    else:
+        assert result == expected
+
+
+def test_unknown_datasets_and_syntax_errors_are_left_alone(path):
+    code = "df = pd.read_parquet('other.parquet')\nresult = df['age'].sum()"
+    assert prune_parquet_reads(code, CATALOG) == code
+    assert prune_parquet_reads("df = pd.read_parquet(", CATALOG) == "df = pd.read_parquet("
+
+
+def test_dataframe_attributes_named_like_columns_are_not_column_uses(tmp_path):
+    path = str(tmp_path / "counts.parquet")
+    pd.DataFrame({"size": [1, 2, 3], "count": [4, 5, 6], "label": ["a", "b", "c"]}).to_parquet(path)
+    catalog = {"counts": {"size": {"dtype": "int64", "arrow_type": "int64"},
+                          "count": {"dtype": "int64", "arrow_type": "int64"},
+                          "label": {"dtype": "object", "arrow_type": "string"}}}
+    for snippet in ["result = df.size", "result = df.count()", "result = df[df['label'] != 'a'].count()"]:
+        code = f"import pandas as pd\ndf = pd.read_parquet({path!r})\n{snippet}"
+        assert prune_parquet_reads(code, catalog) == code
+    code = f"import pandas as pd\ndf = pd.read_parquet({path!r})\nresult = df['size'].sum()"
+    assert f"columns={['size']!r}" in prune_parquet_reads(code, catalog)
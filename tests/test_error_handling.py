@@ -0,0 +1,30 @@
+import pytest
+
+from utilities.error_handling import is_conclusive_sample_error
+
+COLUMNS = ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("output, code, conclusive", [
+    ("Error :SyntaxError: invalid syntax (<string>, line 1)", "x = (", True),
+    ("Error :NameError: name 'dff' is not defined", "result = dff", True),
+    ("Error :KeyError: 'zz'", "result = df['zz']", True),
+    ("Error :KeyError: \"['zz'] not in index\"", "result = df[['a', 'zz']]", True),
+    ("Error :KeyError: \"None of [Index(['zz'], dtype='object')] are in the [columns]\"",
+     "result = df.loc[:, ['zz']]", True),
+    # A row the sample does not hold
+    ("Error :KeyError: 0", "result = df[(df.a == 'x') & (df.b == 'q')]['c'].mode()[0]", False),
+    ("Error :KeyError: 'z'", "result = df.set_index('a').loc['z', 'c']", False),
+    # Present in the full data, missing after a rename or from the sample
+    ("Error :KeyError: 'a'", "result = df['a']", False),
+    ("Error :TypeError: unsupported operand type(s) for +: 'float' and 'str'", "result = df['a'] + 1", False),
+    ("Error :AttributeError: Can only use .str accessor with string values!", "result = df['a'].str.lower()", False),
+    ("Error :IndexError: index 0 is out of bounds for axis 0 with size 0", "result = df['a'].iloc[0]", False),
+    (42, "result = 42", False),
+])
+def test_conclusive_sample_errors(output, code, conclusive):
+    assert is_conclusive_sample_error(output, code, COLUMNS) is conclusive
+
+
+def test_key_errors_without_catalog_are_inconclusive():
+    assert not is_conclusive_sample_error("Error :KeyError: 'zz'", "result = df['zz']")
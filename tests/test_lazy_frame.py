@@ -0,0 +1,140 @@
+"""Snippets must give the same answer with `lazy=True` as with an eager read."""
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from utilities.code_execution import capture_exec_output
+from utilities.lazy_frame import last_peak_memory, reset_peak_memory
+
+
+@pytest.fixture(scope="module")
+def path(tmp_path_factory):
+    """A parquet file written by Arrow (no pandas metadata), in several row groups."""
+    rows = 30
+    table = pa.table({
+        'country': pa.array(['Spain', 'France', 'Spain', 'Italy', 'Spain', 'France'] * (rows // 6)),
+        'age': pa.array([25, 35, 45, 55, 65, 30] * (rows // 6), pa.int64()),
+        'cat': pa.array(list('abcabc') * (rows // 6)),
+        'iv': pa.array([1, None, 3, 4, 5, None] * (rows // 6), pa.int64()),
+        'x': pa.array([1.0, 2.5, 3.5, None, 5.0, 6.0] * (rows // 6)),
+        'flag': pa.array([True, False, None, True, True, False] * (rows // 6)),
+        'ok': pa.array([True, False, True, True, False, False] * (rows // 6)),
+    })
+    path = tmp_path_factory.mktemp("lazy") / "data.parquet"
+    pq.write_table(table, path, row_group_size=7)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def pandas_path(tmp_path_factory):
+    """A parquet file written by pandas, with a nullable integer column."""
+    frame = pd.DataFrame({'n': pd.array([1, None, 3, 3], dtype="Int64"), 'y': [1.5, 2.0, 2.5, 3.0]})
+    path = tmp_path_factory.mktemp("lazy") / "pandas.parquet"
+    frame.to_parquet(path, row_group_size=3)
+    return str(path)
+
+
+SNIPPETS = [
+    "result = len(df)",
+    "result = df.shape",
+    "result = df[df['country'] == 'Spain']['age'].mean()",
+    "f = df[df['country'] == 'Spain']\nresult = f[f['age'] > 30]",
+    "f = df[df['country'] == 'Spain']\nresult = f['cat'][f['iv'] > 3]",
+    "result = df.loc[df['x'] > 2, 'cat']",
+    "result = df.loc[df['x'] > 2]",
+    "result = df.loc[(df['age'] > 30) & (df['cat'] != 'a'), ['country', 'age']]",
+    "result = df['cat'].loc[df['x'] > 2]",
+    "result = df['iv'].sum()",
+    "result = df['iv'].mean()",
+    "result = df['iv'].max()",
+    "result = df['iv'].min()",
+    "result = df['iv'].count()",
+    "result = df['iv'].value_counts()",
+    "result = df['iv'].value_counts(normalize=True)",
+    "result = df['x'].sum()",
+    "result = df['x'].max()",
+    "result = df['age'].sum()",
+    "result = df['age'].value_counts()",
+    "result = df['ok'].sum()",
+    "result = df['ok'].min()",
+    "result = df['flag'].sum()",
+    "result = df['flag'].value_counts()",
+    "result = df['country'].value_counts()",
+    "result = df['cat'].value_counts(normalize=True)",
+    "result = df['cat'].max()",
+    "result = df[df['iv'].isin([1, 3])]",
+    "result = (df['age'] > 40).sum()",
+    "result = (~(df['age'] > 40)).any()",
+    "result = df[df['x'] > 100]",
+    "result = df[df['x'] > 100]['iv'].sum()",
+    "result = df.head(3)",
+    "result = df['iv']",
+    "result = df.groupby('cat')['age'].sum()",
+    "df['double'] = df['age'] * 2\nresult = df[df['double'] > 100]['double'].sum()",
+    "df.loc[df['age'] > 50, 'cat'] = 'old'\nresult = df['cat'].value_counts()",
+    "df.dropna(inplace=True)\nresult = len(df)",
+    "result = pd.to_datetime(df['age'], unit='D').dt.year.max()",
+    "result = pd.concat([df, df[df['age'] > 40]])",
+    "result = pd.concat({'a': df['age'], 'b': df['x']}, axis=1)",
+    "result = pd.merge(df, df[['cat']].drop_duplicates(), on='cat')",
+    "result = df.merge(df[['cat', 'age']], on='cat').shape",
+    "result = df[['age']].join(df[['x']])",
+    "result = df['age'].where(df['age'] > 40, df['x'])",
+    "result = isinstance(df, pd.DataFrame), isinstance(df['age'], pd.Series), isinstance(df['age'] > 3, pd.Series)",
+    "result = type(df).__name__, type(df['age']) is pd.Series, isinstance(pd.Series, type)",
+]
+
+
+def assert_same(lazy, eager):
+    assert type(lazy) is type(eager), (lazy, eager)
+    if isinstance(eager, pd.DataFrame):
+        pd.testing.assert_frame_equal(lazy, eager)
+    elif isinstance(eager, pd.Series):
+        pd.testing.assert_series_equal(lazy, eager)
+    elif isinstance(eager, float) and math.isnan(eager):
+        assert math.isnan(lazy)
+    else:
+        assert lazy == eager
+
+
+def run_both(path, snippet):
+    code = f"import pandas as pd\ndf = pd.read_parquet({path!r})\n{snippet}"
+    eager = capture_exec_output(code, dataset_cache=None)
+    lazy = capture_exec_output(code, lazy=True)
+    return lazy, eager
+
+
+@pytest.mark.parametrize("snippet", SNIPPETS)
+def test_lazy_matches_eager(path, snippet):
+    lazy, eager = run_both(path, snippet)
+    assert not (isinstance(eager, str) and eager.startswith("Error")), eager
+    assert_same(lazy, eager)
+
+
+@pytest.mark.parametrize("snippet", [
+    "result = df['n'].sum()",
+    "result = df['n'].max()",
+    "result = df['n'].value_counts()",
+    "result = df[df['y'] > 1.7]",
+])
+def test_lazy_matches_eager_with_pandas_metadata(pandas_path, snippet):
+    assert_same(*run_both(pandas_path, snippet))
+
+
+def test_peak_memory_is_recorded(path):
+    reset_peak_memory()
+    capture_exec_output(f"import pandas as pd\nresult = pd.read_parquet({path!r})['age'].sum()")
+    assert last_peak_memory() is None
+    capture_exec_output(f"import pandas as pd\nresult = pd.read_parquet({path!r})['age'].sum()", lazy=True)
+    assert last_peak_memory() > 0
+
+
+def test_predicates_of_other_files_are_not_pushed_down(path, pandas_path):
+    snippet = f"other = pd.read_parquet({pandas_path!r})\nresult = df[other['y'] > 2]"
+    # pandas aligns a mask of another frame on its row labels instead of filtering the scan with it
+    with pytest.warns(UserWarning):
+        assert_same(*run_both(path, snippet))
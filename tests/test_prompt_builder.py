@@ -0,0 +1,20 @@
+from utilities.prompt_builder import PromptBudget, compact_schema
+
+SCHEMA = "Here are the columns for the dataset \n" + "\n".join(
+    f"Column Name: col_{i}, Data type -- int64, -- Example values: 1, 2, 3, Total unique elements: 3"
+    for i in range(150)
+)
+
+
+def test_omitted_columns_are_always_mentioned():
+    compacted = compact_schema(SCHEMA, "What is the mean of col_7?", 30)
+    assert "Column Name: col_7," in compacted
+    assert compacted.splitlines()[-1] == "Other columns (details omitted): 149 more"
+
+
+def test_long_retry_histories_leave_room_for_the_schema():
+    history = [("result = df['col_1'].sum()\n" * 200, "Error :KeyError: 'x'")] * 3
+    schema, _ = PromptBudget(3000).fit(SCHEMA, "What is the mean of col_7?", "Answer with code.", history)
+    lines = schema.splitlines()
+    assert sum(line.startswith("Column Name:") for line in lines) > 10
+    assert lines[-1].startswith("Other columns (details omitted):")
@@ -0,0 +1,8 @@
+from utilities.question_processing import candidate_error_entry
+
+
+def test_candidate_error_entries_keep_the_error_type():
+    entry = candidate_error_entry({"candidate": 1, "engine": "pandas", "stage": "full", "modified_code": "x",
+                                   "error": "Error :KeyError: 'price'"})
+    assert entry["exception"] == "KeyError"
+    assert entry["traceback"] == ""
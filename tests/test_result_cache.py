@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from utilities.result_cache import ResultCache, normalize_code
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "people.parquet"
+    pd.DataFrame({"age": [20, 30, 40]}).to_parquet(path)
+    return path
+
+
+def test_renamed_variables_share_a_key(tmp_path, dataset):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    first = f"df = pd.read_parquet('{dataset}')\nprint(df['age'].max())"
+    second = f"frame = pd.read_parquet('{dataset}')  # ages\nprint(frame['age'].max())"
+    assert cache.key(first) is not None
+    assert cache.key(first) == cache.key(second)
+
+
+@pytest.mark.parametrize("code", [
+    "t = 25\nprint(df.query('age > @t'))",
+    "t = 25\nprint(pd.eval('t + 1'))",
+    "t = 25\nprint(eval('t'))",
+    "t = 25\nprint(f'{t=}')",
+    "t = 25\nprint(locals()['t'])",
+])
+def test_names_referenced_in_strings_are_not_cacheable(code):
+    assert normalize_code(code) is None
+
+
+def test_plain_f_strings_stay_cacheable():
+    assert normalize_code("t = 25\nprint(f'{t} years')") is not None
+
+
+def test_execution_modes_do_not_share_keys(tmp_path, dataset):
+    code = f"df = pd.read_parquet('{dataset}')\nprint(df['age'].max())"
+    eager = ResultCache(str(tmp_path / "cache.sqlite"), mode={"lazy": False})
+    lazy = ResultCache(str(tmp_path / "cache.sqlite"), mode={"lazy": True})
+    assert eager.key(code) != lazy.key(code)
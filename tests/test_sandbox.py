@@ -0,0 +1,36 @@
+import threading
+import contextvars
+
+import pytest
+
+from utilities.cancellation import CANCELLED_ERROR, cancel_on
+from utilities.sandbox import SandboxPool
+
+
+@pytest.fixture
+def pool():
+    with SandboxPool(1, timeout=30) as pool:
+        yield pool
+
+
+def test_cancelled_snippets_return_at_once_and_keep_their_worker(pool):
+    assert pool.run("print(1)") == 1
+    worker = pool._workers[0]
+    event = threading.Event()
+
+    def run():
+        cancel_on(event)
+        return pool.run("import time\ntime.sleep(1)\nprint(2)")
+
+    threading.Timer(0.2, event.set).start()
+    assert contextvars.copy_context().run(run) == CANCELLED_ERROR
+    assert pool.run("print(3)") == 3
+    assert pool._workers == [worker]
+
+
+def test_timed_out_workers_are_replaced():
+    with SandboxPool(1, timeout=0.5) as pool:
+        worker = pool._workers[0]
+        assert pool.run("import time\ntime.sleep(5)").startswith("Error :TimeoutError:")
+        assert pool.run("print(4)") == 4
+        assert pool._workers != [worker]
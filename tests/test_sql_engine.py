@@ -0,0 +1,72 @@
+import time
+import threading
+import contextvars
+
+import pandas as pd
+import pytest
+
+from utilities.cancellation import CANCELLED_ERROR, cancel_on
+from utilities.sql_engine import prepare_query, run_sql
+
+duckdb = pytest.importorskip("duckdb")
+
+
+@pytest.fixture(scope="module")
+def folder(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("sql")
+    (folder / "all_datasets").mkdir()
+    pd.DataFrame({"name": ["a", "b", "c"], "age": [20, 30, 40]}).to_parquet(folder / "all_datasets" / "people.parquet")
+    (folder / "secret.csv").write_text("x\n1\n")
+    return folder
+
+
+def run(folder, query):
+    return run_sql(prepare_query(query, "people", f"{folder}/"))
+
+
+def test_queries_read_their_dataset(folder):
+    assert run(folder, "SELECT max(age) FROM people") == 40
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM read_csv('{folder}/secret.csv')",
+    "COPY (SELECT 1) TO '{folder}/out.csv'",
+    "ATTACH '{folder}/other.db'",
+    "INSTALL httpfs",
+    "SET enable_external_access = true",
+])
+def test_queries_cannot_reach_anything_else(folder, query):
+    assert run(folder, query.format(folder=folder)).startswith("Error :")
+    assert not (folder / "out.csv").exists()
+
+
+@pytest.mark.parametrize("query, answer", [
+    ("SELECT count(*) FROM people WHERE age > 25", 2),
+    ("SELECT list(name ORDER BY age) FROM people WHERE age > 35", ["c"]),
+    ("SELECT list(name ORDER BY age) FROM people WHERE age > 25", ["b", "c"]),
+    ("SELECT list(name) FROM people WHERE age > 99", []),
+    ("SELECT name FROM people WHERE age > 25 ORDER BY age", ["b", "c"]),
+    ("SELECT avg(age) > 25 FROM people", True),
+])
+def test_answer_formats(folder, query, answer):
+    assert run(folder, query) == answer
+
+
+SLOW_QUERY = "SELECT count(*) FROM range(10000000000) a WHERE a.range % 7 = 3"
+
+
+def test_queries_are_interrupted_after_the_timeout(folder):
+    assert run_sql(prepare_query(SLOW_QUERY, "people", f"{folder}/"), timeout=0.2).startswith("Error :TimeoutError:")
+
+
+def test_cancelled_queries_are_interrupted(folder):
+    event = threading.Event()
+
+    def query():
+        cancel_on(event)
+        return run_sql(prepare_query(SLOW_QUERY, "people", f"{folder}/"), timeout=60)
+
+    threading.Timer(0.2, event.set).start()
+    start = time.monotonic()
+    assert contextvars.copy_context().run(query) == CANCELLED_ERROR
+    assert time.monotonic() - start < 10
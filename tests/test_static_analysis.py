@@ -0,0 +1,61 @@
+import pytest
+
+from utilities.static_analysis import check_code
+
+CATALOG = {"people": {
+    "country": {"dtype": "object", "arrow_type": "string"},
+    "age": {"dtype": "int64", "arrow_type": "int64"},
+    "score": {"dtype": "float64", "arrow_type": "double"},
+    "joined": {"dtype": "datetime64[ns]", "arrow_type": "timestamp[ns]"},
+}}
+
+READ = "import pandas as pd\ndf = pd.read_parquet('people.parquet')\n"
+
+
+@pytest.mark.parametrize("snippet, error", [
+    ("result = df['agee'].mean()", "Error :KeyError: Column 'agee' does not exist in dataset 'people'. Did you mean 'age'?"),
+    ("result = df.groupby('countri')['age'].sum()", "Error :KeyError: Column 'countri'"),
+    ("result = df[df['age'] > 30][['country', 'nam']]", "Error :KeyError: Column 'nam'"),
+    ("result = df.scores.max()", "Error :AttributeError: 'DataFrame' object has no attribute 'scores'"),
+    ("result = df['age'].str.len()", "Error :AttributeError: Can only use .str accessor"),
+    ("result = df['country'].mean()", "Error :TypeError: Cannot perform reduction 'mean'"),
+    ("result = df[df['country'] > 3]", "Error :TypeError: Cannot compare column 'country'"),
+    ("result = undefined_name + 1", "Error :NameError: name 'undefined_name' is not defined"),
+    ("result = df['age'].sum(", "Error :SyntaxError:"),
+])
+def test_flagged(snippet, error):
+    assert check_code(READ + snippet, CATALOG).startswith(error)
+
+
+def test_unknown_datasets_are_flagged():
+    code = "import pandas as pd\ndf = pd.read_parquet('peoples.parquet')\nresult = len(df)"
+    assert check_code(code, CATALOG) == \
+        "Error :FileNotFoundError: Dataset 'peoples' does not exist. Did you mean 'people'?"
+    # Without a catalog there is nothing to check the dataset against
+    assert check_code(code) is None
+
+
+@pytest.mark.parametrize("snippet", [
+    "result = df['age'].mean()",
+    "result = df.age.max() + df.score.min()",
+    "col = 'age'\nresult = df[col].sum()",
+    "result = [df[c].nunique() for c in df.columns]",
+    "result = df[f'{\"cou\"}ntry'].unique()",
+    "result = df['country'].str.lower().value_counts()",
+    "result = df['joined'].dt.year.max()",
+    "df = df.rename(columns={'age': 'years'})\nresult = df['years'].mean()",
+    "renamed = df.rename(columns={'age': 'years'})\nresult = renamed['years'].mean()",
+    "result = df.assign(double=df['age'] * 2)['double'].sum()",
+    "result = df.assign(double=df['age'] * 2).double.sum()",
+    "df['double'] = df['age'] * 2\nresult = df['double'].sum()",
+    "df.insert(0, 'double', df['age'] * 2)\nresult = df.double.sum()",
+    "result = df.groupby('country').size().reset_index().columns.tolist()",
+    "result = df.groupby('country')['age'].mean().idxmax()",
+    "result = df.describe().T.shape",
+    "result = df.sort_values('age').index[0]",
+    "result = df[df['age'] > 30].shape[0]",
+    "result = df.select_dtypes('number').columns.tolist()",
+    "result = (df['score'] * 2).round(1).tolist()",
+])
+def test_valid_code_is_not_flagged(snippet):
+    assert check_code(READ + snippet, CATALOG) is None
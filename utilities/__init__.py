@@ -7,6 +7,8 @@ from .code_execution import capture_exec_output, execute_pandas_code, convert_ty
 from .code_processing import clean_pandas_code, modify_parquet_paths
 from .error_handling import classify_error
 from .agents import get_pandas_code
+from .dataset_cache import DatasetCache, DATASET_CACHE
+from .snippet_cache import SnippetCache, SNIPPET_CACHE
 
 __all__ = [
     'run_pipeline',
@@ -19,5 +21,9 @@ __all__ = [
     'clean_pandas_code',
     'modify_parquet_paths',
     'classify_error',
-    'get_pandas_code'
+    'get_pandas_code',
+    'DatasetCache',
+    'DATASET_CACHE',
+    'SnippetCache',
+    'SNIPPET_CACHE'
 ] 
\ No newline at end of file
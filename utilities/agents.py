@@ -2,6 +2,11 @@ from pydantic import BaseModel
 from typing import List, Tuple, Union
 import openai
 from utilities.utils import get_text_after_last_think_tag
+from utilities.llm_client import AsyncLLMClient, AIMDLimiter
+from utilities.completion_cache import CompletionCache, CompletionCacheMiss, DEFAULT_MAX_BYTES
+from utilities.tracing import TRACER, usage_attributes
+from utilities.prompt_builder import PromptBudget, DEFAULT_MAX_PROMPT_TOKENS, build_prefix_stable_prompt, \
+    build_sql_prompt, SQL_INSTRUCTIONS
 import os
 from dotenv import load_dotenv
 
@@ -24,13 +29,98 @@ MAIN_LLM_PROVIDER = openai.OpenAI(**main_args)
 MAIN_LLM = os.getenv("MAIN_LLM", "deepseek-ai/DeepSeek-R1")  # Default model
 ERROR_LLM = os.getenv("ERROR_LLM", "deepseek-ai/DeepSeek-R1")  # Error handling model
 
+# Optional asyncio client with adaptive concurrency, see enable_async_client
+ASYNC_LLM_CLIENT = None
+
+
+def enable_async_client(max_in_flight=64, initial_in_flight=8):
+    """
+    Route completions through an openai.AsyncOpenAI client whose number of in-flight
+    requests adapts between 1 and `max_in_flight` based on latency and 429 responses.
+    """
+    global ASYNC_LLM_CLIENT
+    if ASYNC_LLM_CLIENT is None:
+        limiter = AIMDLimiter(initial=min(initial_in_flight, max_in_flight), maximum=max_in_flight)
+        ASYNC_LLM_CLIENT = AsyncLLMClient(main_args, limiter=limiter)
+    return ASYNC_LLM_CLIENT
+
+
+def disable_async_client():
+    """Shut down the async client and go back to blocking calls."""
+    global ASYNC_LLM_CLIENT
+    if ASYNC_LLM_CLIENT is not None:
+        ASYNC_LLM_CLIENT.close()
+        ASYNC_LLM_CLIENT = None
+
+
+# Optional persistent cache of completions, see enable_completion_cache
+COMPLETION_CACHE = None
+
+
+def enable_completion_cache(path, max_bytes=DEFAULT_MAX_BYTES, readonly=False):
+    """
+    Serve completions from a persistent cache before calling the LLM providers.
+    With `readonly`, the run replays the cache only and misses raise CompletionCacheMiss.
+    """
+    global COMPLETION_CACHE
+    COMPLETION_CACHE = CompletionCache(path, max_bytes=max_bytes, readonly=readonly)
+    return COMPLETION_CACHE
+
+
+def disable_completion_cache():
+    global COMPLETION_CACHE
+    if COMPLETION_CACHE is not None:
+        COMPLETION_CACHE.close()
+        COMPLETION_CACHE = None
+
+
+# Optional token budget for the prompts, see enable_prompt_budget
+PROMPT_BUDGET = None
+
+
+def enable_prompt_budget(max_tokens=DEFAULT_MAX_PROMPT_TOKENS, full_attempts=1):
+    """
+    Keep prompts within about `max_tokens`: schemas are cut down to the columns most
+    relevant to the question, and retry histories keep only the newest
+    `full_attempts` attempts in full, with older ones reduced to error summaries.
+    """
+    global PROMPT_BUDGET
+    PROMPT_BUDGET = PromptBudget(max_tokens=max_tokens, full_attempts=full_attempts)
+    return PROMPT_BUDGET
+
+
+def disable_prompt_budget():
+    global PROMPT_BUDGET
+    PROMPT_BUDGET = None
+
+
+# Put the shared instructions and schema before the question, see enable_prefix_stable_prompts
+PREFIX_STABLE_PROMPTS = False
+
+
+def enable_prefix_stable_prompts():
+    """
+    Lay prompts out as static instructions, then the dataset schema, then the question
+    and error context, so all prompts about a dataset share a byte-identical prefix that
+    servers with prefix caching (e.g. vLLM) can reuse.
+    """
+    global PREFIX_STABLE_PROMPTS
+    PREFIX_STABLE_PROMPTS = True
+
+
+def disable_prefix_stable_prompts():
+    global PREFIX_STABLE_PROMPTS
+    PREFIX_STABLE_PROMPTS = False
+
 
 def get_pandas_code(
     dataset_name: str,
     question: str,
     schema: str,
     temperature: float = 0,
-    error_code: Union[Tuple[str, str], List[Tuple[str, str]], None] = None
+    error_code: Union[Tuple[str, str], List[Tuple[str, str]], None] = None,
+    candidate: int = 0,
+    engine: str = "pandas"
 ) -> str:
     """
     Generates Python code using pandas to answer a given question based on a dataset schema.
@@ -44,20 +134,34 @@ def get_pandas_code(
     error_code (tuple or list[tuple], optional):
         * If a single retry, a 2‑tuple (previous_code, error_message).
         * If multiple retries, a list of such tuples ordered oldest→newest.
+    candidate (int): Index of a speculative candidate. Candidates other than 0 are cached
+        separately, so models without a temperature still yield distinct samples.
+    engine (str): "pandas" for Python code, or "sql" for a DuckDB query over a table
+        named after the dataset (see utilities.sql_engine).
 
     Returns:
-    str: The generated Python code as a string.
+    str: The generated Python code (or SQL query) as a string.
     """
+    if engine == "sql":
+        if PROMPT_BUDGET is not None:
+            schema, error_code = PROMPT_BUDGET.fit(schema, question, SQL_INSTRUCTIONS, error_code)
+        user_prompt = build_sql_prompt(dataset_name, question, schema, SQL_INSTRUCTIONS, error_code)
+        return _complete(user_prompt, dataset_name, question, temperature, error_code, candidate)
+
     instructions = '''The code should return a print statement with the answer to the question.
     The code should leave the answer be and not print anything other than the variable that holds the answer.
     Please write a single Python code block that answers the following question and prints the result in one line at the end.'''
+    # Same instructions without the question-dependent notes, for the prefix-stable layout
+    static_instructions = instructions
+    question_notes = ''
 
     unique_keywords = ['unique', 'different', 'distinct']
     if all(keyword not in question.lower() for keyword in unique_keywords):
-        instructions += '''
+        question_notes = '''
         If the question doesn't specifically ask for it, don't use unique() or drop_duplicates() functions.'''
+        instructions += question_notes
 
-    instructions += '''
+    common_instructions = '''
     If it is a Yes or No question, the answer should be a boolean.
     Do not include any explanations, comments, or additional code blocks.
     Do not print intermediate steps just the answer.
@@ -76,9 +180,14 @@ def get_pandas_code(
     '''
     # For GPT o models, this instruction is needed as they tend to generate overly complex code
     if MAIN_LLM.startswith("o"):
-        instructions += '''
+        common_instructions += '''
     Generate the *simplest possible* pandas code that correctly answers the question. Avoid unnecessary complexity, helper functions, or overly defensive programming unless strictly required by the question's logic. Prefer direct pandas operations.
     '''
+    instructions += common_instructions
+    static_instructions += common_instructions
+
+    if PROMPT_BUDGET is not None:
+        schema, error_code = PROMPT_BUDGET.fit(schema, question, instructions, error_code)
 
     user_prompt = f'''Given the dataset schema {schema}
                 Generate a python code to answer this question: `{question}` that strictly follows the instructions below:
@@ -128,7 +237,11 @@ def get_pandas_code(
             # -------- Append an *extra* section enumerating earlier failures -----
             user_prompt += "\n\nHere are earlier attempts that also failed:\n"
             for idx, (p_code, p_err) in enumerate(error_code[:-1], start=1):
-                user_prompt += f"\nAttempt {idx}:\n{p_code}\n```\nError: {p_err}\n"
+                if p_code is None:
+                    # Collapsed by the prompt budget
+                    user_prompt += f"\nAttempt {idx} failed with: {p_err}\n"
+                else:
+                    user_prompt += f"\nAttempt {idx}:\n{p_code}\n```\nError: {p_err}\n"
 
             user_prompt += (
                 f"The following python code made for pandas for the parquet file {dataset_name}.parquet reads the parquet file and "
@@ -137,6 +250,17 @@ def get_pandas_code(
 
 
 
+    if PREFIX_STABLE_PROMPTS:
+        # Instructions, then schema, then the question: byte-identical up to the question
+        # for every prompt on the same dataset, so servers can reuse the cached prefix
+        user_prompt = build_prefix_stable_prompt(dataset_name, question, schema, static_instructions,
+                                                 question_notes, error_code)
+
+    return _complete(user_prompt, dataset_name, question, temperature, error_code, candidate)
+
+
+def _complete(user_prompt, dataset_name, question, temperature=0, error_code=None, candidate=0):
+    """Send a prompt to the main (or, for retries, the error) model and return the answer after any think tags."""
     CURRENT_LLM = ERROR_LLM if error_code else MAIN_LLM
     CURRENT_PROVIDER = ERROR_LLM_PROVIDER if error_code else MAIN_LLM_PROVIDER
 
@@ -157,6 +281,24 @@ def get_pandas_code(
         # Include reasoning_effort for 'o' models
         completion_args["reasoning_effort"] = "high"
     
-    chat_completion = CURRENT_PROVIDER.chat.completions.create(**completion_args)
-    to_return = get_text_after_last_think_tag(chat_completion.choices[0].message.content)
+    # Only the cache key is salted; the request itself is unchanged
+    cache_args = dict(completion_args, candidate=candidate) if candidate else completion_args
+    with TRACER.span("retry" if error_code else "generate", model=CURRENT_LLM, candidate=candidate) as span:
+        content = COMPLETION_CACHE.get(cache_args) if COMPLETION_CACHE is not None else None
+        span["cached"] = content is not None
+        if content is None:
+            if COMPLETION_CACHE is not None and COMPLETION_CACHE.readonly:
+                raise CompletionCacheMiss(f"No cached completion for question `{question}` on {dataset_name}")
+
+            if ASYNC_LLM_CLIENT is not None:
+                # Main and error models share the endpoint, so one adaptive client serves both
+                chat_completion = ASYNC_LLM_CLIENT.create(**completion_args)
+            else:
+                chat_completion = CURRENT_PROVIDER.chat.completions.create(**completion_args)
+            span.update(usage_attributes(chat_completion))
+            content = chat_completion.choices[0].message.content
+            if COMPLETION_CACHE is not None:
+                COMPLETION_CACHE.put(cache_args, content)
+
+    to_return = get_text_after_last_think_tag(content)
     return to_return
@@ -0,0 +1,25 @@
+import contextvars
+
+CANCELLED_ERROR = "Error :Cancelled: execution was stopped because the question was already answered"
+
+# Event of the candidate round a snippet runs for; copied into helper threads with contextvars.copy_context
+_CANCEL_EVENT = contextvars.ContextVar("cancel_event", default=None)
+
+# How often running executions check whether they were cancelled, in seconds
+POLL_INTERVAL = 0.05
+
+
+def cancel_on(event):
+    """Let executions started from the current context stop early once `event` is set."""
+    _CANCEL_EVENT.set(event)
+
+
+def cancel_event():
+    """The event set by cancel_on in the current context, or None."""
+    return _CANCEL_EVENT.get()
+
+
+def cancelled():
+    """Whether executions started from the current context should stop."""
+    event = _CANCEL_EVENT.get()
+    return event is not None and event.is_set()
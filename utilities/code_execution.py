@@ -2,64 +2,66 @@ import io
 import ast
 import numpy as np
 import pandas as pd
-from contextlib import redirect_stdout
+import builtins
 from tqdm import tqdm
-from .code_processing import clean_pandas_code, modify_parquet_paths
+from .dataset_cache import DATASET_CACHE
+from .snippet_cache import SNIPPET_CACHE, Snippet
+from .sql_engine import prepare_query, run_sql
+from .lazy_frame import LazyScan, lazy_type, materialize, record_peak_memory
+from .output_capture import capture_stdout
 
+# Reported for snippets that exhaust the available memory
+OOM_ERROR = "Error :MemoryError: execution ran out of memory"
 
-def capture_exec_output(code):
+
+def capture_exec_output(code, dataset_cache=DATASET_CACHE, snippet_cache=SNIPPET_CACHE, lazy=False):
     """
     Execute code and return its output in its original format. If no output,
     return 'None'. If an error occurs, return the exception.
 
-    Dynamically extracts imports from the code and includes them in the execution context.
+    Dynamically resolves imports from the code and includes them in the execution context.
+    When a dataset cache is given, `pd.read_parquet` inside the code (including a
+    `pandas` imported by the code itself) is served from the shared cache instead of
+    decoding the parquet file again. Pass `dataset_cache=None` to disable it.
+    The compiled code and its imports come from `snippet_cache`, so executing the
+    same source again skips parsing and compilation.
+
+    With `lazy`, `pd.read_parquet` returns a LazyFrame that scans the file in row-group
+    batches instead of loading it (see utilities.lazy_frame), for datasets larger than
+    memory; the dataset cache is not used. The peak memory of the execution is then
+    available from `last_peak_memory()` in the calling thread.
     """
 
-    def extract_imports(code):
-        """
-        Extract all imported modules and objects from the given code.
-        Returns a dictionary of imported modules and their names.
-        If an error occurs during parsing, returns an empty dictionary.
-        """
-        try:
-            tree = ast.parse(code)
-            imports = {}
-
-            for node in ast.walk(tree):
-                # Handle `import` statements
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        module_name = alias.name
-                        as_name = alias.asname or alias.name
-                        imports[as_name] = __import__(module_name)
-
-                # Handle `from ... import ...` statements
-                elif isinstance(node, ast.ImportFrom):
-                    module_name = node.module
-                    for alias in node.names:
-                        name = alias.name
-                        as_name = alias.asname or alias.name
-                        if module_name:
-                            full_name = f"{module_name}.{name}"
-                            imports[as_name] = __import__(module_name, fromlist=[name]).__dict__[name]
-
-            return imports
-        except Exception:
-            # Return empty dictionary if any error occurs during import extraction
-            return {}
-
-    # Extract imports from the code
-    dynamic_imports = extract_imports(code)
+    # Parsing, import resolution and compilation happen once per distinct source
+    snippet = snippet_cache.get(code) if snippet_cache is not None else Snippet(code)
+    dynamic_imports = dict(snippet.imports)
 
     # Prepare the execution environment with built-ins and dynamic imports
-    execution_globals = {"__builtins__": __builtins__, "np": np, "pd": pd, "ast": ast}
+    execution_builtins = __builtins__
+    pandas_module = pd
+    scan = LazyScan() if lazy else None
+    source = scan if lazy else dataset_cache
+    if source is not None:
+        pandas_module = source.pandas_module()
+        execution_builtins = dict(vars(builtins), __import__=source.import_hook())
+        if lazy:
+            execution_builtins["type"] = lazy_type
+        for name, value in dynamic_imports.items():
+            if value is pd:
+                dynamic_imports[name] = pandas_module
+            elif value is pd.read_parquet:
+                dynamic_imports[name] = pandas_module.read_parquet
+
+    execution_globals = {"__builtins__": execution_builtins, "np": np, "pd": pandas_module, "ast": ast}
     execution_globals.update(dynamic_imports)
 
     f = io.StringIO()
     try:
         local_vars = {}
-        with redirect_stdout(f):
-            exec(code, execution_globals, local_vars)
+        if snippet.error is not None:
+            raise snippet.compile_error()
+        with capture_stdout(f):
+            exec(snippet.code_object, execution_globals, local_vars)
 
         # Check if there are any local variables
         if local_vars:
@@ -82,14 +84,19 @@ def capture_exec_output(code):
                 return output  # If not evaluatable, return raw output
         # If no stdout, check for the last variable again (in case it's not ndarray)
         elif local_vars:
-            last_var = list(local_vars.values())[-1]
+            last_var = materialize(list(local_vars.values())[-1])
             if isinstance(last_var, np.ndarray):
                 return last_var.tolist()  # Convert NumPy array to Python list
             return last_var
         else:
             return 'None'  # No output, no variables
+    except MemoryError:
+        return OOM_ERROR
     except Exception as e:
-        return "Error :" + str(e)  # Return exception as a string
+        return f"Error :{type(e).__name__}: {e}"  # Return exception as a string, with its type
+    finally:
+        if scan is not None:
+            record_peak_memory(scan.peak_memory())
 
 
 def convert_types(obj):
@@ -114,26 +121,32 @@ def convert_types(obj):
         return obj
 
 
-def execute_pandas_code(data, dataset_folder_path="../datasets/", is_sample=False):
+def execute_pandas_code(data, dataset_folder_path="../datasets/", is_sample=False, executor=capture_exec_output,
+                        column_catalog=None, sql_executor=run_sql):
     """
     Execute pandas code for each question and capture results.
 
     Args:
-        data (list): A list of dictionaries containing pandas code under the 'pandas_code' key.
+        data (iterable): Dictionaries containing pandas code under the 'pandas_code' key.
         dataset_folder_path (str): The path to fix in the parquet files.
         is_sample (bool): Flag to determine whether to use sample datasets.
+        executor (callable): Runs a code string and returns its output like capture_exec_output.
+        column_catalog (dict, optional): Column catalog used to prune the parquet reads.
+        sql_executor (callable): Runs the queries of entries whose 'engine' is "sql", like run_sql.
 
-    Returns:
-        list: The updated data with the 'final_answer' key added to each entry.
+    Yields:
+        dict: Each entry with the 'final_answer' key added, converted to native types,
+        as soon as its code has run.
     """
     for entry in tqdm(data, desc="Executing pandas code"):
-        # Extract and clean the code
+        # Clean the code, modify the parquet paths and execute it
         raw_code = entry.get('pandas_code', '')
-        cleaned_code = clean_pandas_code(raw_code)
-
-        # Modify the parquet paths and execute the code
-        modified_code = modify_parquet_paths(cleaned_code, dataset_folder_path=dataset_folder_path, is_sample=is_sample)
-        result = capture_exec_output(modified_code)
+        if entry.get('engine') == 'sql':
+            result = sql_executor(prepare_query(raw_code, entry['dataset'], dataset_folder_path, is_sample=is_sample))
+        else:
+            modified_code = SNIPPET_CACHE.prepare(raw_code, dataset_folder_path, is_sample=is_sample,
+                                                  column_catalog=column_catalog)
+            result = executor(modified_code)
         entry['final_answer'] = result
 
-    return convert_types(data) 
\ No newline at end of file
+        yield convert_types(entry)
@@ -1,4 +1,8 @@
+import os
 import re
+import ast
+
+import pandas as pd
 
 
 def modify_parquet_paths(code, dataset_folder_path="../datasets/", is_sample=False):
@@ -31,4 +35,172 @@ def clean_pandas_code(raw_code):
     else:
         # Otherwise, get everything up to the first ```
         cleaned_code = raw_code.split('```', 1)[0].strip()
-    return cleaned_code 
\ No newline at end of file
+    return cleaned_code 
+
+
+def _string_constants(node):
+    """Return the strings of a str constant or a list/tuple of them, else None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)) and node.elts and \
+            all(isinstance(e, ast.Constant) and isinstance(e.value, str) for e in node.elts):
+        return [e.value for e in node.elts]
+    return None
+
+
+def _read_parquet_path(node):
+    """Return the path of a plain `pd.read_parquet('<path>')` call, else None."""
+    if not isinstance(node, ast.Call) or node.keywords or len(node.args) != 1:
+        return None
+    func = node.func
+    is_read_parquet = (isinstance(func, ast.Attribute) and func.attr == 'read_parquet') or \
+        (isinstance(func, ast.Name) and func.id == 'read_parquet')
+    arg = node.args[0]
+    if is_read_parquet and isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+        return arg.value
+    return None
+
+
+def _is_column_attribute(node, columns):
+    """Whether `node` is `df.<column>`; names of DataFrame attributes (`df.size`, `df.count`) are not columns."""
+    return isinstance(node, ast.Attribute) and node.attr in columns and not hasattr(pd.DataFrame, node.attr)
+
+
+def _is_column_selection(node, columns):
+    """Whether `node` (the parent of a frame use) selects named columns of it."""
+    if isinstance(node, ast.Subscript):
+        return _string_constants(node.slice) is not None
+    return _is_column_attribute(node, columns)
+
+
+def _frame_use(node, parents, columns):
+    """
+    Classify one load of a frame variable.
+
+    Returns True when only named columns are used, possibly behind a row mask, and
+    False for any other use.
+    """
+    parent = parents.get(node)
+    grandparent = parents.get(parent)
+
+    # df['a'], df[['a', 'b']], df.a
+    if isinstance(parent, ast.Subscript) and parent.value is node and _string_constants(parent.slice) is not None:
+        return True
+    if _is_column_attribute(parent, columns):
+        return True
+    # len(df), df.shape[0]
+    if isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id == 'len' \
+            and parent.args == [node]:
+        return True
+    if isinstance(parent, ast.Attribute) and parent.attr == 'shape' and isinstance(grandparent, ast.Subscript) \
+            and isinstance(grandparent.slice, ast.Constant) and grandparent.slice.value == 0:
+        return True
+    # df[mask]['a'], df[mask].a
+    if isinstance(parent, ast.Subscript) and parent.value is node and _is_column_selection(grandparent, columns) \
+            and getattr(grandparent, 'value', None) is parent:
+        return True
+    # df.loc[mask, 'a'], df.loc[:, ['a', 'b']]
+    if isinstance(parent, ast.Attribute) and parent.attr == 'loc' and isinstance(grandparent, ast.Subscript) \
+            and isinstance(grandparent.slice, ast.Tuple) and len(grandparent.slice.elts) == 2 \
+            and _string_constants(grandparent.slice.elts[1]) is not None:
+        return True
+    # df.groupby('a')['b'], df.groupby(['a', 'b']).size()
+    if isinstance(parent, ast.Attribute) and parent.attr == 'groupby' and isinstance(grandparent, ast.Call) \
+            and all(_string_constants(arg) is not None for arg in grandparent.args) \
+            and all(isinstance(kw.value, ast.Constant) for kw in grandparent.keywords):
+        user = parents.get(grandparent)
+        if isinstance(user, ast.Subscript) and _string_constants(user.slice) is not None:
+            return True
+        if isinstance(user, ast.Attribute) and user.attr == 'size':
+            return True
+    return False
+
+
+def _prune_frame(tree, parents, frame, columns):
+    """
+    Work out which columns a frame loaded into `frame` needs.
+
+    Returns the columns, or None when the frame is used in a way that may depend on
+    columns the snippet does not name.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == frame and \
+                (not isinstance(node.ctx, ast.Load) or not _frame_use(node, parents, columns)):
+            return None
+
+    # Every name or string the snippet mentions that is a column (conservatively over-inclusive)
+    needed = {node.value for node in ast.walk(tree)
+              if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value in columns}
+    needed |= {node.attr for node in ast.walk(tree) if isinstance(node, ast.Attribute) and node.attr in columns}
+    needed |= {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id in columns}
+    return [column for column in columns if column in needed] or [next(iter(columns))]
+
+
+def prune_parquet_reads(code, column_catalog):
+    """
+    Rewrite `df = pd.read_parquet('<path>')` to read only the columns the snippet uses.
+
+    The snippet is analysed with the AST against the renamed columns of each dataset
+    from the preprocessing column catalog. When every use of the frame selects named
+    columns, the read gets a `columns=` argument. Rows are never filtered at read time,
+    so row labels and dtypes stay those of the full read, and the dataset cache serves
+    the pruned read from its shared frame. Frames used in any other way, and code that
+    cannot be parsed, are left untouched.
+
+    Args:
+        code (str): Cleaned Python code, with parquet paths already rewritten.
+        column_catalog (dict): Dataset name -> {column: {"dtype", "arrow_type"}}.
+
+    Returns:
+        str: The rewritten code.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    assignment_counts = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            assignment_counts[node.id] = assignment_counts.get(node.id, 0) + 1
+        elif isinstance(node, ast.arg):
+            assignment_counts[node.arg] = assignment_counts.get(node.arg, 0) + 1
+
+    insertions = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)):
+            continue
+        path = _read_parquet_path(node.value)
+        frame = node.targets[0].id
+        if path is None or assignment_counts.get(frame) != 1:
+            continue
+        columns = column_catalog.get(os.path.splitext(os.path.basename(path))[0])
+        if not columns:
+            continue
+
+        # Analyse the rest of the snippet with the assignment itself taken out
+        body = ast.Module(body=[stmt for stmt in tree.body if stmt is not node], type_ignores=[])
+        selected = _prune_frame(body, parents, frame, columns)
+        if selected is None or len(selected) == len(columns):
+            continue
+        arguments = f", columns={selected!r}"
+        insertions.append((node.value.end_lineno, node.value.end_col_offset - 1, arguments))
+
+    if not insertions:
+        return code
+
+    # Insert the new arguments before the closing parenthesis of each call
+    lines = code.split("\n")
+    for lineno, col_offset, arguments in sorted(insertions, reverse=True):
+        line = lines[lineno - 1].encode("utf-8")
+        head = line[:col_offset]
+        if head.rstrip().endswith(b","):
+            arguments = arguments[2:]  # The call already has a trailing comma
+        lines[lineno - 1] = (head + arguments.encode("utf-8") + line[col_offset:]).decode("utf-8")
+    rewritten = "\n".join(lines)
+    try:
+        ast.parse(rewritten)
+    except SyntaxError:
+        return code
+    return rewritten
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import pathlib
+import threading
+
+DEFAULT_MAX_BYTES = 1024 ** 3  # 1 GiB of stored completions
+
+
+class CompletionCacheMiss(LookupError):
+    """Raised in replay mode when a completion is not in the cache."""
+
+
+class CompletionCache:
+    """
+    Persistent, content-addressed cache of LLM completions stored in SQLite.
+
+    Entries are keyed by a hash of the full completion request (model, messages,
+    temperature, token limits, ...), so any change to the prompt or parameters is a
+    miss. Once the stored text exceeds `max_bytes` the least recently used entries are
+    evicted. In `readonly` (replay) mode nothing is written and misses raise
+    CompletionCacheMiss instead of calling the API.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, readonly=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{pathlib.Path(path).absolute()}?mode=ro", uri=True,
+                                         check_same_thread=False)
+        else:
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, model TEXT, content TEXT, size INTEGER, "
+                "created REAL, last_access REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS completions_lru ON completions (last_access)")
+            self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    @staticmethod
+    def key(completion_args):
+        """Hash of the request parameters that determine the completion."""
+        payload = json.dumps(completion_args, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, completion_args):
+        """Return the cached completion text, or None on a miss."""
+        key = self.key(completion_args)
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.readonly:
+                self._conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+            return row[0]
+
+    def put(self, completion_args, content):
+        """Store a completion and evict old entries if the cache is over its size bound."""
+        if self.readonly or content is None:
+            return
+        key = self.key(completion_args)
+        size = len(content.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, content, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, completion_args.get("model"), content, size, now, now)
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self.writes += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM completions ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss counters and the stored size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self._total_bytes,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"Completion cache ({os.path.basename(self.path)}): {s['hits']} hits, {s['misses']} misses "
+                f"({s['hit_rate']:.1%} hit rate), {s['writes']} writes, {s['evictions']} evictions, "
+                f"{s['bytes'] / 1024 ** 2:.1f} MiB stored")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
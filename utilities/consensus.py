@@ -0,0 +1,118 @@
+from .code_execution import capture_exec_output, convert_types
+from .question_processing import (answer_key, candidate_error_entry, engines_for, process_question,
+                                  record_unexpected_failure, run_candidates)
+from .sql_engine import run_sql
+
+# Candidates requested per round, the overall cap, and the agreement that ends the search
+DEFAULT_INITIAL_CANDIDATES = 3
+DEFAULT_MAX_CANDIDATES = 9
+DEFAULT_MIN_AGREEMENT = 2 / 3
+
+SCALAR_TYPES = (bool, int, float, str)
+
+
+def is_well_formed_answer(exec_output):
+    """
+    Whether an execution output has one of the answer types the prompt asks for.
+
+    Answers must be a boolean, number, string or a flat list of those. Errors, empty
+    output, dicts and multi-line strings (DataFrame or Series reprs) are rejected, so
+    code that merely runs without raising does not get a vote.
+    """
+    answer = convert_types(exec_output)
+    if answer is None or answer == 'None':
+        return False
+    if isinstance(answer, str):
+        return not answer.startswith("Error") and "\n" not in answer.strip() and "dtype:" not in answer
+    if isinstance(answer, list):
+        return all(item is None or isinstance(item, SCALAR_TYPES) for item in answer)
+    return isinstance(answer, SCALAR_TYPES)
+
+
+def tally_votes(attempts):
+    """
+    Group the well-formed answers of finished candidates.
+
+    Returns:
+        dict: answer_key -> list of the candidate results giving that answer, in arrival order.
+    """
+    votes = {}
+    for result in attempts:
+        if result["error"] is None and is_well_formed_answer(result["exec_output"]):
+            votes.setdefault(answer_key(result["exec_output"]), []).append(result)
+    return votes
+
+
+def consensus_question(question_data, schemas, dataset_folder_path, max_retries=1, executor=capture_exec_output,
+                       column_catalog=None, sample_first=False, initial_candidates=DEFAULT_INITIAL_CANDIDATES,
+                       max_candidates=DEFAULT_MAX_CANDIDATES, min_agreement=DEFAULT_MIN_AGREEMENT,
+                       static_check=False, engine="pandas", sql_executor=run_sql):
+    """
+    Answer a question by self-consistency voting over independently generated programs.
+
+    `initial_candidates` programs are generated and executed in parallel, and their
+    outputs normalized with convert_types. The most frequent well-formed answer wins,
+    and its share of the well-formed answers is recorded as the confidence. While the
+    confidence is below `min_agreement`, two more candidates are generated per round,
+    up to `max_candidates`. Easy questions therefore stop after the first round, and the
+    extra compute goes to the contested ones.
+
+    With `engine="race"` the candidates alternate between pandas code and SQL
+    queries, so both engines vote on the answer.
+
+    If no candidate produces a well-formed answer, the question falls back to
+    process_question and its serial repair loop, seeded with the candidates' errors.
+    Unexpected exceptions (an unknown dataset, a failing executor) fail the question
+    like in process_question instead of propagating.
+
+    Returns:
+        dict: `question_data` with 'pandas_code', 'final_answer', 'status' and a
+        'consensus' record (candidates, well_formed, agreeing, confidence, votes).
+    """
+    question_data.setdefault("error_history", [])
+    try:
+        dataset_info = schemas[question_data['dataset']]
+        engines = engines_for(question_data.get('engine', engine))
+
+        attempts = []
+        batch = initial_candidates
+        while batch > 0:
+            _, finished = run_candidates(question_data, dataset_info, dataset_folder_path, batch, executor=executor,
+                                         column_catalog=column_catalog, sample_first=sample_first,
+                                         first_candidate=len(attempts), wait_all=True, static_check=static_check,
+                                         engines=engines, sql_executor=sql_executor)
+            attempts.extend(finished)
+            votes = tally_votes(attempts)
+            top = max(votes.values(), key=len) if votes else []
+            well_formed = sum(len(results) for results in votes.values())
+            confidence = len(top) / well_formed if well_formed else 0.0
+            if top and confidence >= min_agreement:
+                break
+            batch = min(2, max_candidates - len(attempts))
+
+        failed = [result for result in attempts if result["error"] is not None]
+        question_data["consensus"] = {
+            "candidates": len(attempts),
+            "well_formed": well_formed,
+            "agreeing": len(top),
+            "confidence": confidence,
+            "votes": {key: len(results) for key, results in votes.items()},
+        }
+        if not top:
+            # The failed candidates seed the repair; without any it starts from a fresh generation
+            return process_question(question_data, schemas, dataset_folder_path, max_retries, executor=executor,
+                                    column_catalog=column_catalog, sample_first=sample_first,
+                                    static_check=static_check, engine=engine, sql_executor=sql_executor,
+                                    failed_candidates=failed or None)
+
+        for result in failed:
+            question_data["error_history"].append(candidate_error_entry(result))
+        winner = top[0]
+        question_data["status"] = "success"
+        question_data['engine'] = winner["engine"]
+        question_data['pandas_code'] = winner["pandas_code"]
+        question_data['final_answer'] = convert_types(winner["exec_output"])
+        return question_data
+    except Exception as e:
+        # A failure of one question must not abort the run
+        return record_unexpected_failure(question_data, e)
@@ -7,7 +7,64 @@ def load_schemas(schema_path):
         return json.load(f)
 
 
+def load_column_catalog(catalog_path):
+    """
+    Load the column catalog written by preprocessing
+    (dataset name -> {column: {"dtype", "arrow_type"}}).
+    """
+    with open(catalog_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_jsonl(path):
+    """Yield the entries of a JSONL file one line at a time."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
 def load_questions(qa_path):
-    """Load the questions from file."""
-    with open(qa_path, encoding='utf-8') as f:
-        return json.load(f)
\ No newline at end of file
+    """
+    Load the questions from file.
+
+    JSONL files are streamed entry by entry; a JSON array is read in one go.
+    Either way the questions are yielded one at a time.
+    """
+    if qa_path.endswith('.jsonl'):
+        yield from iter_jsonl(qa_path)
+    else:
+        with open(qa_path, encoding='utf-8') as f:
+            yield from json.load(f)
+
+
+def write_jsonl(items, output_path):
+    """Write an iterable of entries as JSONL, one entry per line."""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def dump_json_array(items, output_path, indent=4):
+    """
+    Write an iterable of entries as a JSON array, one entry at a time.
+
+    Produces the same layout as json.dump(list(items), f, indent=indent) without
+    holding all entries in memory.
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        first = True
+        for item in items:
+            entry = json.dumps(item, ensure_ascii=False, indent=indent)
+            f.write(("\n" if first else ",\n") + " " * indent + entry.replace("\n", "\n" + " " * indent))
+            first = False
+        f.write("\n]" if not first else "]")
+
+
+def write_results(items, output_path):
+    """Stream results to JSONL when the path ends in .jsonl, otherwise to a JSON array."""
+    if output_path.endswith('.jsonl'):
+        write_jsonl(items, output_path)
+    else:
+        dump_json_array(items, output_path)
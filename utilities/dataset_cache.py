@@ -0,0 +1,185 @@
+import os
+import types
+import builtins
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+
+from .tracing import TRACER
+
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3  # 4 GiB of decoded DataFrames
+
+
+class DatasetCache:
+    """
+    Process-wide cache of decoded parquet tables used by generated code.
+
+    Each dataset is decoded once and handed out as a copy-on-write view (when pandas
+    copy-on-write mode is enabled) or as a cheap in-memory copy otherwise, so snippets
+    can never mutate the cached frame. Entries are evicted least-recently-used once the
+    decoded size exceeds `max_bytes`. Rewriting a parquet file invalidates its entry.
+
+    With `prefer_arrow`, a `<name>.arrow` file written by preprocessing next to the
+    parquet file is memory-mapped instead of decoding the parquet. Numeric columns
+    without nulls then stay zero-copy views of the page cache, so every process that
+    maps the same file shares those pages.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, prefer_arrow=False):
+        self.max_bytes = max_bytes
+        self.prefer_arrow = prefer_arrow
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self._frames = OrderedDict()  # (abs path, mtime_ns, size) -> (frame, nbytes)
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._pandas = _CachedPandas(self)
+
+    @staticmethod
+    def _key(path):
+        path = os.path.abspath(os.fspath(path))
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def get(self, path):
+        """Return the cached frame for `path`, decoding the parquet file on a miss."""
+        key = self._key(path)
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread decodes a given file; the others wait and then hit the cache
+        with load_lock:
+            with self._lock:
+                entry = self._frames.get(key)
+                if entry is not None:
+                    self._frames.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+
+            with TRACER.span("load", path=os.path.basename(key[0])):
+                frame = self._load(key[0])
+            nbytes = int(frame.memory_usage(deep=True).sum())
+
+            with self._lock:
+                self._load_locks.pop(key, None)
+                self._discard_path(key[0])
+                if nbytes <= self.max_bytes:
+                    self._frames[key] = (frame, nbytes)
+                    self._current_bytes += nbytes
+                    self._evict()
+        return frame
+
+    def _load(self, path):
+        """Decode a dataset, memory-mapping its Arrow IPC copy when there is an up-to-date one."""
+        arrow_path = os.path.splitext(path)[0] + ".arrow"
+        if self.prefer_arrow and os.path.exists(arrow_path) and \
+                os.stat(arrow_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+            with pa.memory_map(arrow_path, "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+            return table.to_pandas(split_blocks=True)
+        return pd.read_parquet(path)
+
+    def read_parquet(self, path, columns=None, **kwargs):
+        """Drop-in replacement for `pd.read_parquet` backed by the cache."""
+        if kwargs or not isinstance(path, (str, os.PathLike)) or not os.path.isfile(path):
+            # Engine options, filters, buffers and directories go straight to pandas
+            with self._lock:
+                self.bypasses += 1
+            with TRACER.span("load", path=os.path.basename(str(path)), bypass=True):
+                return pd.read_parquet(path, columns=columns, **kwargs)
+
+        frame = self.get(path)
+        if columns is not None:
+            # Column selection already yields a new frame
+            return frame[list(columns)]
+        return frame.copy(deep=pd.get_option("mode.copy_on_write") is not True)
+
+    def evict(self, path):
+        """Drop every cached version of `path`."""
+        with self._lock:
+            self._discard_path(os.path.abspath(os.fspath(path)))
+
+    def clear(self):
+        """Drop all cached frames and reset the counters."""
+        with self._lock:
+            self._frames.clear()
+            self._current_bytes = 0
+            self.hits = self.misses = self.bypasses = self.evictions = 0
+
+    def _discard_path(self, abs_path):
+        for key in [k for k in self._frames if k[0] == abs_path]:
+            self._current_bytes -= self._frames.pop(key)[1]
+
+    def _evict(self):
+        while self._current_bytes > self.max_bytes and self._frames:
+            _, (_, nbytes) = self._frames.popitem(last=False)
+            self._current_bytes -= nbytes
+            self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss counters and the current cache footprint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._frames),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"Dataset cache: {s['hits']} hits, {s['misses']} misses, {s['bypasses']} bypasses "
+                f"({s['hit_rate']:.1%} hit rate), {s['evictions']} evictions, "
+                f"{s['entries']} tables / {s['bytes'] / 1024 ** 2:.1f} MiB resident")
+
+    def pandas_module(self):
+        """Return a stand-in for the pandas module whose read_parquet goes through this cache."""
+        return self._pandas
+
+    def import_hook(self):
+        """Return an `__import__` replacement that hands out the cached pandas stand-in."""
+        return pandas_import_hook(self._pandas)
+
+
+def pandas_import_hook(pandas_stand_in):
+    """Return an `__import__` replacement that hands out `pandas_stand_in` for `import pandas`."""
+    real_import = builtins.__import__
+
+    def cached_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and (name == "pandas" or name.startswith("pandas.")) and \
+                (not fromlist or name == "pandas"):
+            return pandas_stand_in
+        return real_import(name, globals, locals, fromlist, level)
+
+    return cached_import
+
+
+class _CachedPandas(types.ModuleType):
+    """Module proxy that forwards everything to pandas except read_parquet."""
+
+    def __init__(self, cache):
+        super().__init__("pandas", pd.__doc__)
+        self.read_parquet = cache.read_parquet
+
+    def __getattr__(self, name):
+        return getattr(pd, name)
+
+
+# Shared cache used by capture_exec_output
+DATASET_CACHE = DatasetCache()
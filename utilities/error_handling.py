@@ -1,15 +1,95 @@
+import re
+import ast
 import logging
 import traceback
 
+# Errors that a run on the sample datasets reproduces exactly as the full run would:
+# they come from the code itself or the schema, not from which rows are present.
+# KeyError, TypeError and AttributeError can depend on the rows (a label missing from
+# the sample, a column that is all null there), see is_conclusive_sample_error.
+CONCLUSIVE_SAMPLE_ERRORS = {
+    "SyntaxError", "IndentationError", "NameError", "UnboundLocalError", "ImportError",
+    "ModuleNotFoundError",
+    # DuckDB errors of the SQL engine: invalid query, unknown column or table
+    "ParserException", "BinderException", "CatalogException",
+}
+
+# Row indexers whose first key is a row label, not a column
+ROW_INDEXERS = {"loc", "at"}
+POSITIONAL_INDEXERS = {"iloc", "iat"}
+
 
 def classify_error(exc):
-    """Classify an exception into syntax, logic, data-type, or other."""
+    """Classify an exception into timeout, oom, syntax, logic, data-type, or other."""
     msg = str(exc).lower()
-    if isinstance(exc, SyntaxError) or "syntax error" in msg or "unexpected eof" in msg:
+    if isinstance(exc, TimeoutError) or "timeouterror" in msg or "timed out" in msg:
+        return "timeout"
+    elif isinstance(exc, MemoryError) or "memoryerror" in msg or "out of memory" in msg:
+        return "oom"
+    elif isinstance(exc, SyntaxError) or "syntax error" in msg or "unexpected eof" in msg:
         return "syntax"
     elif isinstance(exc, TypeError) or "dtype" in msg or "typeerror" in msg:
         return "data-type"
     elif "groupby" in msg or "aggregation" in msg or "cannot insert" in msg:
         return "logic"
     else:
-        return "other" 
\ No newline at end of file
+        return "other"
+
+
+def error_type_name(exec_output):
+    """Return the exception type of an 'Error :<Type>: message' execution output, or None."""
+    if not isinstance(exec_output, str):
+        return None
+    match = re.match(r"Error :(\w+):", exec_output)
+    return match.group(1) if match else None
+
+
+def _string_keys(node):
+    """String constants of a subscript key, including those inside a list of keys."""
+    elements = node.elts if isinstance(node, (ast.List, ast.Tuple)) else [node]
+    return {e.value for e in elements if isinstance(e, ast.Constant) and isinstance(e.value, str)}
+
+
+def column_subscripts(code):
+    """
+    Strings a snippet uses as column keys: `x['a']`, `x[['a', 'b']]` and the column
+    part of `x.loc[rows, 'a']`, but not row labels such as `x.loc['a']`.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return set()
+    keys = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Subscript):
+            continue
+        indexer = node.value.attr if isinstance(node.value, ast.Attribute) else None
+        if indexer in ROW_INDEXERS:
+            if isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2:
+                keys |= _string_keys(node.slice.elts[1])
+        elif indexer not in POSITIONAL_INDEXERS and not isinstance(node.slice, ast.Tuple):
+            keys |= _string_keys(node.slice)
+    return keys
+
+
+def missing_keys(exec_output):
+    """The quoted keys of a KeyError output, e.g. {'a'} for "['a'] not in index"."""
+    message = re.sub(r"dtype='[^']*'", "", exec_output.split(":", 2)[-1])
+    return set(re.findall(r"'((?:[^'\\]|\\.)*)'", message))
+
+
+def is_conclusive_sample_error(exec_output, code=None, columns=None):
+    """
+    Whether an error from a run on the sample datasets would also occur on the full data.
+
+    Errors that may depend on the rows present (empty selections, IndexError, ValueError,
+    TypeError, ...) are inconclusive, and so is anything that is not an error at all.
+    A KeyError is conclusive only when each missing key is absent from the dataset's
+    `columns` and used as a column key in `code` (see column_subscripts); a missing row
+    label may well exist in the full data.
+    """
+    error_type = error_type_name(exec_output)
+    if error_type == "KeyError" and code is not None and columns is not None:
+        keys = missing_keys(exec_output)
+        return bool(keys) and keys <= column_subscripts(code) and not keys & set(columns)
+    return error_type in CONCLUSIVE_SAMPLE_ERRORS
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import pathlib
+import threading
+
+
+def assign_question_ids(questions):
+    """
+    Give every question a stable 'question_id' (unless it already has one).
+
+    The id is a hash of the dataset and question text, suffixed with the occurrence
+    number for repeated pairs, so it survives reordering of the QA file. Questions
+    are yielded one at a time as they are read.
+    """
+    seen = {}
+    for question_data in questions:
+        if 'question_id' not in question_data:
+            digest = hashlib.sha1(
+                f"{question_data['dataset']}\x00{question_data['question']}".encode("utf-8")
+            ).hexdigest()[:16]
+            occurrence = seen.get(digest, 0)
+            seen[digest] = occurrence + 1
+            question_data['question_id'] = digest if occurrence == 0 else f"{digest}-{occurrence}"
+        yield question_data
+
+
+class ResultJournal:
+    """
+    Append-only JSONL journal of finished questions.
+
+    Each result is written and flushed to disk as soon as it is appended, so an
+    interrupted run loses at most the questions that were still in progress. When the
+    same question is journaled more than once, the last record wins.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    def reset(self):
+        """Discard all journaled results."""
+        with self._lock:
+            open(self.path, "w", encoding="utf-8").close()
+
+    def _iter_records(self):
+        """Yield (offset, record) for every complete line of the journal."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None  # Line cut short by a crash
+                if isinstance(record, dict) and 'question_id' in record:
+                    yield offset, record
+                offset += len(line)
+
+    def completed_ids(self):
+        """
+        Return the ids of the questions whose last journaled record is a success.
+
+        Failed questions are not completed: their failure may be transient (an API
+        error, a completion missing from a replayed cache), so a resumed run retries them.
+        """
+        statuses = {record['question_id']: record.get('status') for _, record in self._iter_records()}
+        return {question_id for question_id, status in statuses.items() if status == "success"}
+
+    def append(self, result):
+        """Write one finished question to the journal and flush it to disk."""
+        line = json.dumps(result, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a+b") as f:
+                # Terminate a partial line left by a crash so it does not swallow this record
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def iter_results(self, question_ids):
+        """
+        Stream the journaled results in the order of `question_ids`.
+
+        Only an id -> file offset index is kept in memory; every record is read back
+        from disk when it is yielded. Ids missing from the journal are skipped.
+        """
+        offsets = {record['question_id']: offset for offset, record in self._iter_records()}
+        with open(self.path, "rb") as f:
+            for question_id in question_ids:
+                offset = offsets.get(question_id)
+                if offset is None:
+                    continue
+                f.seek(offset)
+                yield json.loads(f.readline())
@@ -0,0 +1,650 @@
+import os
+import types
+import operator
+import builtins
+import functools
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .dataset_cache import _CachedPandas, pandas_import_hook
+
+# Rows per scanned batch; memory of a streaming reduction is bounded by a few of them
+BATCH_ROWS = 64 * 1024
+
+# Column holding the original row number while materializing filtered rows
+ROW_NUMBER = "__row_number__"
+
+_COMPARISONS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+# Dunder methods that materialize the lazy object and apply the pandas operation
+_FALLBACK_OPERATORS = (
+    '__add__', '__radd__', '__sub__', '__rsub__', '__mul__', '__rmul__', '__truediv__', '__rtruediv__',
+    '__floordiv__', '__rfloordiv__', '__mod__', '__rmod__', '__pow__', '__rpow__', '__neg__', '__abs__',
+    '__iter__', '__array__', '__repr__', '__str__', '__bool__', '__round__',
+)
+
+_local = threading.local()
+
+
+def reset_peak_memory():
+    """Forget the peak memory of the previous execution in this thread."""
+    _local.peak_memory = None
+
+
+def record_peak_memory(peak_memory):
+    """Record the peak memory (bytes) of an execution in this thread, e.g. as reported by a sandbox worker."""
+    _local.peak_memory = peak_memory
+
+
+def last_peak_memory():
+    """Peak memory in bytes of the last lazy execution in this thread, or None if it was not lazy."""
+    return getattr(_local, "peak_memory", None)
+
+
+def comparison(column, op, value):
+    """
+    Arrow filter on a column that, like a pandas mask, is never null.
+
+    Missing values match only '!=' and 'not in', as NaN does in pandas.
+    """
+    field = pc.field(column)
+    if op == 'in':
+        return pc.coalesce(field.isin(list(value)), pc.scalar(False))
+    if op == 'not in':
+        return pc.coalesce(~field.isin(list(value)), pc.scalar(True))
+    return pc.coalesce(_COMPARISONS[op](field, value), pc.scalar(op == '!='))
+
+
+def materialize(value):
+    """The pandas object behind a lazy frame, column or mask; other values are returned unchanged."""
+    if isinstance(value, (LazyFrame, LazyColumn, LazyPredicate)):
+        return value.materialize()
+    return value
+
+
+def _materialize_arguments(value):
+    """`value` with its lazy objects materialized, also inside lists, tuples and dicts (as for pd.concat)."""
+    if type(value) in (list, tuple):
+        return type(value)(map(_materialize_arguments, value))
+    if type(value) is dict:
+        return {key: _materialize_arguments(item) for key, item in value.items()}
+    return materialize(value)
+
+
+def _eager_function(function):
+    """`function` called with the pandas objects behind its lazy arguments."""
+    @functools.wraps(function)
+    def call(*args, **kwargs):
+        return function(*_materialize_arguments(args), **_materialize_arguments(kwargs))
+    return call
+
+
+def _eager_method(value):
+    """A method of a materialized object, called with the pandas objects behind its lazy arguments."""
+    return _eager_function(value) if isinstance(value, types.MethodType) else value
+
+
+class _TypeMeta(type):
+    def __instancecheck__(cls, obj):
+        return isinstance(obj, builtins.type)
+
+    def __subclasscheck__(cls, subclass):
+        return issubclass(subclass, builtins.type)
+
+
+class lazy_type(metaclass=_TypeMeta):
+    """`type` for lazy executions: lazy objects report the pandas class they stand for."""
+
+    def __new__(cls, obj, *args):
+        if args:
+            return builtins.type(obj, *args)
+        return obj.__class__ if isinstance(obj, (LazyFrame, LazyColumn, LazyPredicate)) else builtins.type(obj)
+
+
+def _materialize_key(key):
+    """An indexing key with its lazy parts materialized, e.g. the mask of `loc[mask, column]`."""
+    if isinstance(key, tuple):
+        return tuple(materialize(part) for part in key)
+    return materialize(key)
+
+
+def _is_full_slice(key):
+    return isinstance(key, slice) and key == slice(None)
+
+
+def _fallback(name):
+    def method(self, *args, **kwargs):
+        return getattr(self.materialize(), name)(*(materialize(arg) for arg in args),
+                                                 **{key: materialize(value) for key, value in kwargs.items()})
+    method.__name__ = name
+    return method
+
+
+class LazyScan:
+    """
+    The lazy parquet reads of one execution and the memory they use.
+
+    `read_parquet` returns a LazyFrame instead of loading the file. Arrow allocations
+    of the scans go through a dedicated proxy memory pool, so `peak_memory` is the
+    peak of the scans plus everything that had to be materialized as pandas objects.
+    """
+
+    def __init__(self, batch_rows=BATCH_ROWS):
+        self.batch_rows = batch_rows
+        self.pool = pa.proxy_memory_pool(pa.default_memory_pool())
+        self.materialized_bytes = 0
+        self._datasets = {}
+        self._dtypes = {}
+        self._pandas = _LazyPandas(self)
+
+    def dataset(self, path):
+        if path not in self._datasets:
+            self._datasets[path] = ds.dataset(path, format="parquet")
+        return self._datasets[path]
+
+    def dtypes(self, path):
+        """
+        The dtype of every column in `pd.read_parquet(path)`.
+
+        Arrow loads integer and boolean columns that have missing values as float64 and
+        object, which the schema does not tell, so their null counts are taken from the
+        row-group statistics, or counted when the file has none.
+        """
+        if path not in self._dtypes:
+            dtypes = self.dataset(path).schema.empty_table().to_pandas().dtypes.to_dict()
+            for name, dtype in dtypes.items():
+                if isinstance(dtype, np.dtype) and dtype.kind in 'iub' and self._has_nulls(path, name):
+                    dtypes[name] = np.dtype('float64') if dtype.kind in 'iu' else np.dtype(object)
+            self._dtypes[path] = dtypes
+        return self._dtypes[path]
+
+    def _has_nulls(self, path, name):
+        metadata = pq.ParquetFile(path).metadata
+        statistics = [column.statistics for i in range(metadata.num_row_groups)
+                      for column in map(metadata.row_group(i).column, range(metadata.num_columns))
+                      if column.path_in_schema == name]
+        if statistics and all(s is not None and s.has_null_count for s in statistics):
+            return any(s.null_count for s in statistics)
+        scanner = ds.Scanner.from_dataset(self.dataset(path), columns=[name], batch_size=self.batch_rows,
+                                          memory_pool=self.pool)
+        return any(batch.column(0).null_count for batch in scanner.to_batches())
+
+    def read_parquet(self, path, columns=None, filters=None, **kwargs):
+        """
+        Lazy stand-in for `pd.read_parquet`.
+
+        `columns` and flat lists of `(column, op, value)` filters become the projection
+        and filter of the scan. Anything else is read eagerly by pandas.
+        """
+        if kwargs or not isinstance(path, (str, os.PathLike)) or not os.path.isfile(path) or \
+                (filters and not all(isinstance(f, tuple) and len(f) == 3 for f in filters)):
+            frame = pd.read_parquet(path, columns=columns, filters=filters, **kwargs)
+            self.materialized_bytes += int(frame.memory_usage(deep=True).sum())
+            return frame
+        path = os.path.abspath(os.fspath(path))
+        names = list(columns) if columns is not None else self.dataset(path).schema.names
+        frame = LazyFrame(self, path, names)
+        for column, op, value in filters or ():
+            frame = frame._filtered(comparison(column, op, value), {column})
+        return frame
+
+    def pandas_module(self):
+        """
+        Return a stand-in for the pandas module whose read_parquet is lazy.
+
+        Its other functions (pd.concat, pd.merge, pd.to_datetime, ...) receive the
+        pandas objects behind lazy arguments.
+        """
+        return self._pandas
+
+    def import_hook(self):
+        """Return an `__import__` replacement that hands out the lazy pandas stand-in."""
+        return pandas_import_hook(self._pandas)
+
+    def peak_memory(self):
+        return self.pool.max_memory() + self.materialized_bytes
+
+    def to_pandas(self, table, dtypes=None):
+        """Convert scanned rows to a DataFrame, casting columns to `dtypes` (see `dtypes`)."""
+        frame = table.to_pandas(memory_pool=self.pool)
+        casts = {name: dtype for name, dtype in (dtypes or {}).items()
+                 if name in frame.columns and frame[name].dtype != dtype}
+        if casts:
+            frame = frame.astype(casts)
+        self.materialized_bytes += int(frame.memory_usage(deep=True).sum())
+        return frame
+
+
+class _LazyPandas(_CachedPandas):
+    """Module proxy of a LazyScan whose functions materialize their lazy arguments."""
+
+    def __getattr__(self, name):
+        value = getattr(pd, name)
+        if callable(value) and not isinstance(value, type):
+            return _eager_function(value)
+        return value
+
+
+class LazyFrame:
+    """
+    A parquet file read lazily: a projection and an optional row filter.
+
+    Selecting columns or filtering with masks built from its columns stays lazy, and
+    `len`, `shape`, `columns` and `head` only scan what they need. Any other DataFrame
+    attribute materializes the selected columns of the kept rows, with the row labels
+    and dtypes a full read followed by the same filtering would have. The materialized
+    frame is kept, so assignments and in-place methods apply to it like to a DataFrame,
+    and every later operation on this frame uses it.
+    """
+
+    # isinstance(df, pd.DataFrame) holds, as for an eager read
+    __class__ = property(lambda self: pd.DataFrame)
+
+    def __init__(self, scan, path, columns, filter=None, filter_columns=frozenset()):
+        self._scan = scan
+        self._path = path
+        self._columns = list(columns)
+        self._filter = filter
+        self._filter_columns = frozenset(filter_columns)
+        self._eager = None
+
+    def _filtered(self, expression, columns):
+        combined = expression if self._filter is None else self._filter & expression
+        return LazyFrame(self._scan, self._path, self._columns, combined, self._filter_columns | set(columns))
+
+    def _scanner(self, columns, filter=None):
+        return ds.Scanner.from_dataset(self._scan.dataset(self._path), columns=columns, filter=filter,
+                                       batch_size=self._scan.batch_rows, batch_readahead=1, fragment_readahead=1,
+                                       memory_pool=self._scan.pool)
+
+    def batches(self, columns):
+        """Stream the kept rows of `columns` as record batches, skipping row groups the filter rules out."""
+        return self._scanner(columns, self._filter).to_batches()
+
+    def _labeled_tables(self, columns):
+        """Yield the kept rows of `columns` per batch, with their row number in the file as ROW_NUMBER."""
+        offset = 0
+        for batch in self._scanner(sorted(set(columns) | self._filter_columns)).to_batches():
+            table = pa.Table.from_batches([batch])
+            table = table.append_column(ROW_NUMBER, pa.array(np.arange(offset, offset + len(table))))
+            offset += len(table)
+            if self._filter is not None:
+                table = table.filter(self._filter)
+            yield table.select(list(columns) + [ROW_NUMBER])
+
+    def read(self, columns, limit=None):
+        """Materialize the kept rows of `columns` (at most `limit`) as a DataFrame labelled by row number."""
+        dtypes = self._scan.dtypes(self._path)
+        if self._filter is None and limit is None:
+            return self._scan.to_pandas(self._scanner(list(columns)).to_table(), dtypes)
+        tables, rows = [], 0
+        for table in self._labeled_tables(columns):
+            tables.append(table)
+            rows += len(table)
+            if limit is not None and rows >= limit:
+                break
+        schema = self._scan.dataset(self._path).schema
+        empty = pa.schema([schema.field(c) for c in columns] + [pa.field(ROW_NUMBER, pa.int64())]).empty_table()
+        frame = self._scan.to_pandas(pa.concat_tables(tables or [empty]), dtypes)
+        if limit is not None:
+            frame = frame.iloc[:limit]
+        frame.index = pd.Index(frame.pop(ROW_NUMBER).to_numpy())
+        return frame
+
+    def materialize(self):
+        """The frame as a DataFrame, loaded on first use."""
+        if self._eager is None:
+            self._eager = self.read(self._columns)
+        return self._eager
+
+    @property
+    def columns(self):
+        if self._eager is not None:
+            return self._eager.columns
+        return pd.Index(self._columns)
+
+    @property
+    def shape(self):
+        if self._eager is not None:
+            return self._eager.shape
+        return len(self), len(self._columns)
+
+    def __len__(self):
+        if self._eager is not None:
+            return len(self._eager)
+        return self._scanner([], self._filter).count_rows()
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def head(self, n=5):
+        if self._eager is not None:
+            return self._eager.head(n)
+        return self.read(self._columns, limit=n)
+
+    @property
+    def loc(self):
+        return _LazyLoc(self)
+
+    def __getitem__(self, key):
+        if self._eager is not None:
+            return self._eager[materialize(key)]
+        if isinstance(key, str) and key in self._columns:
+            return LazyColumn(self, key)
+        if isinstance(key, list) and key and all(isinstance(k, str) and k in self._columns for k in key):
+            return LazyFrame(self._scan, self._path, key, self._filter, self._filter_columns)
+        if isinstance(key, LazyPredicate) and key.applies_to(self):
+            return self._filtered(key.expression, key.columns)
+        return self.materialize()[materialize(key)]
+
+    def __setitem__(self, key, value):
+        self.materialize()[_materialize_key(key)] = materialize(value)
+
+    def __delitem__(self, key):
+        del self.materialize()[key]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._eager is None and name in self._columns and not hasattr(pd.DataFrame, name):
+            return LazyColumn(self, name)
+        return _eager_method(getattr(self.materialize(), name))
+
+
+class _LazyLoc:
+    """
+    `.loc` of a LazyFrame or LazyColumn.
+
+    Row masks of the frame and column labels (`loc[mask]`, `loc[mask, 'a']`,
+    `loc[:, ['a', 'b']]`) select lazily; any other key indexes the materialized object.
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def _lazy(self, key):
+        """The lazy selection for `key`, or None if it needs the materialized object."""
+        target = self._target
+        if isinstance(target, LazyColumn):
+            if isinstance(key, LazyPredicate) and target._is_lazy() and key.applies_to(target._frame):
+                return target[key]
+            return None
+        if target._eager is not None:
+            return None
+        rows, columns = key if isinstance(key, tuple) and len(key) == 2 else (key, slice(None))
+        if isinstance(rows, LazyPredicate) and rows.applies_to(target):
+            target = target._filtered(rows.expression, rows.columns)
+        elif not _is_full_slice(rows):
+            return None
+        if _is_full_slice(columns):
+            return target
+        if isinstance(columns, str) and columns in target._columns:
+            return LazyColumn(target, columns)
+        if isinstance(columns, list) and columns and all(isinstance(c, str) and c in target._columns for c in columns):
+            return LazyFrame(target._scan, target._path, columns, target._filter, target._filter_columns)
+        return None
+
+    def __getitem__(self, key):
+        selection = self._lazy(key)
+        if selection is None:
+            return self._target.materialize().loc[_materialize_key(key)]
+        return selection
+
+    def __setitem__(self, key, value):
+        self._target.materialize().loc[_materialize_key(key)] = materialize(value)
+
+
+class LazyColumn:
+    """
+    A column of a LazyFrame.
+
+    Comparisons and `isin` build lazy masks, and count, sum, mean, min, max and
+    value_counts stream the column batch by batch. Everything else materializes
+    the column as a Series.
+    """
+
+    __class__ = property(lambda self: pd.Series)
+
+    def __init__(self, frame, name):
+        self._frame = frame
+        self._name = name
+
+    def _is_lazy(self):
+        """Whether the column still comes from the file, i.e. its frame was not materialized."""
+        return self._frame._eager is None
+
+    def materialize(self):
+        if not self._is_lazy():
+            return self._frame._eager[self._name]
+        return self._frame.read([self._name])[self._name]
+
+    def _arrays(self):
+        """Non-null values per batch; NaN counts as missing, as in pandas."""
+        for batch in self._frame.batches([self._name]):
+            array = batch.column(0)
+            if pa.types.is_floating(array.type):
+                array = pc.filter(array, pc.invert(pc.is_nan(array)))
+            else:
+                array = pc.drop_null(array)
+            yield array
+
+    def _type(self):
+        return self._frame._scan.dataset(self._frame._path).schema.field(self._name).type
+
+    def _dtype(self):
+        """The dtype of the column in an eager read."""
+        return self._frame._scan.dtypes(self._frame._path)[self._name]
+
+    def _streamable(self, args, kwargs, strings=False):
+        """Whether a reduction with these arguments can be streamed for this column's type."""
+        if not self._is_lazy() or args or \
+                any(value is not None and not (key == 'skipna' and value is True) for key, value in kwargs.items()):
+            return False
+        arrow_type = self._type()
+        if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type) or pa.types.is_boolean(arrow_type):
+            # Booleans with missing values load as objects, whose reductions differ
+            return pd.api.types.is_numeric_dtype(self._dtype())
+        return strings and (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type))
+
+    def _scalar(self, name, value):
+        """`value` as the scalar pandas returns for this reduction of the column."""
+        if value is None:
+            return np.nan
+        if name == 'mean':
+            return np.float64(value)
+        dtype = self._dtype()
+        numpy_dtype = getattr(dtype, 'numpy_dtype', dtype)
+        if name == 'sum' and numpy_dtype.kind == 'b':
+            return np.int64(value)
+        return numpy_dtype.type(value)
+
+    def _reduce(self, name, args, kwargs, strings=False):
+        if not self._streamable(args, kwargs, strings):
+            return getattr(self.materialize(), name)(*args, **kwargs)
+        total, count, low, high = 0, 0, None, None
+        for array in self._arrays():
+            if len(array) == 0:
+                continue
+            count += len(array)
+            if name in ('sum', 'mean'):
+                values = array.cast(pa.int64()) if pa.types.is_boolean(array.type) else array
+                total += pc.sum(values).as_py()
+            elif name in ('min', 'max'):
+                extremes = pc.min_max(array)
+                batch_low, batch_high = extremes['min'].as_py(), extremes['max'].as_py()
+                low = batch_low if low is None else min(low, batch_low)
+                high = batch_high if high is None else max(high, batch_high)
+        if name == 'sum':
+            value = total
+        elif name == 'mean':
+            value = total / count if count else None
+        else:
+            value = low if name == 'min' else high
+        return self._scalar(name, value)
+
+    def count(self, *args, **kwargs):
+        if args or kwargs or not self._is_lazy():
+            return self.materialize().count(*args, **kwargs)
+        return np.int64(sum(len(array) for array in self._arrays()))
+
+    def sum(self, *args, **kwargs):
+        return self._reduce('sum', args, kwargs)
+
+    def mean(self, *args, **kwargs):
+        return self._reduce('mean', args, kwargs)
+
+    def min(self, *args, **kwargs):
+        return self._reduce('min', args, kwargs, strings=True)
+
+    def max(self, *args, **kwargs):
+        return self._reduce('max', args, kwargs, strings=True)
+
+    def value_counts(self, *args, **kwargs):
+        if args or set(kwargs) - {'normalize', 'ascending'} or not self._is_lazy():
+            return self.materialize().value_counts(*args, **kwargs)
+        # Values in order of first appearance, like the hash table of pandas
+        counts = {}
+        for array in self._arrays():
+            for item in pc.value_counts(array).to_pylist():
+                counts[item['values']] = counts.get(item['values'], 0) + item['counts']
+        dtype = self._dtype()
+        result = pd.Series(list(counts.values()), index=pd.Index(list(counts), dtype=dtype, name=self._name),
+                           dtype="Int64" if isinstance(dtype, pd.api.extensions.ExtensionDtype) else "int64",
+                           name="count")
+        if kwargs.get('normalize'):
+            result = (result / result.sum()).rename("proportion")
+        return result.sort_values(ascending=kwargs.get('ascending', False))
+
+    def isin(self, values):
+        return self._predicate('in', list(values))
+
+    @property
+    def size(self):
+        return len(self._frame)
+
+    def __len__(self):
+        return len(self._frame)
+
+    @property
+    def loc(self):
+        return _LazyLoc(self)
+
+    def _predicate(self, op, value):
+        if not self._is_lazy():
+            series = self.materialize()
+            return series.isin(value) if op == 'in' else _COMPARISONS[op](series, value)
+        expression = comparison(self._name, op, value)
+        try:
+            # Types Arrow cannot compare (e.g. timestamps with strings) are left to pandas
+            ds.dataset(self._frame._scan.dataset(self._frame._path).schema.empty_table()).to_table(filter=expression)
+        except (pa.ArrowException, TypeError, ValueError):
+            series = self.materialize()
+            return series.isin(value) if op == 'in' else _COMPARISONS[op](series, value)
+        return LazyPredicate(self._frame, expression, {self._name})
+
+    def _compare(op):
+        def method(self, other):
+            if isinstance(other, (LazyFrame, LazyColumn, LazyPredicate)) or not pd.api.types.is_scalar(other):
+                return _COMPARISONS[op](self.materialize(), materialize(other))
+            return self._predicate(op, other)
+        return method
+
+    __eq__, __ne__ = _compare('=='), _compare('!=')
+    __lt__, __le__, __gt__, __ge__ = _compare('<'), _compare('<='), _compare('>'), _compare('>=')
+    __hash__ = None
+    del _compare
+
+    def __getitem__(self, key):
+        if isinstance(key, LazyPredicate) and self._is_lazy() and key.applies_to(self._frame):
+            return LazyColumn(self._frame._filtered(key.expression, key.columns), self._name)
+        return self.materialize()[materialize(key)]
+
+    def __setitem__(self, key, value):
+        # Like chained assignment on a DataFrame column, this writes to the frame
+        self._frame.materialize()[self._name][materialize(key)] = materialize(value)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _eager_method(getattr(self.materialize(), name))
+
+
+class LazyPredicate:
+    """
+    A row mask over the columns of a LazyFrame, kept as an Arrow filter expression.
+
+    Indexing the frame (or one of its columns) with it filters the scan; `sum`, `any`
+    and `all` count matching rows without loading them.
+    """
+
+    __class__ = property(lambda self: pd.Series)
+
+    def __init__(self, frame, expression, columns):
+        self.frame = frame
+        self.expression = expression
+        self.columns = frozenset(columns)
+
+    def applies_to(self, frame):
+        """Whether indexing `frame` with this mask selects the same rows as pandas would."""
+        return frame._path == self.frame._path and (self.frame._filter is None or self.frame._filter is frame._filter)
+
+    def _combine(op):
+        def method(self, other):
+            if isinstance(other, LazyPredicate) and other.frame._path == self.frame._path and \
+                    other.frame._filter is self.frame._filter:
+                return LazyPredicate(self.frame, op(self.expression, other.expression), self.columns | other.columns)
+            return op(self.materialize(), materialize(other))
+        return method
+
+    __and__, __or__, __xor__ = _combine(operator.and_), _combine(operator.or_), _combine(operator.xor)
+    del _combine
+
+    def __invert__(self):
+        return LazyPredicate(self.frame, ~self.expression, self.columns)
+
+    def _matching_rows(self):
+        return np.int64(len(self.frame._filtered(self.expression, self.columns)))
+
+    def sum(self, *args, **kwargs):
+        return self.materialize().sum(*args, **kwargs) if args or kwargs else self._matching_rows()
+
+    def any(self, *args, **kwargs):
+        return self.materialize().any(*args, **kwargs) if args or kwargs else np.bool_(self._matching_rows() > 0)
+
+    def all(self, *args, **kwargs):
+        if args or kwargs:
+            return self.materialize().all(*args, **kwargs)
+        return np.bool_(self._matching_rows() == len(self.frame))
+
+    def materialize(self):
+        """The mask as a boolean Series labelled like the frame's rows."""
+        frame = self.frame.read(sorted(self.columns))
+        if frame.empty:
+            return pd.Series(False, index=frame.index, dtype=bool)
+        mask = ds.dataset(pa.Table.from_pandas(frame, preserve_index=False)).to_table(
+            columns={"mask": self.expression})["mask"]
+        return pd.Series(mask.to_numpy(zero_copy_only=False), index=frame.index, dtype=bool)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _eager_method(getattr(self.materialize(), name))
+
+
+for _cls in (LazyFrame, LazyColumn, LazyPredicate):
+    for _name in _FALLBACK_OPERATORS + ('__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__'):
+        if _name not in vars(_cls):
+            setattr(_cls, _name, _fallback(_name))
+    _cls.__hash__ = None
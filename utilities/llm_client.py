@@ -0,0 +1,165 @@
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+import openai
+
+# Errors worth retrying; the first group also signals that the server is saturated
+THROTTLE_ERRORS = (openai.RateLimitError, openai.InternalServerError)
+TRANSIENT_ERRORS = (openai.APITimeoutError, openai.APIConnectionError)
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit for in-flight LLM requests, adapted in the style of AIMD.
+
+    Every successful request adds 1/limit to the limit (about +1 per round trip of the
+    whole window). A throttled request (429 / 5xx) multiplies it by `decrease_factor`,
+    and so does a request whose latency exceeds `latency_tolerance` times the best
+    latency seen so far, which is the first sign of server-side queueing. Only requests
+    that started after the last decrease can trigger another one.
+    """
+
+    def __init__(self, initial=8, minimum=1, maximum=64, decrease_factor=0.5, latency_tolerance=2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.throttled = 0
+        self.decreases = 0
+        self.best_latency = None
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """Wait for a free slot and return the request start time."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < max(self.minimum, int(self.limit)))
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.monotonic()
+
+    async def release(self, started, latency=None, throttled=False):
+        """
+        Free a slot and adapt the limit.
+
+        Args:
+            started (float): Value returned by the matching `acquire`.
+            latency (float, optional): Observed latency of a successful request, ideally
+                normalized per completion token so long answers are not mistaken for queueing.
+            throttled (bool): Whether the server rejected the request as overloaded.
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self._decrease(started)
+            elif latency is not None:
+                if self.best_latency is None or latency < self.best_latency:
+                    self.best_latency = latency
+                if latency > self.latency_tolerance * self.best_latency:
+                    self._decrease(started)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def _decrease(self, started):
+        if started < self._last_decrease:
+            return  # This request was sent under the old limit
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        self.decreases += 1
+        self._last_decrease = time.monotonic()
+
+
+def retry_after_seconds(exc):
+    """Return the delay requested by the server through Retry-After headers, if any."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff_delay(attempt, retry_after=None, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter; a server-provided Retry-After takes precedence."""
+    if retry_after is not None:
+        return min(cap, retry_after) + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AsyncLLMClient:
+    """
+    openai.AsyncOpenAI client running on a background event loop.
+
+    The number of concurrent requests is decided by an AIMDLimiter, and throttled or
+    transient failures are retried with jittered backoff that honours Retry-After.
+    Coroutine users call `acreate`; threaded code (such as process_question running in
+    the pipeline's thread pool) calls the blocking `create`.
+    """
+
+    def __init__(self, client_args, limiter=None, max_attempts=6):
+        self.max_attempts = max_attempts
+        self.retries = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-llm-client", daemon=True)
+        self._thread.start()
+        # Retries are handled here so the limiter sees every 429
+        self._client = openai.AsyncOpenAI(**client_args, max_retries=0)
+        self.limiter = limiter or AIMDLimiter()
+
+    async def acreate(self, **completion_args):
+        """Create a chat completion, waiting for a concurrency slot and retrying on throttling."""
+        for attempt in range(self.max_attempts):
+            started = await self.limiter.acquire()
+            try:
+                completion = await self._client.chat.completions.create(**completion_args)
+            except THROTTLE_ERRORS + TRANSIENT_ERRORS as e:
+                await self.limiter.release(started, throttled=isinstance(e, THROTTLE_ERRORS))
+                if attempt == self.max_attempts - 1:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(backoff_delay(attempt, retry_after_seconds(e)))
+            except BaseException:
+                await self.limiter.release(started)
+                raise
+            else:
+                latency = time.monotonic() - started
+                usage = getattr(completion, "usage", None)
+                if usage is not None and usage.completion_tokens:
+                    latency /= usage.completion_tokens
+                await self.limiter.release(started, latency=latency)
+                return completion
+
+    def create(self, **completion_args):
+        """Blocking wrapper around `acreate` for use from worker threads."""
+        return asyncio.run_coroutine_threadsafe(self.acreate(**completion_args), self._loop).result()
+
+    def format_stats(self):
+        limiter = self.limiter
+        return (f"LLM concurrency: limit {limiter.limit:.1f} (peak {limiter.peak_in_flight} in flight), "
+                f"{limiter.throttled} throttled responses, {limiter.decreases} decreases, {self.retries} retries")
+
+    def close(self):
+        """Close the HTTP client and stop the event loop."""
+        asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
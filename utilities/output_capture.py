@@ -0,0 +1,57 @@
+import sys
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+class _ThreadLocalStdout:
+    """
+    Stand-in for sys.stdout that routes writes to the sink of the current thread.
+
+    Threads without an active capture write to the stream that was sys.stdout when the
+    router was installed, so progress bars and logging keep working as before.
+    """
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+
+    def _target(self):
+        sink = getattr(_local, "sink", None)
+        return self._fallback if sink is None else sink
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+def _install_router():
+    """Replace sys.stdout with the thread-local router (once per process)."""
+    if isinstance(sys.stdout, _ThreadLocalStdout):
+        return
+    with _install_lock:
+        if not isinstance(sys.stdout, _ThreadLocalStdout):
+            sys.stdout = _ThreadLocalStdout(sys.stdout)
+
+
+@contextmanager
+def capture_stdout(sink):
+    """
+    Thread-safe replacement for contextlib.redirect_stdout.
+
+    Everything the current thread writes to sys.stdout (print included) goes to `sink`
+    while the context is active; other threads are not affected.
+    """
+    _install_router()
+    previous = getattr(_local, "sink", None)
+    _local.sink = sink
+    try:
+        yield sink
+    finally:
+        _local.sink = previous
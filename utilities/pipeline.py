@@ -1,35 +1,300 @@
-import json
+import os
 import pathlib
-from concurrent.futures import ThreadPoolExecutor
+import functools
+import pandas as pd
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from tqdm import tqdm
-from .data_loading import load_schemas, load_questions
+from .data_loading import load_schemas, load_questions, load_column_catalog, write_results
 from .question_processing import process_question
-from .code_execution import execute_pandas_code
+from .consensus import consensus_question, DEFAULT_MAX_CANDIDATES, DEFAULT_MIN_AGREEMENT
+from .code_execution import capture_exec_output, execute_pandas_code, convert_types
+from .dataset_cache import DATASET_CACHE, DEFAULT_MAX_BYTES
+from .snippet_cache import SNIPPET_CACHE
+from .result_cache import ResultCache
+from .sql_engine import run_sql
+from .sandbox import SandboxPool, DEFAULT_TIMEOUT
+from .journal import ResultJournal, assign_question_ids
+from .tracing import TRACER, enable_tracing, disable_tracing
+from . import agents
 
 
-def run_pipeline(schema_path, qa_path, output_path, max_retries=1, dataset_folder_path="data/"):
-    """Run the complete pipeline with error checking and retrying."""
-    # Load input data
+def iter_questions_grouped(qa_path):
+    """
+    Stream the questions of `qa_path` grouped by dataset, in order of first appearance.
+
+    Each group keeps file order, so question ids match those of a file-order pass. The
+    file is read once per dataset instead of holding all questions in memory.
+    """
+    datasets = dict.fromkeys(q['dataset'] for q in load_questions(qa_path))
+    for dataset in datasets:
+        yield from assign_question_ids(q for q in load_questions(qa_path) if q['dataset'] == dataset)
+
+
+def run_pipeline(schema_path, qa_path, output_path, max_retries=1, dataset_folder_path="data/",
+                 dataset_cache_bytes=DEFAULT_MAX_BYTES, reexecute=False, max_workers=8,
+                 sandbox_workers=0, timeout=DEFAULT_TIMEOUT, memory_limit=None, async_llm=False,
+                 max_in_flight=64, completion_cache_path=None, completion_cache_readonly=False,
+                 journal_path="intermediate_results/journal.jsonl", resume=True, column_catalog_path=None,
+                 use_arrow=False, copy_on_write=False, sample_first=False, candidates=1,
+                 require_majority=False, consensus=0, max_candidates=DEFAULT_MAX_CANDIDATES,
+                 min_agreement=DEFAULT_MIN_AGREEMENT, trace_path=None, group_by_dataset=False,
+                 max_active_datasets=2, prompt_token_budget=None,
+                 stable_prompt_prefix=False, static_check=True, result_cache_path=None,
+                 engine="pandas", lazy=False):
+    """
+    Run the complete pipeline with error checking and retrying.
+
+    The output of each question's validation run is kept as its `final_answer`. Set
+    `reexecute` to run all generated code again on the full datasets instead, e.g.
+    after the datasets have changed. Output capture is per thread, so `max_workers`
+    questions can safely be processed concurrently.
+
+    With `sandbox_workers` > 0 generated code runs in a pool of that many worker
+    processes that preload the datasets and enforce `timeout` (seconds) and
+    `memory_limit` (bytes) per snippet; otherwise it runs in-process.
+
+    With `async_llm` the LLM calls go through an asyncio client that keeps up to
+    `max_in_flight` requests open, adapting to latency and rate limits; enough
+    question threads are started to saturate it.
+
+    With `completion_cache_path` completions are read from and written to a persistent
+    cache; `completion_cache_readonly` replays it without calling the API.
+
+    Every finished question is appended to the JSONL journal at `journal_path` right
+    away. With `resume`, questions already answered successfully are skipped, so an
+    interrupted run continues where it stopped and failed questions are tried again;
+    otherwise the journal is cleared.
+    The outputs are streamed from the journal in question order, as JSONL when the
+    path ends in .jsonl. Questions are read lazily and only a bounded number are in
+    flight at once, so memory does not grow with the size of the QA set.
+
+    With the `column_catalog_path` written by preprocessing, parquet reads in the
+    generated code only load the columns the code needs.
+
+    With `use_arrow`, datasets are memory-mapped from the `<name>.arrow` files written
+    by `preprocessing.py --arrow` when present. `copy_on_write` enables pandas
+    copy-on-write so generated code gets views of cached tables instead of copies.
+
+    With `sample_first`, candidate code is validated on the stratified samples in
+    `sample_datasets/` before it runs on the full datasets (see process_question).
+
+    With `candidates` > 1 each question starts with that many solutions generated
+    and executed in parallel, keeping the first that succeeds (or, with
+    `require_majority`, the answer most of them agree on) before falling back to
+    serial repair. This trades tokens for lower latency on hard questions.
+
+    With `consensus` > 0 answers are chosen by voting instead: that many programs are
+    generated per question and the most frequent well-formed answer wins, with more
+    candidates (up to `max_candidates`) only while agreement stays below
+    `min_agreement` (see consensus_question).
+
+    With `trace_path`, timing spans of every stage (generate, retry, clean, rewrite,
+    load, exec, dump) and LLM token counts are appended to that JSONL file, and a
+    report with p50/p95/p99 per stage and the slowest questions and datasets is
+    printed at the end. Loads inside sandbox workers are not traced separately; they
+    are part of the 'exec' spans.
+
+    With `group_by_dataset` the questions of each dataset are scheduled together and
+    at most `max_active_datasets` datasets are in flight at once. A table is loaded on
+    first use instead of preloaded, and dropped from the dataset caches (including the
+    sandbox workers') as soon as its last question finishes, so only a few tables are
+    resident at a time. Sandboxed snippets go to the worker that already holds
+    their dataset whenever it is idle.
+
+    With `prompt_token_budget`, prompts are kept within about that many tokens by
+    including only the schema columns most relevant to each question and collapsing
+    older failed attempts into error summaries.
+
+    With `stable_prompt_prefix`, prompts start with the shared instructions and the
+    dataset schema, so all prompts about a dataset share a prefix that servers with
+    prefix caching can reuse; best combined with `group_by_dataset`. The compacted
+    schemas of a prompt budget depend on the question, which leaves only the
+    instructions shared.
+
+    With `static_check` (on by default, as in the CLI), generated code is analysed
+    before it runs (see check_code): syntax errors, undefined names, misspelled columns
+    and dtype-incompatible operations are sent back to the LLM without loading or
+    executing anything. Column and dtype checks need the column catalog.
+
+    With `result_cache_path`, execution results are stored in a persistent cache keyed
+    by the normalized code, the modification time and size of the datasets it reads, and
+    the execution mode (`lazy`, `use_arrow`, `copy_on_write`).
+    Code equivalent to an earlier snippet, including the reruns of `reexecute`, is not
+    executed again until preprocessing rewrites one of its datasets.
+
+    `engine` chooses what the LLM writes: "pandas" code, "sql" queries that DuckDB runs
+    in-process directly over the parquet files (multi-threaded scans that read only the
+    needed columns, subject to `timeout` and `memory_limit`), or "race", which runs a
+    candidate of each and keeps the first (or, with `consensus`, the most agreed) answer.
+    Questions with an 'engine' key use that engine instead.
+
+    With `lazy`, pandas code runs out of core: `pd.read_parquet` returns a frame that
+    streams the file in row-group batches, answering filters, counts and simple
+    aggregations without loading the table and materializing only the selected columns
+    otherwise. Datasets are neither cached nor preloaded, and each answer records the
+    peak memory of its execution under 'peak_memory'.
+    """
+    # Decoded datasets are shared between all executions; 0 disables the cache
+    DATASET_CACHE.max_bytes = dataset_cache_bytes
+    DATASET_CACHE.prefer_arrow = use_arrow
+    if copy_on_write:
+        pd.set_option("mode.copy_on_write", True)
+
+    # Load input data; questions are streamed from qa_path when needed
     schemas = load_schemas(schema_path)
-    questions = load_questions(qa_path)
-
-    # Generate pandas code with error checking
-    print("Generating pandas code with error checking...")
-    results = []
-
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        for result in tqdm(executor.map(lambda q: process_question(q, schemas, dataset_folder_path, max_retries), questions), total=len(questions)):
-            results.append(result)
-
-    # Save intermediate results
-    intermediate_file = "intermediate_results/all_qa_pandas_code_not_executed.json"
-    pathlib.Path(intermediate_file).parent.mkdir(parents=True, exist_ok=True)
-    with open(intermediate_file, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=4)
-
-    # Execute code and save results for full datasets only
-    print("Executing code on full datasets...")
-    full_results = execute_pandas_code(results.copy(), dataset_folder_path=dataset_folder_path)
-    pathlib.Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(full_results, f, ensure_ascii=False, indent=4) 
\ No newline at end of file
+    column_catalog = load_column_catalog(column_catalog_path) if column_catalog_path else None
+    journal = ResultJournal(journal_path)
+    if not resume:
+        journal.reset()
+    completed = journal.completed_ids()
+    if completed:
+        print(f"Resuming: {len(completed)} questions already answered in {journal_path}")
+
+    if prompt_token_budget:
+        agents.enable_prompt_budget(prompt_token_budget)
+    if stable_prompt_prefix:
+        agents.enable_prefix_stable_prompts()
+    if completion_cache_path:
+        agents.enable_completion_cache(completion_cache_path, readonly=completion_cache_readonly)
+    if async_llm:
+        agents.enable_async_client(max_in_flight=max_in_flight)
+        # Threads mostly wait on the client, which decides the real concurrency
+        max_workers = max(max_workers, max_in_flight)
+
+    if trace_path:
+        enable_tracing(trace_path)
+
+    sandbox = None
+    run_code = functools.partial(capture_exec_output, lazy=True) if lazy else capture_exec_output
+    if sandbox_workers:
+        # Grouped runs load each table when its group starts rather than all up front
+        preload_paths = [] if group_by_dataset or lazy else [
+            os.path.join(dataset_folder_path, "all_datasets", f"{dataset}.parquet")
+            for dataset in dict.fromkeys(q['dataset'] for q in load_questions(qa_path))
+        ]
+        sandbox = SandboxPool(sandbox_workers, timeout=timeout, memory_limit=memory_limit,
+                              preload_paths=preload_paths, dataset_cache_bytes=dataset_cache_bytes,
+                              prefer_arrow=use_arrow, copy_on_write=copy_on_write, lazy=lazy)
+        run_code = sandbox.run
+    result_cache = ResultCache(result_cache_path, mode={"lazy": lazy, "arrow": use_arrow,
+                                                        "copy_on_write": copy_on_write}) if result_cache_path else None
+    run_query = functools.partial(run_sql, timeout=timeout, memory_limit=memory_limit)
+
+    try:
+        # Generate pandas code with error checking
+        print("Generating pandas code with error checking...")
+        if group_by_dataset:
+            questions = iter_questions_grouped(qa_path)
+            # Questions left per dataset; a table is released when its count reaches zero
+            unfinished = Counter(q['dataset'] for q in assign_question_ids(load_questions(qa_path))
+                                 if q['question_id'] not in completed)
+        else:
+            questions = assign_question_ids(load_questions(qa_path))
+        pending = (q for q in questions if q['question_id'] not in completed)
+        active_datasets = set()
+
+        def release_dataset(dataset):
+            paths = [os.path.join(dataset_folder_path, folder, f"{dataset}.parquet")
+                     for folder in ("all_datasets", "sample_datasets")]
+            for path in paths:
+                DATASET_CACHE.evict(path)
+            if sandbox is not None:
+                sandbox.evict(paths)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, tqdm(initial=len(completed)) as progress:
+            def journal_finished(futures):
+                done, remaining = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    journal.append(result)
+                    progress.update()
+                    if group_by_dataset:
+                        unfinished[result['dataset']] -= 1
+                        if unfinished[result['dataset']] == 0:
+                            active_datasets.discard(result['dataset'])
+                            release_dataset(result['dataset'])
+                return remaining
+
+            def solve(question_data):
+                run = run_code
+                if sandbox is not None:
+                    run = functools.partial(sandbox.run, affinity=question_data['dataset'])
+                if result_cache is not None:
+                    run = result_cache.wrap(run)
+                with TRACER.question(question_data), TRACER.span("question"):
+                    if consensus:
+                        return consensus_question(question_data, schemas, dataset_folder_path, max_retries,
+                                                  executor=run, column_catalog=column_catalog,
+                                                  sample_first=sample_first, initial_candidates=consensus,
+                                                  max_candidates=max_candidates, min_agreement=min_agreement,
+                                                  static_check=static_check, engine=engine,
+                                                  sql_executor=run_query)
+                    return process_question(question_data, schemas, dataset_folder_path, max_retries,
+                                            executor=run, column_catalog=column_catalog,
+                                            sample_first=sample_first, candidates=candidates,
+                                            require_majority=require_majority, static_check=static_check,
+                                            engine=engine, sql_executor=run_query)
+
+            in_flight = set()
+            try:
+                for question_data in pending:
+                    # Keep the pool busy without materializing the whole QA set, and with
+                    # grouping, only start a new dataset once one of the active ones is done
+                    dataset = question_data['dataset']
+                    while len(in_flight) >= 2 * max_workers or (
+                            group_by_dataset and dataset not in active_datasets
+                            and len(active_datasets) >= max_active_datasets):
+                        in_flight = journal_finished(in_flight)
+                    if group_by_dataset:
+                        active_datasets.add(dataset)
+                    in_flight.add(executor.submit(solve, question_data))
+                while in_flight:
+                    in_flight = journal_finished(in_flight)
+            except BaseException:
+                # Do not start new questions; finished ones are already journaled
+                for future in in_flight:
+                    future.cancel()
+                raise
+
+        def ordered_results():
+            question_ids = (q['question_id'] for q in assign_question_ids(load_questions(qa_path)))
+            return journal.iter_results(question_ids)
+
+        # Save intermediate results
+        intermediate_file = "intermediate_results/all_qa_pandas_code_not_executed.jsonl"
+        pathlib.Path(intermediate_file).parent.mkdir(parents=True, exist_ok=True)
+        with TRACER.span("dump", path=intermediate_file):
+            write_results(ordered_results(), intermediate_file)
+
+        if reexecute:
+            # Execute code and save results for full datasets only
+            print("Executing code on full datasets...")
+            full_results = execute_pandas_code(ordered_results(), dataset_folder_path=dataset_folder_path,
+                                               executor=result_cache.wrap(run_code) if result_cache else run_code,
+                                               column_catalog=column_catalog, sql_executor=run_query)
+        else:
+            full_results = (convert_types(result) for result in ordered_results())
+        pathlib.Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        with TRACER.span("dump", path=output_path):
+            write_results(full_results, output_path)
+    finally:
+        if sandbox is not None:
+            sandbox.close()
+        if result_cache is not None:
+            print(result_cache.format_stats())
+            result_cache.close()
+        if agents.ASYNC_LLM_CLIENT is not None:
+            print(agents.ASYNC_LLM_CLIENT.format_stats())
+            agents.disable_async_client()
+        agents.disable_prompt_budget()
+        agents.disable_prefix_stable_prompts()
+        if agents.COMPLETION_CACHE is not None:
+            print(agents.COMPLETION_CACHE.format_stats())
+            agents.disable_completion_cache()
+        if TRACER.enabled:
+            print(TRACER.format_summary())
+            disable_tracing()
+
+    print(DATASET_CACHE.format_stats())
+    print(SNIPPET_CACHE.format_stats())
@@ -0,0 +1,276 @@
+import re
+import unicodedata
+
+# Rough characters per token of the English/Spanish prompts; avoids depending on a tokenizer
+CHARS_PER_TOKEN = 4
+DEFAULT_MAX_PROMPT_TOKENS = 3000
+
+# Tokens of the prompt template around the schema, question and code (instructions, framing)
+TEMPLATE_OVERHEAD_TOKENS = 150
+
+# Share of the budget the schema keeps however long the retry history gets
+MIN_SCHEMA_SHARE = 0.25
+
+COLUMN_LINE = re.compile(r"Column Name: (.*?), Data type --")
+EXAMPLES = re.compile(r"Example values: (.*), Total unique elements")
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "the", "of", "a", "an", "in", "is", "are", "what", "which", "how", "many", "for", "to", "and", "or",
+    "with", "by", "on", "do", "does", "there", "that", "this", "be", "from", "at", "as", "el", "la",
+    "de", "los", "las", "en", "y", "que", "del",
+}
+
+
+def estimate_tokens(text):
+    """Approximate number of tokens of a prompt fragment."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _words(text):
+    """Lower-case words without accents, split on underscores and camelCase."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return [word for word in WORD.findall(text.replace("_", " ")) if word not in STOPWORDS]
+
+
+def _stem(word):
+    """Crude singular form, so 'employees' matches a column named 'employee'."""
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def split_schema(schema):
+    """
+    Split a schema summary from preprocessing into its intro and one line per column.
+
+    Lines that do not describe a column are kept with the intro.
+    """
+    intro, columns = [], []
+    for line in schema.splitlines():
+        (columns if COLUMN_LINE.match(line) else intro).append(line)
+    return "\n".join(intro), columns
+
+
+def score_column(line, question_words):
+    """
+    Lexical relevance of a schema line to a question: words shared with the column
+    name count three times as much as words shared with its example values.
+    """
+    match = COLUMN_LINE.match(line)
+    name_words = {_stem(w) for w in _words(match.group(1))} if match else set()
+    examples = EXAMPLES.search(line)
+    example_words = {_stem(w) for w in _words(examples.group(1))} if examples else set()
+    return 3 * len(name_words & question_words) + len(example_words & question_words)
+
+
+def compact_schema(schema, question, max_tokens):
+    """
+    Fit a schema summary into `max_tokens` by keeping the columns most relevant to the question.
+
+    Columns are ranked by lexical overlap of the question with their names and example
+    values; the best ones keep their full line, in the original column order. Columns
+    unrelated to the question may use at most half of what the relevant ones leave,
+    the rest lists the names of the omitted columns so the model knows they exist;
+    names that do not fit are still counted.
+
+    Args:
+        schema (str): Schema summary as written by preprocessing.
+        question (str): The question the prompt is about.
+        max_tokens (int): Token budget for the schema.
+
+    Returns:
+        str: The schema itself when it fits, else the compacted schema.
+    """
+    if estimate_tokens(schema) <= max_tokens:
+        return schema
+    intro, lines = split_schema(schema)
+    if not lines:
+        return schema
+
+    question_words = {_stem(w) for w in _words(question)}
+    scores = [score_column(line, question_words) for line in lines]
+    ranked = sorted(range(len(lines)), key=lambda i: (-scores[i], i))
+    names = [COLUMN_LINE.match(line).group(1) for line in lines]
+
+    # Full lines of the best columns first; the name list of the others gets what is left
+    budget = max_tokens - estimate_tokens(intro) - 20
+    kept = set()
+    for i in ranked:
+        cost = estimate_tokens(lines[i])
+        if kept and (cost > budget or (scores[i] == 0 and cost > budget // 2)):
+            break
+        kept.add(i)
+        budget -= cost
+
+    parts = [intro] if intro else []
+    parts.extend(lines[i] for i in sorted(kept))
+    omitted = [names[i] for i in range(len(lines)) if i not in kept]
+    listed = []
+    for name in omitted:
+        budget -= estimate_tokens(name + ", ")
+        if budget < 0:
+            break
+        listed.append(name)
+    if omitted:
+        more = len(omitted) - len(listed)
+        if not listed:
+            parts.append(f"Other columns (details omitted): {more} more")
+        else:
+            parts.append(f"Other columns (details omitted): {', '.join(listed)}" + (f" and {more} more" if more else ""))
+    return "\n".join(parts)
+
+
+def summarize_error(error_message, max_chars=200):
+    """First line of an error message, truncated; enough to tell the model what went wrong."""
+    lines = str(error_message).strip().splitlines()
+    first_line = lines[0] if lines else ""
+    return first_line if len(first_line) <= max_chars else first_line[:max_chars - 3] + "..."
+
+
+def compact_attempts(previous_attempts, full_attempts=1):
+    """
+    Collapse older failed attempts of a retry history into short error summaries.
+
+    The newest `full_attempts` attempts keep their code and error; older ones keep only
+    a one-line error summary, with None in place of the code.
+
+    Args:
+        previous_attempts (list[tuple]): (code, error_message) pairs, oldest first.
+        full_attempts (int): How many of the newest attempts to keep in full.
+
+    Returns:
+        list[tuple]: The compacted history, in the same order.
+    """
+    cutoff = len(previous_attempts) - full_attempts
+    return [(code, error) if i >= cutoff else (None, summarize_error(error))
+            for i, (code, error) in enumerate(previous_attempts)]
+
+
+class PromptBudget:
+    """
+    Token budget applied to the prompts built by get_pandas_code.
+
+    Retry histories are compacted first (older attempts collapsed to error summaries),
+    then whatever remains of `max_tokens` after the instructions, question and code
+    goes to the schema, which is compacted to the most relevant columns if needed.
+    The schema always gets at least `min_schema_share` of the budget, even when a long
+    retry history pushes the prompt over it.
+    """
+
+    def __init__(self, max_tokens=DEFAULT_MAX_PROMPT_TOKENS, full_attempts=1, min_schema_share=MIN_SCHEMA_SHARE):
+        self.max_tokens = max_tokens
+        self.full_attempts = full_attempts
+        self.min_schema_share = min_schema_share
+
+    def fit(self, schema, question, instructions, error_code=None):
+        """
+        Return (schema, error_code) compacted to fit the budget.
+
+        Args:
+            schema (str): The full schema summary.
+            question (str): The question.
+            instructions (str): The instruction text embedded in the prompt.
+            error_code (tuple or list[tuple], optional): Retry history as passed to get_pandas_code.
+        """
+        if isinstance(error_code, list):
+            error_code = compact_attempts(error_code, self.full_attempts)
+        attempts = [error_code] if isinstance(error_code, tuple) else (error_code or [])
+        history = "".join(f"{code or ''}{error}" for code, error in attempts)
+        used = (TEMPLATE_OVERHEAD_TOKENS + estimate_tokens(instructions) + 3 * estimate_tokens(question)
+                + estimate_tokens(history))
+        schema_tokens = max(self.max_tokens - used, int(self.max_tokens * self.min_schema_share))
+        return compact_schema(schema, question, schema_tokens), error_code
+
+
+def build_prefix_stable_prompt(dataset_name, question, schema, instructions, question_notes='', error_code=None):
+    """
+    Build a prompt whose beginning depends only on the dataset.
+
+    The static instructions come first and the schema second, so every prompt about
+    the same dataset is byte-identical up to the question. The question, the notes
+    that depend on it, and any retry history follow.
+
+    Args:
+        dataset_name (str): The name of the dataset.
+        question (str): The question to be answered.
+        schema (str): The schema of the dataset.
+        instructions (str): Instructions that do not depend on the question.
+        question_notes (str): Extra instructions for this question.
+        error_code (tuple or list[tuple], optional): Retry history as passed to get_pandas_code;
+            attempts whose code is None are reported by their error only.
+
+    Returns:
+        str: The prompt.
+    """
+    prompt = (
+        f"Write python code using pandas that answers questions about a dataset. "
+        f"Strictly follow these instructions:\n{instructions}\n"
+        f"The code reads the parquet file {dataset_name}.parquet with pd.read_parquet('{dataset_name}.parquet').\n"
+        f"Dataset schema:\n{schema}\n\n"
+        f"Question: `{question}`\n"
+    )
+    if question_notes.strip():
+        prompt += f"{question_notes.strip()}\n"
+
+    attempts = [error_code] if isinstance(error_code, tuple) else (error_code or [])
+    if attempts:
+        *earlier, (last_code, last_error) = attempts
+        if earlier:
+            prompt += "\nEarlier attempts that also failed:\n"
+            for idx, (code, error) in enumerate(earlier, start=1):
+                if code is None:
+                    prompt += f"Attempt {idx} failed with: {error}\n"
+                else:
+                    prompt += f"Attempt {idx}:\n```python\n{code}\n```\nError: {error}\n"
+        prompt += (f"\nThe following code generated an error when executed:\n```python\n{last_code}\n```\n"
+                   f"Error: {last_error}\nSolve the error and provide the corrected code.\n")
+    return prompt
+
+
+# Instructions of the SQL engine; answers follow the same formats as the pandas prompts
+SQL_INSTRUCTIONS = '''Write a single DuckDB SQL query in one ```sql code block and nothing else.
+The query must return exactly the answer: one value, or for a list of values one row with a single list,
+e.g. SELECT list("name" ORDER BY "age") FROM ..., so that a list with one element is still a list.
+If it is a Yes or No question, the query should return a boolean.
+Do not include any explanations or comments.
+If the question doesn't specifically ask for it, don't use DISTINCT.
+Quote column names with double quotes.'''
+
+
+def build_sql_prompt(dataset_name, question, schema, instructions=SQL_INSTRUCTIONS, error_code=None):
+    """
+    Build a prompt asking for a DuckDB query instead of pandas code.
+
+    The table is a view named after the dataset. Like build_prefix_stable_prompt, the
+    instructions and schema come before the question and retry history.
+
+    Args:
+        dataset_name (str): The name of the dataset, which is also the table name.
+        question (str): The question to be answered.
+        schema (str): The schema of the dataset.
+        instructions (str): Instructions for the query.
+        error_code (tuple or list[tuple], optional): Retry history as passed to get_pandas_code;
+            attempts whose code is None are reported by their error only.
+
+    Returns:
+        str: The prompt.
+    """
+    prompt = (
+        f"Write a SQL query that answers questions about a dataset. Strictly follow these instructions:\n"
+        f"{instructions}\n"
+        f"The dataset is the table \"{dataset_name}\".\n"
+        f"Dataset schema:\n{schema}\n\n"
+        f"Question: `{question}`\n"
+    )
+    attempts = [error_code] if isinstance(error_code, tuple) else (error_code or [])
+    if attempts:
+        *earlier, (last_code, last_error) = attempts
+        if earlier:
+            prompt += "\nEarlier attempts that also failed:\n"
+            for idx, (code, error) in enumerate(earlier, start=1):
+                if code is None:
+                    prompt += f"Attempt {idx} failed with: {error}\n"
+                else:
+                    prompt += f"Attempt {idx}:\n```sql\n{code}\n```\nError: {error}\n"
+        prompt += (f"\nThe following query generated an error when executed:\n```sql\n{last_code}\n```\n"
+                   f"Error: {last_error}\nSolve the error and provide the corrected query.\n")
+    return prompt
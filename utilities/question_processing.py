@@ -1,12 +1,261 @@
+import json
+import threading
 import traceback
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from .agents import get_pandas_code
-from .error_handling import classify_error
-from .code_processing import clean_pandas_code, modify_parquet_paths
-from .code_execution import capture_exec_output
+from .cancellation import cancel_on
+from .error_handling import classify_error, error_type_name, is_conclusive_sample_error
+from .code_processing import clean_pandas_code
+from .code_execution import capture_exec_output, convert_types
+from .snippet_cache import SNIPPET_CACHE
+from .sql_engine import clean_sql_code, prepare_query, run_sql
+from .static_analysis import check_code
+from .lazy_frame import last_peak_memory, reset_peak_memory
+from .tracing import TRACER
 
 
-def process_question(question_data, schemas, dataset_folder_path, max_retries=1):
-    """Process a single question to generate pandas code with error checking and retrying."""
+# Engines the generated code can target, see get_pandas_code; "race" runs one candidate of each
+ENGINES = ("pandas", "sql")
+
+
+def engines_for(engine):
+    """Engines whose candidates are generated for an engine setting ("pandas", "sql" or "race")."""
+    return ENGINES if engine == "race" else (engine,)
+
+
+def clean_code(pandas_code, engine="pandas"):
+    """Strip the markdown around generated pandas code or SQL."""
+    return clean_sql_code(pandas_code) if engine == "sql" else clean_pandas_code(pandas_code)
+
+
+def prepare_code(pandas_code, dataset_folder_path, is_sample=False, column_catalog=None, engine="pandas",
+                 dataset=None):
+    """
+    Clean generated code and point its parquet reads at the full or sample datasets (memoized).
+
+    SQL (`engine="sql"`) is bound to the parquet file of `dataset` instead.
+    """
+    if engine == "sql":
+        return prepare_query(pandas_code, dataset, dataset_folder_path, is_sample=is_sample)
+    return SNIPPET_CACHE.prepare(pandas_code, dataset_folder_path, is_sample=is_sample, column_catalog=column_catalog)
+
+
+def run_static_check(code, column_catalog=None):
+    """Run check_code on cleaned code inside a 'static_check' span; returns its error or None."""
+    with TRACER.span("static_check") as span:
+        static_output = check_code(code, column_catalog)
+        span["failed"] = static_output is not None
+    return static_output
+
+
+def run_traced(executor, code, sample=False, **attributes):
+    """Run code through `executor` inside an 'exec' (or 'sample_exec') span, with its peak memory when lazy."""
+    with TRACER.span("sample_exec" if sample else "exec", **attributes) as span:
+        reset_peak_memory()
+        exec_output = executor(code)
+        span["failed"] = isinstance(exec_output, str) and 'Error' in exec_output
+        if last_peak_memory() is not None:
+            span["peak_memory"] = last_peak_memory()
+    return exec_output
+
+
+# Temperatures of speculative candidates, cycled when more candidates are requested
+CANDIDATE_TEMPERATURES = (0.0, 0.4, 0.7, 1.0)
+
+
+def _round_floats(value, digits=6):
+    """Round floats to `digits` significant digits so float noise does not split votes."""
+    if isinstance(value, float):
+        return float(f"{value:.{digits}g}")
+    if isinstance(value, list):
+        return [_round_floats(item, digits) for item in value]
+    if isinstance(value, dict):
+        return {key: _round_floats(item, digits) for key, item in value.items()}
+    return value
+
+
+def answer_key(exec_output):
+    """Canonical form of an execution output, used to compare candidate answers."""
+    return json.dumps(_round_floats(convert_types(exec_output)), sort_keys=True, ensure_ascii=False, default=str)
+
+
+def run_candidates(question_data, dataset_info, dataset_folder_path, candidates=3, executor=capture_exec_output,
+                   column_catalog=None, sample_first=False, require_majority=False, first_candidate=0,
+                   wait_all=False, static_check=False, engines=("pandas",), sql_executor=run_sql):
+    """
+    Generate `candidates` solutions concurrently and execute each one as soon as it arrives.
+
+    Candidate k targets engines[k] (cycled) and is requested at the temperature
+    CANDIDATE_TEMPERATURES[k // len(engines)] (cycled), with its own completion cache
+    key, so with several engines the first candidate of each is greedy and they race. The round stops at the first successful candidate, or with
+    `require_majority` as soon as more than half of the candidates agree on an answer;
+    when no majority forms, the most common successful answer wins. Candidates that have
+    not finished by then are abandoned: those still waiting are never executed, SQL
+    queries are interrupted, and sandbox snippets finish in the background without
+    holding their thread (in-process pandas executions cannot be interrupted and run
+    to completion). With `wait_all` every
+    candidate runs to completion and the most common answer wins.
+
+    Args:
+        question_data (dict): The question, with 'question' and 'dataset'.
+        dataset_info (str): Schema summary of the dataset.
+        dataset_folder_path (str): Folder containing all_datasets/ and sample_datasets/.
+        candidates (int): Number of candidates requested in parallel.
+        executor (callable): Runs a code string and returns its output like capture_exec_output.
+        column_catalog (dict, optional): Column catalog used to prune the parquet reads.
+        sample_first (bool): Validate each candidate on the sample datasets first.
+        require_majority (bool): Wait for a majority answer instead of the first success.
+        first_candidate (int): Index of the first candidate, to continue a previous round.
+        wait_all (bool): Run every candidate instead of stopping early.
+        static_check (bool): Reject pandas candidates that check_code finds errors in without executing them.
+        engines (tuple): Engines of the candidates, "pandas" and/or "sql".
+        sql_executor (callable): Runs a query from prepare_query like run_sql.
+
+    Returns:
+        tuple: (winner, attempts), where `attempts` lists a dict per finished candidate in
+        arrival order (keys 'candidate', 'engine', 'temperature', 'pandas_code', 'modified_code',
+        'stage', 'exec_output', 'error') and `winner` is the selected one or None.
+    """
+    abandoned = threading.Event()
+
+    def attempt(k):
+        # Sandbox and SQL executions of this candidate stop once the round is decided
+        cancel_on(abandoned)
+        engine = engines[k % len(engines)]
+        temperature = CANDIDATE_TEMPERATURES[k // len(engines) % len(CANDIDATE_TEMPERATURES)]
+        run = sql_executor if engine == "sql" else executor
+        result = {"candidate": k, "engine": engine, "temperature": temperature, "pandas_code": "",
+                  "modified_code": "", "stage": "generation", "exec_output": None, "error": None}
+        try:
+            pandas_code = get_pandas_code(question_data['dataset'], question_data['question'], dataset_info,
+                                          temperature=temperature, candidate=k, engine=engine)
+        except Exception as e:
+            result.update(error=f"Error :{type(e).__name__}: {e}", traceback=traceback.format_exc())
+            return result
+        result.update(pandas_code=pandas_code, stage="full",
+                      modified_code=prepare_code(pandas_code, dataset_folder_path, column_catalog=column_catalog,
+                                                 engine=engine, dataset=question_data['dataset']))
+        if abandoned.is_set():
+            return None
+        if static_check and engine == "pandas":
+            static_output = run_static_check(clean_pandas_code(pandas_code), column_catalog)
+            if static_output is not None:
+                result.update(stage="static", exec_output=static_output, error=static_output)
+                return result
+        if sample_first:
+            sample_code = prepare_code(pandas_code, dataset_folder_path, is_sample=True, column_catalog=column_catalog,
+                                       engine=engine, dataset=question_data['dataset'])
+            sample_output = run_traced(run, sample_code, sample=True, candidate=k)
+            if abandoned.is_set():
+                return None
+            if is_conclusive_sample_error(sample_output, sample_code,
+                                          (column_catalog or {}).get(question_data['dataset'])):
+                result.update(stage="sample", exec_output=sample_output, error=sample_output)
+                return result
+        exec_output = run_traced(run, result["modified_code"], candidate=k)
+        if abandoned.is_set():
+            return None
+        result["exec_output"] = exec_output
+        result["peak_memory"] = last_peak_memory()
+        if isinstance(exec_output, str) and 'Error' in exec_output:
+            result["error"] = exec_output
+        return result
+
+    pool = ThreadPoolExecutor(max_workers=candidates)
+    # Each candidate thread inherits the caller's trace context
+    pending = {pool.submit(contextvars.copy_context().run, attempt, k)
+               for k in range(first_candidate, first_candidate + candidates)}
+    attempts, votes, winner = [], {}, None
+    try:
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                attempts.append(result)
+                if result["error"] is not None:
+                    continue
+                key = answer_key(result["exec_output"])
+                votes.setdefault(key, []).append(result)
+                if not wait_all and (not require_majority or len(votes[key]) > candidates // 2):
+                    winner = votes[key][0]
+                    break
+        if winner is None and votes:
+            # No majority: the most common answer, earliest arrival on ties
+            winner = max(votes.values(), key=len)[0]
+    finally:
+        abandoned.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    return winner, attempts
+
+
+def candidate_error_entry(result):
+    """Error history entry for a failed candidate from run_candidates."""
+    return {
+        "iteration": 0,
+        "stage": result["stage"],
+        "candidate": result["candidate"],
+        "engine": result["engine"],
+        "error_type": classify_error(Exception(result["error"])),
+        "exception": error_type_name(result["error"]) or "Exception",
+        "message": result["error"],
+        "traceback": result.get("traceback", ""),
+        "code": result["modified_code"]
+    }
+
+
+def record_unexpected_failure(question_data, exc):
+    """Mark a question as failed by an unexpected exception, recording it in its error history."""
+    question_data["status"] = "failed"
+    # include whatever pandas_code was last set (if any)
+    last_code = question_data.get('pandas_code', '')
+    question_data.setdefault("error_history", []).append({
+        "iteration": None,
+        "error_type": classify_error(exc),
+        "exception": type(exc).__name__,
+        "message": str(exc),
+        "traceback": traceback.format_exc(),
+        "code": last_code
+    })
+    question_data['pandas_code'] = str(exc)
+    question_data['final_answer'] = "Error :" + str(exc)
+    return question_data
+
+
+def process_question(question_data, schemas, dataset_folder_path, max_retries=1, executor=capture_exec_output,
+                     column_catalog=None, sample_first=False, candidates=1, require_majority=False,
+                     static_check=False, engine="pandas", sql_executor=run_sql, failed_candidates=None):
+    """
+    Process a single question to generate pandas code with error checking and retrying.
+
+    `executor` runs a code string and returns its output with the contract of
+    capture_exec_output, e.g. `SandboxPool.run` to execute out of process.
+    With a `column_catalog` from preprocessing, parquet reads are rewritten to load
+    only the columns the code uses.
+
+    With `sample_first`, each candidate is run on the stratified sample datasets
+    before the full ones. Errors that the sample run reproduces exactly (syntax, names,
+    missing columns, dtypes) go straight back to the LLM; code only reaches the full
+    datasets once it passes on the samples or fails for a reason that may depend on
+    the rows present.
+
+    With `static_check`, each candidate is first analysed without running it (see
+    check_code): syntax errors, undefined names, columns missing from the catalog and
+    operations a column's dtype does not support go back to the LLM without loading
+    any data.
+
+    With `candidates` > 1 the first attempt is speculative: that many solutions are
+    generated and executed in parallel (see run_candidates). If none succeeds, their
+    errors seed the usual serial repair loop, which then has `max_retries` - 1 retries left.
+    Callers that already ran candidates, such as consensus_question, pass the failed
+    ones as `failed_candidates` to seed the repair loop the same way.
+
+    `engine` selects what the LLM writes: "pandas" code run by `executor`, "sql"
+    queries run by `sql_executor` (DuckDB over the parquet files), or "race", which
+    starts with at least one speculative candidate per engine and repairs with pandas
+    if they all fail. An 'engine' key in `question_data` overrides it per question,
+    and the engine of the answer is stored there.
+    """
     # initialize per-question error history
     question_data.setdefault("error_history", [])
 
@@ -20,28 +269,97 @@ def process_question(question_data, schemas, dataset_folder_path, max_retries=1)
         TABLE_NAME = DATASET
 
         dataset_info = schemas[TABLE_NAME]
+        engines = engines_for(question_data.get('engine', engine))
+        # Serial repairs use a single engine
+        engine = engines[0]
+        run = sql_executor if engine == "sql" else executor
         error_code = None
-        pandas_code = get_pandas_code(DATASET, MAIN_QUESTION, dataset_info)
+        retries = 0
+        exec_output = ""
+
+        attempts = failed_candidates
+        if attempts is None and (candidates > 1 or len(engines) > 1):
+            candidates = max(candidates, len(engines))
+            winner, attempts = run_candidates(question_data, dataset_info, dataset_folder_path, candidates,
+                                              executor=executor, column_catalog=column_catalog,
+                                              sample_first=sample_first, require_majority=require_majority,
+                                              static_check=static_check, engines=engines,
+                                              sql_executor=sql_executor)
+            question_data["speculation"] = {
+                "candidates": candidates,
+                "finished": len(attempts),
+                "selected": winner["candidate"] if winner else None,
+            }
+            if winner is not None:
+                winning_answer = answer_key(winner["exec_output"])
+                question_data["speculation"]["agreeing"] = sum(
+                    a["error"] is None and answer_key(a["exec_output"]) == winning_answer for a in attempts
+                )
+                question_data["status"] = "success"
+                question_data['engine'] = winner["engine"]
+                if winner.get("peak_memory") is not None:
+                    question_data['peak_memory'] = winner["peak_memory"]
+                question_data['pandas_code'] = winner["pandas_code"]
+                question_data['final_answer'] = convert_types(winner["exec_output"])
+                return question_data
+
+        if attempts is not None:
+            for result in attempts:
+                question_data["error_history"].append(candidate_error_entry(result))
+                # Only attempts in the repair engine's language go into its prompt
+                if result["pandas_code"] and result["engine"] == engine:
+                    previous_attempts.append((clean_code(result["pandas_code"], engine), result["error"]))
+            exec_output = attempts[-1]["error"] if attempts else ""
+            if not previous_attempts or max_retries == 0:
+                question_data["status"] = "failed"
+                question_data['engine'] = engine
+                question_data['pandas_code'] = attempts[-1]["pandas_code"] if attempts else ""
+                question_data['final_answer'] = convert_types(exec_output)
+                return question_data
+            error_arg = previous_attempts[0] if len(previous_attempts) == 1 else previous_attempts[:]
+            pandas_code = get_pandas_code(DATASET, MAIN_QUESTION, dataset_info, error_code=error_arg, engine=engine)
+            retries = 1
+        else:
+            pandas_code = get_pandas_code(DATASET, MAIN_QUESTION, dataset_info, engine=engine)
 
         # Save original code before path modification
-        original_code = clean_pandas_code(pandas_code)
+        original_code = clean_code(pandas_code, engine)
         
         # Test the code on full dataset
-        modified_code = modify_parquet_paths(pandas_code, dataset_folder_path=dataset_folder_path, is_sample=False)
-        modified_code = clean_pandas_code(modified_code)
-        retries = 0
-
-        exec_output = ""
+        modified_code = prepare_code(pandas_code, dataset_folder_path, column_catalog=column_catalog, engine=engine,
+                                     dataset=DATASET)
 
         while retries <= max_retries:
             try:
+                if static_check and engine == "pandas":
+                    # Errors found without executing anything skip the data load entirely
+                    stage = "static"
+                    static_output = run_static_check(original_code, column_catalog)
+                    if static_output is not None:
+                        exec_output = static_output
+                        raise Exception(static_output)
+
+                stage = "full"
+                if sample_first:
+                    # Cheap validation on the samples; only reliable failures stop here
+                    stage = "sample"
+                    sample_code = prepare_code(pandas_code, dataset_folder_path, is_sample=True,
+                                               column_catalog=column_catalog, engine=engine, dataset=DATASET)
+                    sample_output = run_traced(run, sample_code, sample=True, iteration=retries)
+                    if is_conclusive_sample_error(sample_output, sample_code, (column_catalog or {}).get(DATASET)):
+                        exec_output = sample_output
+                        raise Exception(sample_output)
+                    stage = "full"
+
                 # Try executing the code
-                exec_output = capture_exec_output(clean_pandas_code(modified_code))
+                exec_output = run_traced(run, modified_code, iteration=retries)
                 if isinstance(exec_output, str) and 'Error' in exec_output:
                     raise Exception(exec_output)
 
                 # successful execution
                 question_data["status"] = "success"
+                if last_peak_memory() is not None:
+                    question_data['peak_memory'] = last_peak_memory()
                 break  # If successful, break the loop
 
             except Exception as exec_error:
@@ -52,6 +370,7 @@ def process_question(question_data, schemas, dataset_folder_path, max_retries=1)
                 # append to this question's history, including the code that caused the error
                 question_data["error_history"].append({
                     "iteration": retries,
+                    "stage": stage,
                     "error_type": category,
                     "exception": type(exec_error).__name__,
                     "message": str(exec_error),
@@ -77,41 +396,27 @@ def process_question(question_data, schemas, dataset_folder_path, max_retries=1)
                     DATASET,
                     MAIN_QUESTION,
                     dataset_info,
-                    error_code=error_arg
+                    error_code=error_arg,
+                    engine=engine
                 )
                 
                 # Update original code with the new code from LLM
-                original_code = clean_pandas_code(pandas_code)
+                original_code = clean_code(pandas_code, engine)
                 
-                modified_code = modify_parquet_paths(
-                    pandas_code,
-                    dataset_folder_path=dataset_folder_path,
-                    is_sample=False
-                )
-                modified_code = clean_pandas_code(modified_code)
+                modified_code = prepare_code(pandas_code, dataset_folder_path, column_catalog=column_catalog,
+                                             engine=engine, dataset=DATASET)
                 retries += 1
 
         # if we never succeeded, mark as failed
         if question_data.get("status") != "success":
             question_data["status"] = "failed"
 
+        question_data['engine'] = engine
         question_data['pandas_code'] = pandas_code
+        # Keep the validation run's output so the pipeline does not need to execute again
+        question_data['final_answer'] = convert_types(exec_output)
         return question_data
 
     except Exception as e:
         # catch any unexpected top-level error
-        question_data["status"] = "failed"
-        category = classify_error(e)
-        tb = traceback.format_exc()
-        # include whatever pandas_code was last set (if any)
-        last_code = question_data.get('pandas_code', '')
-        question_data["error_history"].append({
-            "iteration": None,
-            "error_type": category,
-            "exception": type(e).__name__,
-            "message": str(e),
-            "traceback": tb,
-            "code": last_code
-        })
-        question_data['pandas_code'] = str(e)
-        return question_data 
\ No newline at end of file
+        return record_unexpected_failure(question_data, e) 
\ No newline at end of file
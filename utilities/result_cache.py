@@ -0,0 +1,262 @@
+import os
+import ast
+import time
+import pickle
+import sqlite3
+import hashlib
+import pathlib
+import threading
+
+from .static_analysis import EXECUTION_GLOBALS
+
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2  # 256 MiB of stored results
+DEFAULT_MAX_RESULT_BYTES = 1024 ** 2  # larger results are not stored
+
+# Calls whose output changes between runs of the same code on the same data
+NONDETERMINISTIC_NAMES = {
+    'random', 'sample', 'shuffle', 'permutation', 'choice', 'rand', 'randn', 'randint', 'default_rng',
+    'now', 'today', 'time', 'perf_counter', 'uuid4', 'getenv', 'environ', 'listdir', 'glob',
+}
+
+# Calls that evaluate strings as code or look names up at run time: names referenced there are not renamed
+DYNAMIC_NAME_CALLS = {'query', 'eval', 'exec', 'compile', 'locals', 'globals', 'vars'}
+
+
+def _call_name(call):
+    func = call.func
+    return func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+
+
+def _is_self_documenting(joined):
+    """Whether an f-string prints an expression's source, as in f"{x=}"."""
+    return any(isinstance(part, ast.Constant) and isinstance(part.value, str) and part.value.rstrip().endswith('=')
+               and isinstance(following, ast.FormattedValue)
+               for part, following in zip(joined.values, joined.values[1:]))
+
+
+def _is_file_read(call):
+    """Whether a call reads a file: `open(...)` or any `read_*` function such as pd.read_parquet."""
+    name = _call_name(call)
+    return name is not None and (name == 'open' or name.startswith('read_'))
+
+
+class _CanonicalNames(ast.NodeTransformer):
+    """Renames the variables, arguments and functions a snippet binds to _v0, _v1, ... in order of appearance."""
+
+    def __init__(self, bound):
+        self.bound = bound
+        self.names = {}
+
+    def canonical(self, name):
+        if name not in self.bound:
+            return name
+        return self.names.setdefault(name, f"_v{len(self.names)}")
+
+    def visit_Name(self, node):
+        node.id = self.canonical(node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self.canonical(node.arg)
+        return self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        node.name = self.canonical(node.name)
+        return self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+
+def normalize_code(code):
+    """
+    Return a canonical form of a snippet and the files it reads, or None if it cannot be cached.
+
+    The canonical form is the AST dump with bound variable names replaced, so snippets
+    differing only in whitespace, comments or variable names share it. Snippets that
+    do not parse, read files through non-constant paths, or call anything random or
+    time-dependent are not cacheable. Neither are snippets that reference names inside
+    strings (`df.query('a > @t')`, `eval(...)`, `f"{x=}"`), since renaming would make
+    a snippet that fails share its form with one that works.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    bound, paths = set(), []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if not isinstance(node.ctx, ast.Load):
+                bound.add(node.id)
+            if node.id in NONDETERMINISTIC_NAMES:
+                return None
+        elif isinstance(node, ast.Attribute) and node.attr in NONDETERMINISTIC_NAMES:
+            return None
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.Call) and _call_name(node) in DYNAMIC_NAME_CALLS:
+            return None
+        elif isinstance(node, ast.JoinedStr) and _is_self_documenting(node):
+            return None
+        elif isinstance(node, ast.Call) and _is_file_read(node):
+            path = node.args[0] if node.args else None
+            if not (isinstance(path, ast.Constant) and isinstance(path.value, str)):
+                return None
+            paths.append(path.value)
+
+    # Names the execution provides keep their meaning when a snippet also assigns them
+    canonical = ast.dump(_CanonicalNames(bound - EXECUTION_GLOBALS).visit(tree))
+    return canonical, sorted(set(paths))
+
+
+def dataset_fingerprint(paths):
+    """(absolute path, mtime_ns, size) of every file read, or None if one does not exist."""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        fingerprint.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+    return fingerprint
+
+
+class ResultCache:
+    """
+    Persistent cache of execution results stored in SQLite.
+
+    Results are keyed by a hash of the normalized snippet (see normalize_code) and the
+    fingerprint (path, modification time, size) of every file it reads, so code that
+    only differs in formatting or variable names is executed once, and rewriting a
+    dataset, e.g. by preprocessing, invalidates every result computed from it. Only
+    successful results of at most `max_result_bytes` pickled are stored; once the total
+    exceeds `max_bytes` the least recently used entries are evicted.
+
+    `mode` describes how snippets are executed (e.g. lazy or Arrow-backed frames) and
+    is part of every key, so results of one execution mode are never served to another.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, max_result_bytes=DEFAULT_MAX_RESULT_BYTES, mode=None):
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_result_bytes = max_result_bytes
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, result BLOB, size INTEGER, created REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def key(self, code):
+        """Hash of the normalized code, the datasets it reads and the mode, or None if its result cannot be cached."""
+        normalized = normalize_code(code)
+        if normalized is None:
+            return None
+        canonical, paths = normalized
+        fingerprint = dataset_fingerprint(paths)
+        if fingerprint is None:
+            return None
+        payload = canonical + "\0" + repr(fingerprint) + "\0" + repr(self.mode)
+        return hashlib.sha256(payload.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def get(self, key):
+        """Return (True, result) for a stored result, else (False, None)."""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return True, pickle.loads(row[0])
+
+    def put(self, key, result):
+        """Store a successful result and evict old entries if the cache is over its size bound."""
+        if isinstance(result, str) and 'Error' in result:
+            return
+        try:
+            blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if len(blob) > self.max_result_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            self.writes += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM results ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    def wrap(self, executor):
+        """Return an executor with the contract of `executor` that serves known results from the cache."""
+
+        def cached_executor(code, **kwargs):
+            key = self.key(code)
+            if key is None:
+                with self._lock:
+                    self.uncacheable += 1
+                return executor(code, **kwargs)
+            found, result = self.get(key)
+            if found:
+                return result
+            result = executor(code, **kwargs)
+            self.put(key, result)
+            return result
+
+        return cached_executor
+
+    def stats(self):
+        """Return hit/miss counters and the stored size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncacheable": self.uncacheable,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self._total_bytes,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"Result cache ({os.path.basename(self.path)}): {s['hits']} hits, {s['misses']} misses "
+                f"({s['hit_rate']:.1%} hit rate), {s['uncacheable']} uncacheable, {s['writes']} writes, "
+                f"{s['evictions']} evictions, {s['bytes'] / 1024 ** 2:.1f} MiB stored")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
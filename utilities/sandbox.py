@@ -0,0 +1,255 @@
+import time
+import signal
+import threading
+import multiprocessing
+
+try:
+    import resource
+except ImportError:  # RLIMIT_AS is only available on Unix
+    resource = None
+
+import pandas as pd
+
+from .cancellation import CANCELLED_ERROR, POLL_INTERVAL, cancelled
+from .code_execution import capture_exec_output, convert_types, OOM_ERROR
+from .dataset_cache import DATASET_CACHE
+from .lazy_frame import last_peak_memory, record_peak_memory, reset_peak_memory
+
+DEFAULT_TIMEOUT = 60  # seconds of wall-clock time per snippet
+
+TIMEOUT_ERROR = "Error :TimeoutError: execution timed out after {:g}s and was killed"
+CRASH_ERROR = "Error :WorkerCrash: execution process exited with code {}"
+
+
+def _worker_main(conn, memory_limit, preload_paths, dataset_cache_bytes, prefer_arrow, copy_on_write, lazy=False):
+    """Entry point of a sandbox process: preload datasets, then execute snippets until told to stop."""
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    if dataset_cache_bytes is not None:
+        DATASET_CACHE.max_bytes = dataset_cache_bytes
+    DATASET_CACHE.prefer_arrow = prefer_arrow
+    if copy_on_write:
+        pd.set_option("mode.copy_on_write", True)
+
+    for path in preload_paths:
+        try:
+            DATASET_CACHE.get(path)
+        except Exception:
+            pass  # The snippet that needs it will report the error
+    conn.send("ready")
+
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            break
+        if code is None:
+            break
+        if isinstance(code, tuple):
+            # ("evict", paths): release datasets that are no longer needed; no reply
+            for path in code[1]:
+                DATASET_CACHE.evict(path)
+            continue
+
+        reset_peak_memory()
+        result = capture_exec_output(code, lazy=lazy)
+        peak_memory = last_peak_memory()
+        # After a MemoryError the interpreter state is suspect, so the process is recycled
+        recycle = result == OOM_ERROR
+        try:
+            conn.send((convert_types(result), recycle, peak_memory))
+        except Exception:
+            conn.send((str(result), recycle, peak_memory))  # Result could not be pickled
+        if recycle:
+            break
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.affinity = None
+        self.pending_evictions = []
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pool of long-lived worker processes that execute generated code out of process.
+
+    Every worker preloads the given datasets into its dataset cache and runs one snippet
+    at a time under a wall-clock `timeout` (seconds) and an optional RLIMIT_AS
+    `memory_limit` (bytes). A worker that times out, runs out of memory or crashes is
+    killed and replaced, and the snippet is reported as a TimeoutError / MemoryError.
+
+    `run` has the same contract as `capture_exec_output` and can be called from many
+    threads at once; calls block until a worker is free.
+
+    With `prefer_arrow` workers memory-map the datasets' Arrow IPC copies, so they
+    share the same page-cache pages instead of each holding a decoded table.
+
+    Calls may pass an `affinity` key (such as the dataset name): an idle worker that
+    last ran the same key is preferred, so its cached table is reused, and otherwise
+    the longest-idle worker takes over the key. `evict` releases datasets in all
+    workers once they are no longer needed.
+
+    With `lazy`, workers execute snippets in lazy mode (see capture_exec_output) and
+    report each snippet's peak memory to the calling thread (see last_peak_memory).
+
+    When the calling context is cancelled (see cancellation.cancel_on) while its snippet
+    runs, `run` returns CANCELLED_ERROR right away, so abandoned candidates do not keep
+    their thread waiting. The snippet finishes in the background (or is killed at its
+    timeout) and its worker then returns to the pool without being respawned.
+    """
+
+    def __init__(self, processes=4, timeout=DEFAULT_TIMEOUT, memory_limit=None, preload_paths=(),
+                 dataset_cache_bytes=None, prefer_arrow=False, copy_on_write=False, lazy=False):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.preload_paths = list(preload_paths)
+        self.dataset_cache_bytes = dataset_cache_bytes
+        self.prefer_arrow = prefer_arrow
+        self.copy_on_write = copy_on_write
+        self.lazy = lazy
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = []
+        self._idle = []  # Longest idle first
+        self._condition = threading.Condition()
+        for _ in range(processes):
+            worker = self._spawn()
+            self._workers.append(worker)
+            self._idle.append(worker)
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.memory_limit, self.preload_paths, self.dataset_cache_bytes,
+                  self.prefer_arrow, self.copy_on_write, self.lazy),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _release(self, worker, recycle):
+        """Return a worker to the pool, first replacing it by a fresh process if it must be recycled."""
+        if recycle:
+            # Spawning takes a while; other threads keep checking workers in and out meanwhile
+            worker.kill()
+            replacement = self._spawn()
+            replacement.affinity = worker.affinity
+            with self._condition:
+                if worker not in self._workers:  # The pool was closed meanwhile
+                    replacement.kill()
+                    return
+                self._workers[self._workers.index(worker)] = replacement
+            worker = replacement
+        self._checkin(worker)
+
+    def _drain(self, worker, deadline):
+        """Let the snippet of a cancelled call finish, until its deadline, then release its worker."""
+        recycle = True
+        try:
+            if worker.conn.poll(max(deadline - time.monotonic(), 0)):
+                _, recycle, _ = worker.conn.recv()
+        except (EOFError, OSError):
+            pass
+        self._release(worker, recycle)
+
+    def _checkout(self, affinity):
+        with self._condition:
+            self._condition.wait_for(lambda: self._idle)
+            for i, worker in enumerate(self._idle):
+                if affinity is not None and worker.affinity == affinity:
+                    return self._idle.pop(i)
+            worker = self._idle.pop(0)
+            worker.affinity = affinity
+            return worker
+
+    def _checkin(self, worker):
+        with self._condition:
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def _wait(self, worker, deadline):
+        """Wait for the worker's reply; False once the deadline passes or the calling context is cancelled."""
+        while not cancelled():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if worker.conn.poll(min(remaining, POLL_INTERVAL)):
+                return True
+        return False
+
+    def run(self, code, affinity=None):
+        """Execute code in a sandbox process and return its output like capture_exec_output."""
+        worker = self._checkout(affinity)
+        recycle = True
+        try:
+            if not worker.ready:
+                # Wait for the preload to finish so it does not count against the timeout
+                worker.conn.recv()
+                worker.ready = True
+            with self._condition:
+                # Taken under the lock so evictions recorded by evict() meanwhile are not lost
+                evictions, worker.pending_evictions = worker.pending_evictions, []
+            if evictions:
+                worker.conn.send(("evict", evictions))
+            worker.conn.send(code)
+            deadline = time.monotonic() + self.timeout
+            if self._wait(worker, deadline):
+                result, recycle, peak_memory = worker.conn.recv()
+                record_peak_memory(peak_memory)
+            elif cancelled():
+                # The worker is released once the snippet finishes, instead of being killed and respawned
+                threading.Thread(target=self._drain, args=(worker, deadline), daemon=True).start()
+                worker = None
+                result = CANCELLED_ERROR
+            else:
+                result = TIMEOUT_ERROR.format(self.timeout)
+        except (EOFError, OSError):
+            worker.process.join(timeout=5)
+            exitcode = worker.process.exitcode
+            # SIGKILL without a timeout almost always comes from the kernel OOM killer
+            result = OOM_ERROR if exitcode == -signal.SIGKILL else CRASH_ERROR.format(exitcode)
+        finally:
+            if worker is not None:
+                self._release(worker, recycle)
+        return result
+
+    def evict(self, paths):
+        """Drop datasets from the cache of every worker; busy workers drop them before their next snippet."""
+        paths = list(paths)
+        with self._condition:
+            idle = set(map(id, self._idle))
+            for worker in self._workers:
+                if id(worker) in idle:
+                    try:
+                        worker.conn.send(("evict", paths))
+                    except (OSError, ValueError):
+                        pass  # Dead workers are replaced on their next run
+                else:
+                    worker.pending_evictions.extend(paths)
+
+    def close(self):
+        """Stop all worker processes."""
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            worker.kill()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
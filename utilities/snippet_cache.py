@@ -0,0 +1,164 @@
+import ast
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .code_processing import clean_pandas_code, modify_parquet_paths, prune_parquet_reads
+from .tracing import TRACER
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def _source_key(code):
+    return hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _resolve_imports(tree):
+    """
+    Resolve the modules and objects imported anywhere in `tree`.
+
+    Returns a dictionary of imported names and their values, or an empty dictionary if
+    any import fails (the execution then raises the error itself).
+    """
+    try:
+        imports = {}
+        for node in ast.walk(tree):
+            # Handle `import` statements
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    imports[alias.asname or alias.name] = __import__(alias.name)
+
+            # Handle `from ... import ...` statements
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                for alias in node.names:
+                    module = __import__(node.module, fromlist=[alias.name])
+                    imports[alias.asname or alias.name] = module.__dict__[alias.name]
+        return imports
+    except Exception:
+        return {}
+
+
+class Snippet:
+    """
+    Executable form of one code string: its AST, resolved imports and code object.
+
+    Source that does not compile keeps the SyntaxError (or ValueError) in `error`,
+    with the same message `exec` would raise, and has no tree or code object.
+    """
+
+    __slots__ = ("code", "tree", "imports", "code_object", "error")
+
+    def __init__(self, code):
+        self.code = code
+        self.tree = self.code_object = self.error = None
+        self.imports = {}
+        try:
+            self.tree = compile(code, "<string>", "exec", ast.PyCF_ONLY_AST)
+            self.code_object = compile(self.tree, "<string>", "exec")
+        except (SyntaxError, ValueError) as e:
+            self.error = e.with_traceback(None)
+            return
+        self.imports = _resolve_imports(self.tree)
+
+    def compile_error(self):
+        """
+        A fresh copy of `error` to raise; raising the cached instance itself would grow
+        its traceback by a frame per execution and keep each one's locals alive.
+        """
+        return copy.copy(self.error)
+
+
+class SnippetCache:
+    """
+    Process-wide memo of the front-end work done on generated code.
+
+    `prepare` maps raw LLM output to the cleaned, path-rewritten and pruned source that
+    is executed, and `get` maps that source to a compiled Snippet. Both are keyed by a
+    hash of the source, so retries, re-executions and candidates that produce the same
+    code skip cleaning, rewriting, parsing, import resolution and compilation. The
+    least recently used entries are dropped beyond `max_entries` per table.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._prepared = OrderedDict()  # (source hash, folder, is_sample, id(catalog)) -> (catalog, code)
+        self._snippets = OrderedDict()  # source hash -> Snippet
+        self._lock = threading.Lock()
+
+    def _lookup(self, table, key):
+        with self._lock:
+            entry = table.get(key)
+            if entry is not None:
+                table.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def _store(self, table, key, entry):
+        with self._lock:
+            table[key] = entry
+            while len(table) > self.max_entries:
+                table.popitem(last=False)
+
+    def prepare(self, raw_code, dataset_folder_path, is_sample=False, column_catalog=None):
+        """
+        Clean generated code and point its parquet reads at the full or sample datasets.
+
+        With a `column_catalog`, the reads are also pruned to the columns the
+        code uses. The catalog is matched by identity, as it is loaded once per run.
+        """
+        key = (_source_key(raw_code), dataset_folder_path, is_sample, id(column_catalog))
+        entry = self._lookup(self._prepared, key)
+        if entry is not None and entry[0] is column_catalog:
+            return entry[1]
+
+        with TRACER.span("clean"):
+            cleaned_code = clean_pandas_code(raw_code)
+        with TRACER.span("rewrite", sample=is_sample):
+            code = modify_parquet_paths(cleaned_code, dataset_folder_path=dataset_folder_path, is_sample=is_sample)
+            if column_catalog:
+                code = prune_parquet_reads(code, column_catalog)
+        # The entry keeps the catalog alive so its id cannot be reused by another one
+        self._store(self._prepared, key, (column_catalog, code))
+        return code
+
+    def get(self, code):
+        """Return the compiled Snippet for a source string, compiling it on a miss."""
+        key = _source_key(code)
+        snippet = self._lookup(self._snippets, key)
+        if snippet is None:
+            snippet = Snippet(code)
+            self._store(self._snippets, key, snippet)
+        return snippet
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._prepared.clear()
+            self._snippets.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and the number of cached entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "prepared": len(self._prepared),
+                "compiled": len(self._snippets),
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"Snippet cache: {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.1%} hit rate), "
+                f"{s['prepared']} prepared / {s['compiled']} compiled snippets")
+
+
+# Shared cache used by prepare_code and capture_exec_output
+SNIPPET_CACHE = SnippetCache()
@@ -0,0 +1,165 @@
+import os
+import re
+import datetime
+import decimal
+import time
+import threading
+
+from .cancellation import CANCELLED_ERROR, POLL_INTERVAL, cancel_event, cancelled
+
+try:
+    import duckdb
+except ImportError:  # Only needed for the SQL engine
+    duckdb = None
+
+OOM_ERROR = "Error :MemoryError: query ran out of memory"
+TIMEOUT_ERROR = "Error :TimeoutError: query timed out after {:g}s and was interrupted"
+MISSING_DUCKDB_ERROR = "Error :ModuleNotFoundError: the SQL engine requires duckdb (pip install duckdb)"
+
+# The parquet file read by the view of a prepare_query statement
+VIEW_PATH = re.compile(r"read_parquet\('((?:[^']|'')*)'\)")
+
+
+def clean_sql_code(raw_code):
+    """
+    Extract a SQL query from a raw LLM answer.
+
+    Args:
+        raw_code (str): The raw string containing SQL with possible markdown formatting.
+
+    Returns:
+        str: The query without code fences and trailing semicolons.
+    """
+    raw_code = raw_code.strip()
+    if '```sql' in raw_code:
+        cleaned_code = raw_code.split('```sql', 1)[1].split('```', 1)[0]
+    elif raw_code.startswith('```'):
+        # Fence with another or no language tag
+        cleaned_code = raw_code[3:].split('\n', 1)[-1].split('```', 1)[0]
+    else:
+        cleaned_code = raw_code.split('```', 1)[0]
+    return cleaned_code.strip().rstrip(';').strip()
+
+
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+def prepare_query(raw_code, dataset, dataset_folder_path="../datasets/", is_sample=False):
+    """
+    Clean a generated query and bind its table to the full or sample parquet file.
+
+    The result is self-contained: a statement creating a view named after the dataset
+    over the parquet file, then the query. DuckDB scans the file directly, reading only
+    the columns and row groups the query needs.
+    """
+    dataset_folder_path += "sample_datasets/" if is_sample else "all_datasets/"
+    path = f"{dataset_folder_path}{dataset}.parquet"
+    view = f"CREATE TEMP VIEW {_quote_identifier(dataset)} AS SELECT * FROM read_parquet({_quote_literal(path)});\n"
+    return view + clean_sql_code(raw_code)
+
+
+def _native(value):
+    """Python value of a result cell in the answer formats of the pandas engine."""
+    if isinstance(value, list):
+        return [_native(item) for item in value]
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time, datetime.timedelta)):
+        return str(value)
+    return value
+
+
+def _is_list_type(type_code):
+    """Whether a result column type from the cursor description is a list ('INTEGER[]', or 'list' before duckdb 1.3)."""
+    type_name = str(type_code)
+    return type_name == "list" or type_name.endswith("]")
+
+
+def _answer(rows, list_columns=()):
+    """
+    A single value for a 1x1 result, a list for one row or column, else a list of rows.
+
+    List answers come as a single list value (see SQL_INSTRUCTIONS), so a one-element
+    list is not mistaken for a scalar; `list_columns` flags the columns of list type,
+    whose NULLs (list() of no rows) are empty lists.
+    """
+    if any(list_columns):
+        rows = [tuple([] if value is None and is_list else value for value, is_list in zip(row, list_columns))
+                for row in rows]
+    if not rows:
+        return []
+    if len(rows[0]) == 1:
+        values = [_native(row[0]) for row in rows]
+        return values[0] if len(values) == 1 else values
+    if len(rows) == 1:
+        return [_native(value) for value in rows[0]]
+    return [[_native(value) for value in row] for row in rows]
+
+
+def _interrupt_when_stopped(con, finished, timeout, cancel):
+    """Interrupt the connection's query after `timeout` seconds or once `cancel` is set, unless it finished first."""
+    if cancel is None:
+        if not finished.wait(timeout):
+            con.interrupt()
+        return
+    deadline = time.monotonic() + timeout if timeout else None
+    while not finished.wait(POLL_INTERVAL):
+        if cancel.is_set() or (deadline is not None and time.monotonic() >= deadline):
+            con.interrupt()
+            return
+
+
+def run_sql(code, timeout=None, memory_limit=None, threads=None):
+    """
+    Run a query from prepare_query with DuckDB and return its answer like capture_exec_output.
+
+    Each call uses a fresh in-process connection, so calls from many threads are safe.
+    DuckDB scans the parquet file with multiple threads and never materializes the
+    whole table. Queries running longer than `timeout` seconds are interrupted, and
+    `memory_limit` (bytes) and `threads` bound the resources of the connection.
+    Queries whose calling context is cancelled (see cancellation.cancel_on) are
+    interrupted as well and return CANCELLED_ERROR.
+    Errors are returned as 'Error :<Type>: message'.
+
+    The generated query runs after the connection is locked down: it can read the
+    dataset behind its view and nothing else, so it cannot read or write other files
+    (read_csv, COPY ... TO, ATTACH), install or load extensions, or change the settings.
+    """
+    if duckdb is None:
+        return MISSING_DUCKDB_ERROR
+    view, query = code.split(";\n", 1)
+    config = {}
+    if memory_limit:
+        config["memory_limit"] = f"{memory_limit // 1024 ** 2}MB"
+    if threads:
+        config["threads"] = threads
+
+    try:
+        with duckdb.connect(config=config) as con:
+            con.execute(view)
+            dataset_path = VIEW_PATH.search(view).group(1).replace("''", "'")
+            con.execute(f"SET allowed_paths = [{_quote_literal(os.path.abspath(dataset_path))}]")
+            con.execute("SET enable_external_access = false")
+            con.execute("SET lock_configuration = true")
+            finished = threading.Event()
+            watcher = threading.Thread(target=_interrupt_when_stopped, daemon=True,
+                                       args=(con, finished, timeout, cancel_event()))
+            watcher.start()
+            try:
+                rows = con.execute(query).fetchall()
+                list_columns = [_is_list_type(column[1]) for column in con.description or ()]
+            finally:
+                finished.set()
+                watcher.join()
+        return _answer(rows, list_columns)
+    except duckdb.InterruptException:
+        return CANCELLED_ERROR if cancelled() else TIMEOUT_ERROR.format(timeout)
+    except (duckdb.OutOfMemoryException, MemoryError):
+        return OOM_ERROR
+    except Exception as e:
+        return f"Error :{type(e).__name__}: {e}"
@@ -0,0 +1,330 @@
+import os
+import ast
+import difflib
+import builtins
+import pandas as pd
+from .code_processing import _read_parquet_path, _string_constants
+
+# Names that capture_exec_output provides without an import
+EXECUTION_GLOBALS = {"np", "pd", "ast"} | set(dir(builtins))
+
+# Methods of a frame that keep all of its columns
+COLUMN_PRESERVING_METHODS = {
+    'head', 'tail', 'copy', 'dropna', 'fillna', 'sort_values', 'sort_index', 'drop_duplicates', 'nlargest',
+    'nsmallest', 'sample', 'query',
+}
+
+# Methods whose result is a boolean mask when called on a column
+MASK_METHODS = {
+    'isin', 'between', 'isna', 'isnull', 'notna', 'notnull', 'duplicated', 'contains', 'startswith',
+    'endswith', 'match', 'fullmatch', 'eq', 'ne', 'lt', 'le', 'gt', 'ge',
+}
+
+# Frame methods taking column names, with the positional index and keyword of that argument
+COLUMN_ARGUMENTS = {
+    'groupby': (0, 'by'), 'sort_values': (0, 'by'), 'set_index': (0, 'keys'), 'drop_duplicates': (0, 'subset'),
+    'dropna': (None, 'subset'), 'nlargest': (1, 'columns'), 'nsmallest': (1, 'columns'),
+    'value_counts': (0, 'subset'), 'pivot_table': (None, 'values'),
+}
+
+# Reductions that raise TypeError on string columns
+NUMERIC_REDUCTIONS = {'mean', 'median', 'std', 'var', 'sem', 'skew', 'kurt', 'quantile'}
+
+ORDERING_OPERATORS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+ARITHMETIC_OPERATORS = (ast.Add, ast.Sub, ast.Div, ast.FloorDiv, ast.Pow)
+
+
+def column_kind(entry):
+    """Coarse kind of a column catalog entry: 'string', 'numeric', 'datetime', 'bool' or None if unknown."""
+    arrow_type = (entry.get("arrow_type") or "").lower()
+    if arrow_type in ("bool", "boolean"):
+        return "bool"
+    if arrow_type.startswith(("timestamp", "date")):
+        return "datetime"
+    if arrow_type.startswith(("int", "uint", "float", "double", "halffloat", "decimal")):
+        return "numeric"
+    if arrow_type in ("string", "large_string", "utf8", "large_utf8") or "values=string" in arrow_type:
+        return "string"
+    return None
+
+
+class StaticCheckError(Exception):
+    """A problem found without running the code, reported like the exception it would raise."""
+
+    def __init__(self, error_type, message, node=None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.lineno = getattr(node, "lineno", 0)
+
+    def as_exec_output(self):
+        """The error in the format of capture_exec_output."""
+        return f"Error :{self.error_type}: {self}"
+
+
+def _bound_names(tree):
+    """Every name the snippet binds anywhere, or None when it uses `from ... import *`."""
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bound.add(node.id)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == '*':
+                    return None
+                bound.add(alias.asname or alias.name.split('.')[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            bound.add(node.rest)
+    return bound
+
+
+def _root_name(node):
+    """Name at the root of an attribute/subscript/call chain such as `df.loc[...]['a']`."""
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+class _FrameChecker:
+    """Checks the uses of one frame read from a dataset against its column catalog."""
+
+    def __init__(self, frame, dataset, columns):
+        self.frame = frame
+        self.dataset = dataset
+        self.columns = columns
+        self.created = set()
+
+    def is_mask(self, node):
+        """Whether `node` evidently selects rows rather than columns."""
+        if isinstance(node, (ast.Compare, ast.BoolOp, ast.Slice)):
+            return True
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.Not)):
+            return True
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr, ast.BitXor)):
+            return True
+        return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in MASK_METHODS
+
+    def is_frame(self, node):
+        """Whether `node` evaluates to the frame or rows of it, with all of its columns."""
+        if isinstance(node, ast.Name):
+            return node.id == self.frame
+        if isinstance(node, ast.Subscript):
+            value = node.value
+            if isinstance(value, ast.Attribute) and value.attr in ('loc', 'iloc'):
+                value = value.value
+            return self.is_frame(value) and self.is_mask(node.slice)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return node.func.attr in COLUMN_PRESERVING_METHODS and self.is_frame(node.func.value)
+        return False
+
+    def column(self, node):
+        """Name of the catalog column `node` selects from the frame (`df['a']`, `df.a`), else None."""
+        if isinstance(node, ast.Subscript) and self.is_frame(node.value):
+            names = _string_constants(node.slice)
+            if names and len(names) == 1 and isinstance(node.slice, ast.Constant):
+                return names[0]
+        if isinstance(node, ast.Attribute) and self.is_frame(node.value) and node.attr in self.columns:
+            return node.attr
+        return None
+
+    def check_name(self, name, node):
+        if name in self.columns or name in self.created:
+            return
+        message = f"Column '{name}' does not exist in dataset '{self.dataset}'."
+        matches = difflib.get_close_matches(name, list(self.columns), n=3, cutoff=0.6)
+        if matches:
+            message += " Did you mean " + " or ".join(repr(match) for match in matches) + "?"
+        else:
+            listed = list(self.columns)[:30]
+            message += " Available columns: " + ", ".join(repr(column) for column in listed)
+            if len(self.columns) > len(listed):
+                message += f" and {len(self.columns) - len(listed)} more"
+        raise StaticCheckError("KeyError", message, node)
+
+    def kind(self, name):
+        """Kind of a column from the catalog; unknown for columns the snippet assigns or that do not exist."""
+        if name in self.created or name not in self.columns:
+            return None
+        return column_kind(self.columns[name])
+
+    def describe(self, name):
+        return f"column '{name}' (dtype {self.columns[name].get('dtype')})"
+
+    def check(self, node):
+        """Raise StaticCheckError for a use of the frame that is bound to fail."""
+        if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load) and self.is_frame(node.value):
+            for name in _string_constants(node.slice) or []:
+                self.check_name(name, node)
+
+        elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Load):
+            if self.is_frame(node.value) and node.attr not in self.columns and node.attr not in self.created \
+                    and not hasattr(pd.DataFrame, node.attr):
+                raise StaticCheckError("AttributeError", f"'DataFrame' object has no attribute '{node.attr}'; "
+                                       f"dataset '{self.dataset}' has no column '{node.attr}' either", node)
+            name = self.column(node.value)
+            if name is not None:
+                kind = self.kind(name)
+                if node.attr == 'str' and kind in ('numeric', 'datetime', 'bool'):
+                    raise StaticCheckError("AttributeError", "Can only use .str accessor with string values, "
+                                           f"not with {self.describe(name)}", node)
+                if node.attr == 'dt' and kind in ('numeric', 'string', 'bool'):
+                    raise StaticCheckError("AttributeError", "Can only use .dt accessor with datetimelike values, "
+                                           f"not with {self.describe(name)}; convert it with pd.to_datetime first", node)
+
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            method = node.func.attr
+            if method in COLUMN_ARGUMENTS and self.is_frame(node.func.value):
+                position, keyword = COLUMN_ARGUMENTS[method]
+                arguments = [kw.value for kw in node.keywords if kw.arg == keyword]
+                if position is not None and len(node.args) > position:
+                    arguments.append(node.args[position])
+                for argument in arguments:
+                    for name in _string_constants(argument) or []:
+                        self.check_name(name, node)
+            name = self.column(node.func.value)
+            if method in NUMERIC_REDUCTIONS and name is not None and self.kind(name) == 'string':
+                raise StaticCheckError("TypeError", f"Cannot perform reduction '{method}' on "
+                                       f"{self.describe(name)}", node)
+
+        elif isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], ORDERING_OPERATORS):
+            self.check_operands(node.left, node.comparators[0], node, "compare")
+
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ARITHMETIC_OPERATORS):
+            self.check_operands(node.left, node.right, node, "combine")
+
+    def check_operands(self, left, right, node, verb):
+        """Raise for a string column against a number, or a numeric column against a string."""
+        for column_node, other in ((left, right), (right, left)):
+            name = self.column(column_node)
+            if name is None or not isinstance(other, ast.Constant) or isinstance(other.value, bool):
+                continue
+            kind = self.kind(name)
+            if kind == 'string' and isinstance(other.value, (int, float)):
+                raise StaticCheckError("TypeError", f"Cannot {verb} {self.describe(name)} with the number "
+                                       f"{other.value!r}", node)
+            if kind in ('numeric', 'bool') and isinstance(other.value, str):
+                raise StaticCheckError("TypeError", f"Cannot {verb} {self.describe(name)} with the string "
+                                       f"{other.value!r}", node)
+
+
+def _frame_checkers(tree, column_catalog):
+    """A checker per frame variable read once from a catalogued dataset and not modified in place."""
+    assignment_counts = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            assignment_counts[node.id] = assignment_counts.get(node.id, 0) + 1
+        elif isinstance(node, ast.arg):
+            assignment_counts[node.arg] = assignment_counts.get(node.arg, 0) + 1
+    functions = {node.name for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+
+    checkers = {}
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)):
+            continue
+        path = _read_parquet_path(node.value)
+        frame = node.targets[0].id
+        if path is None or assignment_counts.get(frame) != 1:
+            continue
+        dataset = os.path.splitext(os.path.basename(path))[0]
+        if column_catalog.get(dataset):
+            checkers[frame] = _FrameChecker(frame, dataset, column_catalog[dataset])
+
+    for node in ast.walk(tree):
+        # Renamed columns, in-place methods and helpers receiving the frame make its columns unknown
+        if isinstance(node, ast.Attribute) and not isinstance(node.ctx, ast.Load):
+            checkers.pop(_root_name(node), None)
+        elif isinstance(node, ast.Call):
+            if any(kw.arg == 'inplace' for kw in node.keywords):
+                checkers.pop(_root_name(node.func), None)
+            if isinstance(node.func, ast.Name) and node.func.id in functions:
+                for argument in node.args + [kw.value for kw in node.keywords]:
+                    if isinstance(argument, ast.Name):
+                        checkers.pop(argument.id, None)
+
+    # Columns the snippet adds (`df['new'] = ...`, `df.loc[mask, 'new'] = ...`, `df.insert(0, 'new', ...)`)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and not isinstance(node.ctx, ast.Load):
+            checker = checkers.get(_root_name(node))
+            selection = node.slice.elts[-1] if isinstance(node.slice, ast.Tuple) else node.slice
+            if checker is not None:
+                checker.created.update(_string_constants(selection) or [])
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'insert':
+            checker = checkers.get(_root_name(node.func.value))
+            if checker is not None and len(node.args) > 1:
+                checker.created.update(_string_constants(node.args[1]) or [])
+    return list(checkers.values())
+
+
+def _unknown_datasets(tree, column_catalog):
+    """Errors for `pd.read_parquet('<dataset>.parquet')` calls of datasets missing from the catalog."""
+    for node in ast.walk(tree):
+        path = _read_parquet_path(node)
+        if path is None or not path.endswith('.parquet'):
+            continue
+        dataset = os.path.splitext(os.path.basename(path))[0]
+        if dataset in column_catalog:
+            continue
+        message = f"Dataset '{dataset}' does not exist."
+        matches = difflib.get_close_matches(dataset, list(column_catalog), n=3, cutoff=0.6)
+        if matches:
+            message += " Did you mean " + " or ".join(repr(match) for match in matches) + "?"
+        yield StaticCheckError("FileNotFoundError", message, node)
+
+
+def check_code(code, column_catalog=None):
+    """
+    Find errors in a generated snippet without running it or reading any data.
+
+    Reports syntax errors, names that are never defined or imported, datasets missing
+    from the column catalog, and, for frames read with
+    `pd.read_parquet('<dataset>.parquet')`, columns missing from the dataset
+    and operations that cannot work with a column's dtype (.str on numbers, numeric
+    reductions on strings, comparing strings with numbers, ...). Uses the analysis
+    cannot follow, such as renamed columns or helpers receiving the frame, are not
+    checked, so a reported error is one the execution would raise as well.
+
+    Args:
+        code (str): Cleaned Python code.
+        column_catalog (dict, optional): Dataset name -> {column: {"dtype", "arrow_type"}}
+            from preprocessing; without it only syntax and names are checked.
+
+    Returns:
+        str or None: The error in the format of capture_exec_output ('Error :<Type>: message'),
+        or None when no problem was found.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return f"Error :{type(e).__name__}: {e.msg} (line {e.lineno})"
+
+    errors = []
+    bound = _bound_names(tree)
+    if bound is not None:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) \
+                    and node.id not in bound and node.id not in EXECUTION_GLOBALS:
+                errors.append(StaticCheckError("NameError", f"name '{node.id}' is not defined", node))
+
+    if column_catalog:
+        errors.extend(_unknown_datasets(tree, column_catalog))
+
+    for checker in _frame_checkers(tree, column_catalog or {}):
+        for node in ast.walk(tree):
+            try:
+                checker.check(node)
+            except StaticCheckError as e:
+                errors.append(e)
+
+    if not errors:
+        return None
+    # Report the first problem in source order, as the execution would
+    return min(errors, key=lambda e: e.lineno).as_exec_output()
@@ -0,0 +1,217 @@
+import sys
+import json
+import time
+import pathlib
+import threading
+import contextvars
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Question a span belongs to; copied into helper threads with contextvars.copy_context
+_CURRENT_QUESTION = contextvars.ContextVar("trace_question", default=None)
+
+PERCENTILES = (50, 95, 99)
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "reasoning_tokens", "cached_tokens")
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-q * len(sorted_values) // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def usage_attributes(completion):
+    """Token counts of a chat completion, including reasoning and cached prompt tokens when reported."""
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return {}
+    attributes = {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+    completion_details = getattr(usage, "completion_tokens_details", None)
+    if getattr(completion_details, "reasoning_tokens", None) is not None:
+        attributes["reasoning_tokens"] = completion_details.reasoning_tokens
+    prompt_details = getattr(usage, "prompt_tokens_details", None)
+    if getattr(prompt_details, "cached_tokens", None) is not None:
+        attributes["cached_tokens"] = prompt_details.cached_tokens
+    return attributes
+
+
+class TraceStats:
+    """Aggregates span records into per-stage latency percentiles and token totals."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.tokens = defaultdict(Counter)
+        self.question_time = {}
+        self.dataset_time = Counter()
+        self.dataset_questions = Counter()
+
+    def add(self, record):
+        stage = record["stage"]
+        self.durations[stage].append(record["duration"])
+        for field in TOKEN_FIELDS:
+            if record.get(field):
+                self.tokens[stage][field] += record[field]
+        if stage == "question":
+            self.question_time[record.get("question_id")] = (record["duration"], record.get("dataset"))
+            self.dataset_time[record.get("dataset")] += record["duration"]
+            self.dataset_questions[record.get("dataset")] += 1
+
+    def stage_summary(self):
+        """
+        Return {stage: {count, p50, p95, p99, total}} with durations in seconds, plus the
+        token totals of stages that used tokens.
+        """
+        summary = {}
+        for stage, durations in self.durations.items():
+            values = sorted(durations)
+            summary[stage] = {"count": len(values), "total": sum(values)}
+            summary[stage].update({f"p{q}": percentile(values, q) for q in PERCENTILES})
+            summary[stage].update({field: self.tokens[stage][field] for field in TOKEN_FIELDS
+                                   if self.tokens[stage][field]})
+        return summary
+
+    def format(self, top=5):
+        """Return the run report: stage percentiles, token usage and the slowest questions and datasets."""
+        lines = ["Stage latency (seconds):",
+                 f"  {'stage':<12} {'count':>7} " + " ".join(f"{'p' + str(q):>8}" for q in PERCENTILES)
+                 + f" {'total':>10}"]
+        for stage, durations in sorted(self.durations.items(), key=lambda item: -sum(item[1])):
+            values = sorted(durations)
+            lines.append(f"  {stage:<12} {len(values):>7} "
+                         + " ".join(f"{percentile(values, q):>8.3f}" for q in PERCENTILES)
+                         + f" {sum(values):>10.1f}")
+        if self.tokens:
+            lines.append("Tokens:")
+            for stage, counts in sorted(self.tokens.items()):
+                line = f"  {stage:<12} " + ", ".join(f"{counts[field]} {field.replace('_tokens', '')}"
+                                                     for field in TOKEN_FIELDS if counts[field])
+                if counts["cached_tokens"] and counts["prompt_tokens"]:
+                    line += f" ({counts['cached_tokens'] / counts['prompt_tokens']:.0%} of prompt tokens cached)"
+                lines.append(line)
+        if self.question_time:
+            lines.append("Slowest questions:")
+            slowest = sorted(self.question_time.items(), key=lambda item: -item[1][0])[:top]
+            for question_id, (duration, dataset) in slowest:
+                lines.append(f"  {duration:>8.2f}s  {question_id} ({dataset})")
+            lines.append("Slowest datasets:")
+            for dataset, duration in self.dataset_time.most_common(top):
+                lines.append(f"  {duration:>8.2f}s  {dataset} ({self.dataset_questions[dataset]} questions, "
+                             f"{duration / self.dataset_questions[dataset]:.2f}s each)")
+        return "\n".join(lines)
+
+
+class Tracer:
+    """
+    Records timing spans of the pipeline stages as JSONL.
+
+    Every span is one line with the question id and dataset it belongs to, the stage
+    name, its wall-clock start, its duration in seconds and any attributes (such as
+    token counts). The question is taken from the context set by `question`, so spans
+    opened deep inside helpers (dataset loads, LLM calls) are attributed correctly.
+    A disabled tracer (no path) makes spans nearly free.
+    """
+
+    def __init__(self, path=None):
+        self.path = None
+        self.stats = TraceStats()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            self.open(path)
+
+    def open(self, path):
+        """Start appending spans to the JSONL file at `path`, with fresh statistics."""
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self.path = path
+            self.stats = TraceStats()
+            self._file = open(path, "a", encoding="utf-8")
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    @contextmanager
+    def question(self, question_data):
+        """Attribute the spans opened in this context to a question."""
+        token = _CURRENT_QUESTION.set((question_data.get("question_id"), question_data.get("dataset")))
+        try:
+            yield
+        finally:
+            _CURRENT_QUESTION.reset(token)
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """
+        Time a block as one stage. Yields a dict of attributes that the block may extend;
+        an exception escaping the block is recorded as the span's 'error'.
+        """
+        if not self.enabled:
+            yield attributes
+            return
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self._write(stage, started_at, time.perf_counter() - started, attributes)
+
+    def _write(self, stage, started_at, duration, attributes):
+        question_id, dataset = _CURRENT_QUESTION.get() or (None, None)
+        record = {"question_id": question_id, "dataset": dataset, "stage": stage,
+                  "start": round(started_at, 6), "duration": round(duration, 6)}
+        record.update(attributes)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self.stats.add(record)
+
+    def format_summary(self, top=5):
+        with self._lock:
+            return self.stats.format(top)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Shared tracer; disabled until enable_tracing is called
+TRACER = Tracer()
+
+
+def enable_tracing(path):
+    """Write timing spans of all pipeline stages to the JSONL file at `path`."""
+    TRACER.open(path)
+    return TRACER
+
+
+def disable_tracing():
+    TRACER.close()
+
+
+def load_trace_stats(path):
+    """Aggregate a trace file written by a previous run."""
+    stats = TraceStats()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                stats.add(json.loads(line))
+            except (ValueError, KeyError):
+                continue  # Line cut short by an interrupted run
+    return stats
+
+
+if __name__ == "__main__":
+    # Print the report of an existing trace: python -m utilities.tracing intermediate_results/trace.jsonl
+    print(load_trace_stats(sys.argv[1]).format())